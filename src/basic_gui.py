@@ -1,14 +1,19 @@
+import argparse
 import tkinter as tk
-from tkinter import filedialog
+from tkinter import filedialog, messagebox, ttk
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
 from PIL import Image, ImageTk
-from skimage.morphology import flood, flood_fill
-from math import ceil
-import skimage as ski
+from render import NodeLayer, Viewport, DensityGrid, ImagePyramid, build_draw_list, create_ovals, create_lines
+from labeling_engine import LabelingEngine
+from label_journal import LabelJournal, autosave_directory
+from node_loader import load_nodes
+from raster import RasterCache, to_grayscale
+from tasks import TaskRunner, Cancelled
+from profiling import profiler
+
+# flood fill resolution choices, as pyramid levels of the loaded map
+FLOOD_LEVELS = {"Full": 0, "1/2": 1, "1/4": 2, "1/8": 3}
 
 class GraphGUI:
     def __init__(self, root):
@@ -32,6 +37,9 @@ class GraphGUI:
         self.load_image_button = tk.Button(root, text="Load Image", command=self.load_image)
         self.load_image_button.pack()
 
+        self.load_edges_button = tk.Button(root, text="Load Edges", command=self.load_edges)
+        self.load_edges_button.pack()
+
         self.load_labels_button = tk.Button(root, text="Load Labels", command=self.load_labels)
         self.load_labels_button.pack()
 
@@ -41,23 +49,87 @@ class GraphGUI:
         self.flood_fill_select_button = tk.Button(root, text="Select Nodes with Flood Fill", command=self.select_nodes_with_flood_fill)
         self.flood_fill_select_button.pack()
 
+        self.lasso_select_button = tk.Button(root, text="Lasso Select Nodes", command=self.select_nodes_with_lasso)
+        self.lasso_select_button.pack()
+
+        # box selections keep only the nodes linked to the node where the drag started
+        self.connected_only = tk.BooleanVar(value=False)
+        self.connected_only_check = tk.Checkbutton(root, text="Connected Nodes Only", variable=self.connected_only)
+        self.connected_only_check.pack()
+
+        self.propagate_button = tk.Button(root, text="Propagate Labels", command=self.propagate_labels)
+        self.propagate_button.pack()
+
+        # raster resolution flood fills run on, chosen before loading the image
+        self.flood_level = tk.StringVar(value="Full")
+        tk.Label(root, text="Flood Fill Resolution").pack()
+        self.flood_level_menu = tk.OptionMenu(root, self.flood_level, *FLOOD_LEVELS)
+        self.flood_level_menu.pack()
+
+        self.auto_label_button = tk.Button(root, text="Auto Label Regions", command=self.auto_label)
+        self.auto_label_button.pack()
+
+        self.undo_frame = tk.Frame(root)
+        self.undo_button = tk.Button(self.undo_frame, text="Undo", command=self.undo)
+        self.undo_button.pack(side=tk.LEFT)
+        self.redo_button = tk.Button(self.undo_frame, text="Redo", command=self.redo)
+        self.redo_button.pack(side=tk.LEFT)
+        self.undo_frame.pack()
+
         self.save_button = tk.Button(root, text="Save Groups", command=self.save_groups)
         self.save_button.pack()
 
+        self.report_button = tk.Button(root, text="Region Report", command=self.open_region_report)
+        self.report_button.pack()
+
         self.select_bbox_button = tk.Button(root, text="Select Bounding Box", command=self.toggle_bbox_selection)
         self.select_bbox_button.pack()
 
+        self.open_project_button = tk.Button(root, text="Open Project", command=self.open_project)
+        self.open_project_button.pack()
+
+        self.save_project_button = tk.Button(root, text="Save Project", command=self.save_project)
+        self.save_project_button.pack()
+
         self.unlabeled_count = None
         self.unlabeled_label = tk.Label(root, text=f'Unlabeled Nodes: {self.unlabeled_count}')
         self.unlabeled_label.pack()
         
         self.update_unlabeled_count()
+
+        # progress of the background task, if one is running
+        self.task_frame = tk.Frame(root)
+        self.progress = ttk.Progressbar(self.task_frame, length=200, mode="determinate", maximum=1.0)
+        self.progress.pack(side=tk.LEFT)
+        self.task_label = tk.Label(self.task_frame, text="")
+        self.task_label.pack(side=tk.LEFT)
+        self.cancel_button = tk.Button(self.task_frame, text="Cancel", command=self.cancel_task, state="disabled")
+        self.cancel_button.pack(side=tk.LEFT)
+        self.task_frame.pack()
+        self.tasks = TaskRunner(root) # loads and flood fills run on a worker thread
+
+        # stage timings of the last operation, shown while profiling is on
+        self.profile_frame = tk.Frame(root)
+        self.profile_label = tk.Label(self.profile_frame, text="Profiling on", anchor="w")
+        self.profile_label.pack(side=tk.LEFT)
+        tk.Button(self.profile_frame, text="Profile Details", command=self.open_profile_window).pack(side=tk.LEFT)
+        if profiler.enabled:
+            self.profile_frame.pack()
+        self.profile_tree = None
+        self.report_tree = None
+
+        self.buttons = [self.load_button, self.load_image_button, self.load_edges_button, self.load_labels_button,
+                        self.select_button, self.flood_fill_select_button, self.lasso_select_button, self.propagate_button,
+                        self.auto_label_button, self.undo_button, self.redo_button, self.save_button, self.report_button, self.select_bbox_button,
+                        self.open_project_button, self.save_project_button]
         
+        self.root.bind("<Control-z>", lambda event: self.undo())
+        self.root.bind("<Control-y>", lambda event: self.redo())
+
         self.canvas.bind("<MouseWheel>", self.zoom)
         self.canvas.bind("<ButtonPress-2>", self.start_pan)
         self.canvas.bind("<B2-Motion>", self.pan)
 
-        self.zoom_scale = 1.0
         self.pan_start_x = None
         self.pan_start_y = None
 
@@ -72,33 +144,216 @@ class GraphGUI:
         self.bbox_selection_mode = False  # Initialize bbox_selection_mode attribute
         self.selection_labeling_mode = False  # Initialize selection_labeling_mode attribute
         self.flood_fill_labeling_mode = False # Initialize flood_fill_labeling_mode attribute
+        self.lasso_labeling_mode = False # freehand polygon selection
+        self.lasso_points = [] # canvas points of the lasso being drawn
         self.selection_label_rectangle = None # Initialize selection_label_rectangle attribute
 
-        self.unlabeled = []
-
-
-        self.nodes = {}
+        self.engine = LabelingEngine() # nodes, selections and labels
         self.groups = {}
-        self.selected_nodes = {}
 
         self.graph_plot = None  # Initialize graph_plot attribute
 
-        self.disable_buttons(exceptions=[self.load_image_button])
+        self.bg_item = None # canvas item of the background image
+        self.node_layer = NodeLayer(self.canvas) # node index -> canvas oval registry
+
+        self.viewport = Viewport(800, 600) # zoom and pan of the canvas
+        self.world_size = (800, 600) # size of the background as first fitted to the canvas
+        self.pyramid = None # background image at several resolutions
+        self.density = None # node counts per world cell, drawn as clusters when zoomed out
+        self.node_radius = 5
+        self.clustered = False # whether the last frame drew clusters instead of nodes
+
+        self.disable_buttons(exceptions=[self.load_image_button, self.open_project_button])
 
 
     def load_data(self):
         self.filename = filedialog.askopenfilename(title="Select File", filetypes=(("CSV files", "*.csv"),("all files", "*.*")))
-        self.data = pd.read_csv(self.filename)
-        #self.nodes = {row['node']: (row['x'], row['y']) for index, row in self.data.iterrows()}
-        self.nodes = self.data['node']
-        self.unlabeled = list(self.nodes)
-        self.unlabeled_count = len(self.unlabeled)
-        self.update_unlabeled_count()
-        self.x = self.data['x']
-        self.y = self.data['y']
-        self.plot_graph()
+        if not self.filename:
+            return
+        filename = self.filename
+
+        def work(task):
+            # parse the CSV on the worker, reporting after every chunk
+            with profiler.stage("load data: read nodes") as counts:
+                table = load_nodes(filename, progress=lambda fraction: task.report(fraction, "Reading nodes"))
+                counts["nodes"] = len(table.ids)
+            return table
+
+        def done(table):
+            with profiler.stage("load data"):
+                with profiler.stage("set nodes"):
+                    self.engine.set_nodes(table)
+                self.start_autosave(filename)
+                self.unlabeled_count = self.engine.unlabeled_count
+                self.update_unlabeled_count()
+                self.plot_graph()
+            self.show_profile()
+
+            self.disable_buttons(exceptions=[self.select_bbox_button, self.load_edges_button])
+
+        self.run_task("Load Data", work, done)
+
+    def start_autosave(self, source):
+        # label changes are appended to a journal as they happen, one left behind with
+        # unsaved changes by a session that did not close cleanly can be recovered
+        directory = autosave_directory(source)
+        recover = LabelJournal.has_unsaved(directory) and messagebox.askyesno(
+            "Recover Labels", "Labels from an earlier session on this file were not saved. Recover them?")
+        try:
+            replayed = self.engine.start_journal(directory, recover=recover)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Autosave", f"Labels are not autosaved: {e}")
+            return
+        if replayed:
+            print(f"Recovered {replayed} label changes")
+
+    def undo(self):
+        if self.tasks.busy or str(self.undo_button.cget("state")) == "disabled":
+            return
+        indices = self.engine.undo()
+        if indices is not None:
+            self.refresh_labels(indices)
+
+    def redo(self):
+        if self.tasks.busy or str(self.redo_button.cget("state")) == "disabled":
+            return
+        indices = self.engine.redo()
+        if indices is not None:
+            self.refresh_labels(indices)
+
+    def run_task(self, name, work, on_done):
+        # run work(task) on the worker thread, the buttons stay disabled until it ends
+        states = {button: button.cget("state") for button in self.buttons}
+        self.disable_buttons()
+        self.cancel_button.config(state="normal")
+
+        def finish():
+            self.progress.stop()
+            self.progress.config(mode="determinate", value=0)
+            self.task_label.config(text="")
+            self.cancel_button.config(state="disabled")
+            for button, state in states.items():
+                button.config(state=state)
+
+        def done(result):
+            finish()
+            on_done(result)
+
+        def failed(error):
+            finish()
+            if isinstance(error, Cancelled):
+                print(f"{name} cancelled")
+            else:
+                messagebox.showerror(name, str(error))
+
+        self.tasks.submit(name, work, done, failed, self.show_progress)
 
-        self.disable_buttons(exceptions=[self.select_bbox_button])
+    def show_progress(self, task):
+        self.task_label.config(text=task.message)
+        if task.fraction is None:
+            # bounce while the amount of work is unknown
+            if str(self.progress.cget("mode")) != "indeterminate":
+                self.progress.config(mode="indeterminate", maximum=100)
+                self.progress.start(20)
+        else:
+            if str(self.progress.cget("mode")) != "determinate":
+                self.progress.stop()
+                self.progress.config(mode="determinate", maximum=1.0)
+            self.progress.config(value=task.fraction)
+
+    def cancel_task(self):
+        self.tasks.cancel()
+        self.task_label.config(text="Cancelling...")
+
+    def show_profile(self):
+        # the last operation and its stages one level down, in milliseconds
+        if not profiler.enabled:
+            return
+        record, inner = profiler.last_operation()
+        if record is None:
+            return
+        parts = [f"{record.name} {record.duration * 1e3:.1f} ms"]
+        parts += [f"{r.name} {r.duration * 1e3:.1f}" for r in inner if r.depth == 1]
+        if "canvas_items" in record.counts:
+            parts.append(f"{record.counts['canvas_items']} items ({record.counts['canvas_items_added']:+d})")
+        self.profile_label.config(text=" | ".join(parts))
+        if self.profile_tree is not None and self.profile_tree.winfo_exists():
+            self.fill_profile_tree()
+
+    def open_profile_window(self):
+        # per stage totals of the session, with exports
+        window = tk.Toplevel(self.root)
+        window.title("Profile")
+        columns = ("calls", "total", "mean", "max", "counts")
+        self.profile_tree = ttk.Treeview(window, columns=columns, height=20)
+        self.profile_tree.heading("#0", text="Stage")
+        for column, title in zip(columns, ("Calls", "Total ms", "Mean ms", "Max ms", "Counts")):
+            self.profile_tree.heading(column, text=title)
+        self.profile_tree.pack(fill=tk.BOTH, expand=True)
+        buttons = tk.Frame(window)
+        tk.Button(buttons, text="Export JSON", command=lambda: self.export_profile("json")).pack(side=tk.LEFT)
+        tk.Button(buttons, text="Export Chrome Trace", command=lambda: self.export_profile("trace")).pack(side=tk.LEFT)
+        tk.Button(buttons, text="Clear", command=self.clear_profile).pack(side=tk.LEFT)
+        buttons.pack()
+        self.fill_profile_tree()
+
+    def fill_profile_tree(self):
+        self.profile_tree.delete(*self.profile_tree.get_children())
+        for name, row in sorted(profiler.summary().items(), key=lambda item: -item[1]["total_ms"]):
+            counts = ", ".join(f"{key}={value}" for key, value in row["counts"].items())
+            self.profile_tree.insert("", tk.END, text=name, values=(
+                row["calls"], f"{row['total_ms']:.1f}", f"{row['mean_ms']:.2f}", f"{row['max_ms']:.1f}", counts))
+
+    def export_profile(self, kind):
+        if kind == "json":
+            filename = filedialog.asksaveasfilename(defaultextension=".json", filetypes=(("JSON files", "*.json"), ("All files", "*.*")))
+            if filename:
+                profiler.save_json(filename)
+        else:
+            filename = filedialog.asksaveasfilename(defaultextension=".trace.json", filetypes=(("Chrome traces", "*.json"), ("All files", "*.*")))
+            if filename:
+                profiler.save_chrome_trace(filename)
+
+    def clear_profile(self):
+        profiler.clear()
+        self.profile_label.config(text="Profiling on")
+        self.fill_profile_tree()
+
+    def close(self):
+        # stop the worker, remove the label journal and write any cProfile stats
+        if self.engine.journal.unsaved and not messagebox.askokcancel(
+                "Quit", "Some label changes were not saved. Quit anyway?"):
+            return
+        self.tasks.shutdown()
+        self.engine.journal.close(discard=True)
+        profiler.close()
+        self.root.destroy()
+
+    def open_region_report(self):
+        # node counts, centroids, extents and edge cuts per label, kept current while open
+        window = tk.Toplevel(self.root)
+        window.title("Region Report")
+        self.report_tree = ttk.Treeview(window, show="headings", height=20)
+        self.report_tree.pack(fill=tk.BOTH, expand=True)
+        tk.Button(window, text="Export CSV", command=self.export_region_report).pack()
+        self.fill_region_report()
+
+    def fill_region_report(self):
+        frame = self.engine.region_frame()
+        frame["label"] = frame["label"].fillna("(unlabeled)")
+        columns = list(frame.columns)
+        self.report_tree.config(columns=columns)
+        for column in columns:
+            self.report_tree.heading(column, text=column)
+            self.report_tree.column(column, width=90)
+        self.report_tree.delete(*self.report_tree.get_children())
+        for row in frame.itertuples(index=False):
+            self.report_tree.insert("", tk.END, values=[f"{value:.1f}" if isinstance(value, float) else value for value in row])
+
+    def export_region_report(self):
+        filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=(("CSV files", "*.csv"), ("All files", "*.*")))
+        if filename:
+            print("Region report written to", ", ".join(self.engine.save_region_report(filename)))
 
     def update_unlabeled_count(self):
         # Update the label text with the current unlabeled count
@@ -106,54 +361,171 @@ class GraphGUI:
 
 
     def plot_graph(self):
-        #clear canvas
-        #self.canvas.delete("all")
+        # until a bounding box is drawn the nodes are stretched over the whole background
+        if self.pyramid is None:
+            self.world_size = (self.canvas.winfo_width(), self.canvas.winfo_height())
+        self.engine.set_bbox((0, 0) + tuple(self.world_size))
+        self.node_radius = 5
+        self.build_density()
+        self.redraw()
 
-        # add the image as the background
-        if hasattr(self, 'bg_photo'):
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bg_photo)
-
-            # get size of loaded image
-            img_width = self.bg_image.width
-            img_height = self.bg_image.height
-
-            # get size of canvas
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-
-            # calculate the scaling factors
-            scale_x = canvas_width 
-            scale_y = canvas_height 
+        self.canvas.pack()
 
-        #plot nodes
-        for index, row in self.data.iterrows():
-            x = scale_x * ((row['x'] - min(self.x))/ (max(self.x) - min(self.x)))
-            y = scale_y * ((max(self.y) - row['y'])/ (max(self.y) - min(self.y)))
-            self.canvas.create_oval(x-5, y-5, x+5, y+5, fill='red')
+    def build_density(self):
+        # node counts per world cell for the current bounding box
+        x, y = self.engine.node_pixels()
+        self.density = DensityGrid(x, y, self.engine.labeled, *self.world_size)
+
+    def redraw(self):
+        # draw the visible window: background, bounding box and the nodes or clusters in view
+        self.engine.transform.set_space("canvas", self.viewport.canvas_to_world())
+        if self.pyramid is not None and self.bg_item is not None:
+            with profiler.stage("render background"):
+                size = (self.viewport.width, self.viewport.height)
+                background = self.pyramid.render(self.viewport.world_rect(), size, self.pyramid.size[0] / self.world_size[0])
+                self.bg_photo = ImageTk.PhotoImage(background)
+                self.canvas.itemconfig(self.bg_item, image=self.bg_photo)
+
+        if self.selection_rectangle is not None and hasattr(self, 'selection_rectangle_bbox'):
+            x, y = self.viewport.to_canvas(self.selection_rectangle_bbox[0::2], self.selection_rectangle_bbox[1::2])
+            self.canvas.coords(self.selection_rectangle, x[0], y[0], x[1], y[1])
+        self.canvas.delete("selection_label")
+        self.canvas.delete("lasso")
+
+        if self.density is None:
+            return
+        with profiler.stage("build draw list") as counts:
+            draw_list = build_draw_list(self.viewport, self.engine, self.density, self.node_radius)
+            counts["drawn"] = len(draw_list.sx)
+        with profiler.stage("draw items", canvas=self.canvas):
+            self.canvas.delete("clusters")
+            self.canvas.delete("edges")
+            self.clustered = draw_list.kind == "clusters"
+            if not self.clustered:
+                if draw_list.edges is not None:
+                    first, second = draw_list.edges
+                    create_lines(self.canvas, draw_list.sx[first], draw_list.sy[first],
+                                 draw_list.sx[second], draw_list.sy[second], tags="edges")
+                self.node_layer.build(draw_list.sx, draw_list.sy, draw_list.radius, self.engine.labeled[draw_list.indices], draw_list.indices)
+            else:
+                self.node_layer.clear()
+                create_ovals(self.canvas, draw_list.sx, draw_list.sy, draw_list.radius, draw_list.fills, tags="clusters")
 
-        self.canvas.pack()
+    def refresh_labels(self, indices=None):
+        # update the count and the drawn colours after labels changed, for the given nodes or all
+        self.unlabeled_count = self.engine.unlabeled_count
+        self.update_unlabeled_count()
+        if self.report_tree is not None and self.report_tree.winfo_exists():
+            self.fill_region_report()
+        if self.density is None:
+            return
+        if indices is None:
+            self.density.set_labeled(self.engine.labeled)
+        else:
+            self.density.update_labeled(indices, self.engine.labeled)
+        if self.clustered:
+            self.redraw()
+        else:
+            self.node_layer.recolor(self.engine.labeled)
 
     def load_image(self):
         image_file = filedialog.askopenfilename(title="Select Image", filetypes=(("PNG files", "*.png"),("all files", "*.*")))
-        if image_file:
-            self.bg_image = Image.open(image_file)
-
-            # Get the dimensions of the canvas
-            canvas_width = self.canvas.winfo_width()
-            canvas_height = self.canvas.winfo_height()
-
-            # Resize the image to fit the canvas
-            self.bg_image = self.bg_image.resize((canvas_width, canvas_height), Image.Resampling.LANCZOS)
-            self.bg_photo = ImageTk.PhotoImage(self.bg_image)
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bg_photo)
-
-        self.disable_buttons(exceptions=[self.load_button])
+        if not image_file:
+            self.disable_buttons(exceptions=[self.load_button])
+            return
+
+        # Get the dimensions of the canvas
+        canvas_width = self.canvas.winfo_width()
+        canvas_height = self.canvas.winfo_height()
+        level = FLOOD_LEVELS[self.flood_level.get()]
+
+        def work(task):
+            # decoding, resizing and the flood regions run on the worker
+            task.report(None, "Decoding image")
+            with profiler.stage("load image: decode") as counts:
+                source_image = Image.open(image_file)
+                source_image.load()
+                counts["pixels"] = source_image.width * source_image.height
+
+            # Resize the image to fit the canvas, this fixes the world size
+            task.report(0.2, "Resizing image")
+            with profiler.stage("load image: resize"):
+                bg_image = source_image.resize((canvas_width, canvas_height), Image.Resampling.LANCZOS)
+
+            task.report(0.3, "Building image pyramid")
+            with profiler.stage("load image: pyramid") as counts:
+                pyramid = ImagePyramid(source_image)
+                counts["levels"] = len(pyramid.levels)
+
+            # flood fills run on the chosen pyramid level, not on the fitted copy
+            task.report(0.5, "Finding flood fill regions")
+            flood_image = pyramid.levels[level] if level < len(pyramid.levels) else source_image.reduce(2 ** level)
+            with profiler.stage("load image: grayscale") as counts:
+                gray = to_grayscale(flood_image)
+                counts["pixels"] = gray.size
+            task.check()
+            with profiler.stage("load image: flood regions"):
+                raster = RasterCache(gray)
+            return bg_image, raster, pyramid
+
+        def done(result):
+            self.bg_image, raster, pyramid = result
+            with profiler.stage("load image", canvas=self.canvas):
+                self.show_background(pyramid, self.bg_image.size)
+                self.engine.set_raster(raster, self.bg_image.size)
+            self.show_profile()
+
+            self.disable_buttons(exceptions=[self.load_button])
+
+        self.run_task("Load Image", work, done)
+
+    def show_background(self, pyramid, world_size):
+        # serve the background from an image pyramid, shown world_size large at zoom 1
+        self.pyramid = pyramid
+        self.world_size = tuple(world_size)
+        self.viewport = Viewport(self.canvas.winfo_width(), self.canvas.winfo_height())
+        if self.bg_item is None:
+            self.bg_item = self.canvas.create_image(0, 0, anchor=tk.NW)
+            self.canvas.tag_lower(self.bg_item)
+        self.redraw()
+
+    def save_project(self):
+        save_path = filedialog.asksaveasfilename(title="Save Project", defaultextension=".nlproj", filetypes=(("Labeling projects", "*.nlproj"), ("All files", "*.*")))
+        if save_path:
+            self.engine.save_project(save_path, getattr(self, 'bg_image', None))
+            print("Project saved successfully")
+
+    def open_project(self):
+        project_path = filedialog.askdirectory(title="Select Project Directory", mustexist=True)
+        if not project_path:
+            return
+        project = self.engine.load_project(project_path)
+        self.start_autosave(project_path)
+
+        # the stored image is the background the bounding box was drawn on, shown as is
+        if project.image is not None:
+            self.bg_image = Image.fromarray(np.asarray(project.image))
+            self.show_background(ImagePyramid(self.bg_image), self.bg_image.size)
+
+        self.unlabeled_count = self.engine.unlabeled_count
+        self.update_unlabeled_count()
+        if project.bbox is not None:
+            self.selection_rectangle_bbox = project.bbox
+            self.canvas.delete("selection")
+            self.selection_rectangle = self.canvas.create_rectangle(*project.bbox, outline="black", tags="selection")
+            self.plot_nodes_in_bbox(project.bbox)
+            self.enable_buttons(exceptions=[self.load_button, self.load_image_button])
+        else:
+            self.plot_graph()
+            self.disable_buttons(exceptions=[self.select_bbox_button])
 
     def zoom(self, event):
         scale = 1.1 if event.delta > 0 else 0.9
-        self.zoom_scale *= scale
-        self.canvas.scale("all", event.x, event.y, scale, scale)
-        
+        self.viewport.zoom_at(event.x, event.y, scale)
+        with profiler.stage("zoom", canvas=self.canvas):
+            self.redraw()
+        self.show_profile()
+
     def start_pan(self, event):
         self.pan_start_x = event.x
         self.pan_start_y = event.y
@@ -162,7 +534,12 @@ class GraphGUI:
         if self.pan_start_x is not None and self.pan_start_y is not None:
             dx = event.x - self.pan_start_x
             dy = event.y - self.pan_start_y
-            self.canvas.scan_dragto(-dx, -dy, gain=1)
+            self.viewport.pan(dx, dy)
+            self.pan_start_x = event.x
+            self.pan_start_y = event.y
+            with profiler.stage("pan", canvas=self.canvas):
+                self.redraw()
+            self.show_profile()
 
 
 
@@ -190,10 +567,12 @@ class GraphGUI:
 
         self.flood_fill_labeling_mode = False
         self.selection_labeling_mode = False
+        self.lasso_labeling_mode = False
+        self.current_selection_type = selection_type
 
         
 
-        if selection_type == "box_selection":
+        if selection_type in ("box_selection", "lasso_selection"):
             # bing the return event ot the method
             self.label_entry.bind("<Return>", lambda event: self.assign_label())
             tk.Button(self.label_window, text="Assign Label", command=self.assign_label).pack()
@@ -203,60 +582,78 @@ class GraphGUI:
 
         self.disable_buttons()
 
-    #TODO warn when overwriting labels
     def assign_label(self):
         label = self.label_entry.get()
-        nodes_in_bbox = self.nodes_in_bbox(self.current_node_selection_box)
-        for node in nodes_in_bbox:
-            self.selected_nodes[node] = label
-            if node in self.unlabeled:
-                self.unlabeled.remove(node)
-        self.unlabeled_count = len(self.unlabeled)
-        self.label_entry.delete(0, tk.END)
-        self.label_window.destroy()
-        self.update_unlabeled_count()
-        self.plot_nodes_in_bbox(self.selection_rectangle_bbox)
-
-        self.selection_labeling_mode = True
+        with profiler.stage("assign label", canvas=self.canvas) as counts:
+            if self.current_selection_type == "lasso_selection":
+                with profiler.stage("lasso query"):
+                    indices = self.engine.select_polygon(*self.current_node_selection_polygon)
+            else:
+                indices = self.nodes_in_bbox(self.current_node_selection_box, self.current_node_selection_start)
+            with profiler.stage("store labels"):
+                indices = self.engine.assign(indices, label)
+            counts["nodes"] = len(indices)
+            self.label_entry.delete(0, tk.END)
+            self.label_window.destroy()
+            with profiler.stage("refresh labels"):
+                self.refresh_labels(indices)
+        self.show_profile()
+
+        if self.current_selection_type == "lasso_selection":
+            self.canvas.delete("lasso")
+            self.lasso_labeling_mode = True
+        else:
+            self.selection_labeling_mode = True
 
         self.enable_buttons(exceptions=[self.load_button, self.load_image_button])
 
     def save_groups(self):
-        if self.selected_nodes:  #Only evaluates true if the dictionary is not empty
-            labels_df = pd.DataFrame({"node": list(self.selected_nodes.keys()), "label": list(self.selected_nodes.values())})
+        if self.engine.store.labeled_count:  #Only evaluates true if any node is labeled
             save_filename = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=(("CSV files", "*.csv"), ("All files", "*.*")))
             if save_filename:
-                labels_df.to_csv(save_filename, index=False)
+                self.engine.save_labels(save_filename)
                 print("Labels saved scuccessfully")
 
         else:
             print("No groups to save")
 
-    def nodes_in_bbox(self, bbox):
-        nodes = []
-        rbbox = self.selection_rectangle_bbox
-        min_x, max_x = min(self.x), max(self.x)
-        min_y, max_y = min(self.y), max(self.y)
-        rbbox_width = rbbox[2] - rbbox[0]
-        rbbox_height = rbbox[3] - rbbox[1]
-
-        x = rbbox[0] + rbbox_width * ((self.x - min_x) / (max_x - min_x))
-        y = rbbox[1] + rbbox_height * ((max_y - self.y) / (max_y - min_y))
-
-        # Check which nodes fall within the bounding box
-        mask = ((x >= bbox[0]) & (x <= bbox[2])) & ((y >= bbox[1]) & (y <= bbox[3]))
-   
-        nodes = self.nodes[mask]
-
-
-        return nodes
+    def nodes_in_bbox(self, bbox, start=None):
+        # indices of the nodes inside a world rectangle
+        with profiler.stage("nodes in bbox") as counts:
+            if bbox[0] == bbox[2] and bbox[1] == bbox[3]:
+                # a click without dragging picks the closest node within a few canvas pixels
+                indices = self.engine.select_nearest(bbox[0], bbox[1], max_pixels=5 / self.viewport.scale)
+            elif self.connected_only.get() and self.engine.graph is not None and start is not None:
+                indices = self.engine.select_connected(bbox, *start)
+            else:
+                indices = self.engine.select_box(bbox)
+            counts["nodes"] = len(indices)
+        return indices
+
+    def load_edges(self):
+        edge_file = filedialog.askopenfilename(title="Select Edge File", filetypes=(("CSV files", "*.csv"),("all files", "*.*")))
+        if edge_file:
+            dropped = self.engine.load_edges(edge_file)
+            if dropped:
+                print(f"{dropped} edges name unknown nodes and were skipped")
+            self.redraw()
+
+    def propagate_labels(self):
+        if self.engine.graph is None:
+            print("Load edges before propagating labels")
+            return
+        self.refresh_labels(self.engine.propagate_labels())
 
     def resize(self, event):
         if self.graph_plot is not None:
             #self.canvas.itemconfig(self.graph_plot.get_tk_widget(), width=event.width, height=event.height)
             self.graph_plot.get_tk_widget().configure(width=event.width, height=event.height)
+        self.viewport.resize(event.width, event.height)
+        self.redraw()
 
     def start_selection(self, event):
+        if self.tasks.busy:
+            return
         if self.bbox_selection_mode:
             self.canvas.delete("selection")
 
@@ -276,7 +673,21 @@ class GraphGUI:
             self.selection_label_coords = (event.x, event.y)
             self.label_dialog("flood_selection")
 
+        if self.lasso_labeling_mode:
+            self.canvas.delete("lasso")
+            self.lasso_points = [(event.x, event.y)]
+            self.canvas.create_line(event.x, event.y, event.x, event.y, fill="black", tags="lasso")
+
     def update_selection(self, event):
+        if self.tasks.busy:
+            return
+        if self.lasso_labeling_mode and self.lasso_points:
+            # a vertex every few pixels of mouse travel is enough for the outline
+            last_x, last_y = self.lasso_points[-1]
+            if abs(event.x - last_x) + abs(event.y - last_y) >= 3:
+                self.lasso_points.append((event.x, event.y))
+                self.canvas.coords("lasso", *[value for point in self.lasso_points for value in point])
+
         if self.bbox_selection_mode and self.selection_coords:
 
             # get current canvas dimensions
@@ -325,23 +736,32 @@ class GraphGUI:
 
 
     def end_selection(self, event):
+        if self.tasks.busy:
+            return
+        if self.lasso_labeling_mode and len(self.lasso_points) >= 3:
+            # close the outline and keep it in world coordinates
+            self.canvas.coords("lasso", *[value for point in self.lasso_points + self.lasso_points[:1] for value in point])
+            cx, cy = np.array(self.lasso_points, dtype=np.float64).T
+            self.current_node_selection_polygon = self.engine.transform.map("canvas", "world", cx, cy)
+            self.lasso_points = []
+            self.label_dialog("lasso_selection")
+
         if self.bbox_selection_mode and self.selection_coords:
             # get coordinates of the selection rectangle
             x0, y0 = self.selection_coords
             x1, y1 = event.x, event.y
 
-            # create a bounding box based on selection
-            bbox = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
-
-            # plot nodes within the bounding box
-            self.plot_nodes_in_bbox(bbox)
-
+            # create a bounding box based on selection, in world coordinates
+            bbox = self.engine.transform.rect("canvas", "world", (x0, y0, x1, y1))
 
             # reset selection
             self.selection_coords = None
-            self.selection_rectangle = self.canvas.create_rectangle(x0, y0, x1, y1, outline="black", tags="selection")
+            self.canvas.coords(self.selection_rectangle, x0, y0, x1, y1)
             self.selection_rectangle_bbox = bbox
 
+            # plot nodes within the bounding box
+            self.plot_nodes_in_bbox(bbox)
+
             self.toggle_bbox_selection()
 
             self.enable_buttons(exceptions=[self.load_button, self.load_image_button])
@@ -351,10 +771,12 @@ class GraphGUI:
             x0, y0 = self.selection_label_coords
             x1, y1 = event.x, event.y
 
-            # create a bounding box based on selection
-            bbox = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+            # create a bounding box based on selection, in world coordinates
+            bbox = self.engine.transform.rect("canvas", "world", (x0, y0, x1, y1))
+            x, y = self.engine.transform.map("canvas", "world", x0, y0)
 
             self.current_node_selection_box = bbox
+            self.current_node_selection_start = (float(x), float(y))
             # open a dialog to label the selected nodes
             self.label_dialog("box_selection")
 
@@ -364,23 +786,14 @@ class GraphGUI:
 
 
     def plot_nodes_in_bbox(self, bbox):
-        # clear the canvas
-        #self.canvas.delete("all")
-
-        # add the image as the background
-        if hasattr(self, 'bg_photo'):
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=self.bg_photo)
-
-        # plot nodes in the bounding box
-        for index, row in self.data.iterrows():
-            node = row['node']
-            x = bbox[0] + (bbox[2] - bbox[0]) * ((row['x'] - min(self.x))/ (max(self.x) - min(self.x)))
-            y = bbox[1] + (bbox[3] - bbox[1]) * ((max(self.y) - row['y'])/ (max(self.y) - min(self.y)))
-
-            if node in self.unlabeled:
-                self.canvas.create_oval(x-2, y-2, x+2, y+2, fill='red')
-            else:
-                self.canvas.create_oval(x-2, y-2, x+2, y+2, fill='white')
+        # stretch the nodes over the bounding box and draw the visible ones
+        with profiler.stage("plot nodes in bbox", canvas=self.canvas):
+            self.engine.set_bbox(bbox)
+            self.node_radius = 2
+            with profiler.stage("density grid"):
+                self.build_density()
+            self.redraw()
+        self.show_profile()
 
     def toggle_bbox_selection(self):
         self.bbox_selection_mode = not self.bbox_selection_mode
@@ -392,64 +805,71 @@ class GraphGUI:
     def load_labels(self):
         label_file = filedialog.askopenfilename(title="Select Label File", filetypes=(("CSV files", "*.csv"), ("All files", "*.*")))
         if label_file:
-            labels_df = pd.read_csv(label_file)
-            self.selected_nodes = dict(zip(labels_df['node'], labels_df['label']))
-            self.unlabeled = [node for node in self.nodes if node not in self.selected_nodes]
-            self.unlabeled_count = len(self.unlabeled)
-            self.update_unlabeled_count()
-            self.plot_nodes_in_bbox(self.selection_rectangle_bbox)  # Update the graph to reflect the loaded labels
-
-    #TODO warn when overwriting labels
+            with profiler.stage("load labels", canvas=self.canvas) as counts:
+                with profiler.stage("read labels"):
+                    self.engine.load_labels(label_file)
+                counts["labeled"] = self.engine.store.labeled_count
+                with profiler.stage("refresh labels"):
+                    self.refresh_labels()  # Update the graph to reflect the loaded labels
+            self.show_profile()
+
     def assign_label_flooded(self):
         label = self.label_entry.get()
-        bbox = self.selection_rectangle_bbox
-        x = self.selection_label_coords[0] 
-        y = self.selection_label_coords[1]
-
-        #map the coordinates to the image
-        #x = bbox[0] + (bbox[2] - bbox[0]) * ((x - 0)/ (self.bg_image.width - 0))
-        #y = bbox[1] + (bbox[3] - bbox[1]) * ((self.bg_image.height - y)/ (self.bg_image.height - 0))
-
-        x = ceil(x)
-        y = ceil(y)
-
-
-
-
-        new_image = ski.color.rgb2gray(ski.util.img_as_ubyte(self.bg_image)[:,:,:3])
+        #map the click to world pixels, the engine maps them onto the flood raster
+        x, y = self.engine.transform.map("canvas", "world", *self.selection_label_coords)
 
-        flooded_nodes = self.find_flooded_nodes((y,x), new_image)
-        for node in flooded_nodes:
-            self.selected_nodes[node] = label
-            self.unlabeled.remove(node)
-        self.unlabeled_count = len(self.unlabeled)
         self.label_entry.delete(0, tk.END)
         self.label_window.destroy()
-        self.update_unlabeled_count()
-        self.plot_nodes_in_bbox(self.selection_rectangle_bbox)
-
         self.flood_fill_labeling_mode = True
-
         self.enable_buttons(exceptions=[self.load_button, self.load_image_button])
 
+        def work(task):
+            task.report(None, "Flood filling")
+            with profiler.stage("assign label flooded: select") as counts:
+                indices = self.engine.select_flood(x, y)
+                counts["nodes"] = len(indices)
+            return indices
+
+        def done(indices):
+            with profiler.stage("assign label flooded", canvas=self.canvas) as counts:
+                with profiler.stage("store labels"):
+                    indices = self.engine.assign(indices, label)
+                with profiler.stage("refresh labels"):
+                    self.refresh_labels(indices)
+                counts["nodes"] = len(indices)
+            self.show_profile()
+
+        self.run_task("Flood Fill", work, done)
+
+
+    def auto_label(self):
+        # label every node from the map regions, optionally named by a seed node,label table
+        if self.engine.raster is None:
+            messagebox.showinfo("Auto Label", "Load a map first, the regions come from its flood fills.")
+            return
+        seed_file = filedialog.askopenfilename(title="Select Seed Label File (cancel for numbered regions)", filetypes=(("CSV files", "*.csv"), ("All files", "*.*")))
+
+        def work(task):
+            # labeling the whole map's regions can take a while on large rasters
+            task.report(None, "Labeling map regions")
+            seed_labels = pd.read_csv(seed_file) if seed_file else None
+            return self.engine.region_labels(seed_labels)
+
+        def done(result):
+            self.engine.apply_region_labels(*result)
+            self.refresh_labels()
+
+        self.run_task("Auto Label", work, done)
+
+    def select_nodes_with_lasso(self):
+        if self.lasso_labeling_mode == True:
+            self.lasso_labeling_mode = False
+            self.canvas.delete("lasso")
+            self.lasso_select_button.config(text="Lasso Select Nodes")
+        else:
+            self.lasso_labeling_mode = True
+            self.lasso_select_button.config(text="Cancel Lasso Selection")
 
-    def find_flooded_nodes(self, seed, image):
-        # Flood the image from the seed point
-
-  
-        mask = flood(image, seed)
-
-        bbox = self.selection_rectangle_bbox
-
-        x = bbox[0] + (bbox[2] - bbox[0]) * ((self.x - min(self.x))/ (max(self.x) - min(self.x)))
-        y = bbox[1] + (bbox[3] - bbox[1]) * ((max(self.y) - self.y)/ (max(self.y) - min(self.y)))
-        
-        # Get the list of nodes that are in the flooded region
-
-        flooded_nodes = [self.nodes[i] for i in range(len(self.nodes)) if mask[int(y[i]), int(x[i])]]
-
-        return flooded_nodes
-    
     def select_nodes_with_flood_fill(self):
         if self.flood_fill_labeling_mode == True:
             self.flood_fill_labeling_mode = False
@@ -462,10 +882,19 @@ class GraphGUI:
         self.load_button.config(state="disabled")
         self.load_image_button.config(state="disabled")
         self.load_labels_button.config(state="disabled")
+        self.load_edges_button.config(state="disabled")
         self.select_button.config(state="disabled")
         self.flood_fill_select_button.config(state="disabled")
+        self.lasso_select_button.config(state="disabled")
+        self.auto_label_button.config(state="disabled")
+        self.undo_button.config(state="disabled")
+        self.redo_button.config(state="disabled")
+        self.propagate_button.config(state="disabled")
         self.save_button.config(state="disabled")
+        self.report_button.config(state="disabled")
         self.select_bbox_button.config(state="disabled")
+        self.open_project_button.config(state="disabled")
+        self.save_project_button.config(state="disabled")
 
         for button in to_disable:
             button.config(state="disabled")
@@ -478,10 +907,19 @@ class GraphGUI:
         self.load_button.config(state="normal")
         self.load_image_button.config(state="normal")
         self.load_labels_button.config(state="normal")
+        self.load_edges_button.config(state="normal")
         self.select_button.config(state="normal")
         self.flood_fill_select_button.config(state="normal")
+        self.lasso_select_button.config(state="normal")
+        self.auto_label_button.config(state="normal")
+        self.undo_button.config(state="normal")
+        self.redo_button.config(state="normal")
+        self.propagate_button.config(state="normal")
         self.save_button.config(state="normal")
+        self.report_button.config(state="normal")
         self.select_bbox_button.config(state="normal")
+        self.open_project_button.config(state="normal")
+        self.save_project_button.config(state="normal")
 
         for button in to_enable:
             button.config(state="normal")
@@ -492,6 +930,14 @@ class GraphGUI:
             
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Label graph nodes on a map.")
+    parser.add_argument("--profile", action="store_true", help="time every operation, shown in a status panel")
+    parser.add_argument("--cprofile", metavar="FILE", help="run cProfile for the session, stats written to FILE on exit")
+    parser.add_argument("--tracemalloc", action="store_true", help="trace the memory each stage allocates")
+    args = parser.parse_args()
+    profiler.configure(args.profile, args.cprofile, args.tracemalloc)
+
     root = tk.Tk()
     app = GraphGUI(root)
+    root.protocol("WM_DELETE_WINDOW", app.close)
     root.mainloop()
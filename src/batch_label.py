@@ -0,0 +1,305 @@
+"""Label many city networks from flood fill seeds, spread over a process pool.
+
+Run from the src directory:
+
+    python batch_label.py CITIES_DIR --out OUT_DIR [--workers 4]
+
+CITIES_DIR holds one folder per city laid out like data/chicago/, each with a
+batch.json naming its files and seeds:
+
+    {"nodes": "ChicagoSketch_node.csv", "map": "Chicago_neighborhoods_map.png",
+     "georef": [0, 0, 1999, 1598], "tolerance": null,
+     "seeds": [[1000, 800, "north lawndale"], [300, 200, "loop"]]}
+
+nodes and map may be left out when the folder holds one *node*.csv and one .png.
+seeds may also name a CSV file of the folder with x, y and label columns. The
+georef, the map rectangle the node extents are stretched onto, and the seeds are
+map pixels as for label_cli.py; a node flooded by several seeds keeps the label of
+the last one. OUT_DIR receives <city>.csv (node,label) per city and summary.csv; a
+city that cannot be read or labeled is listed there with its error and skipped.
+
+The main process reads the nodes and maps them onto map pixels. Workers decode the
+maps and flood fill the seeds, in chunks of seeds per city. Each city's grayscale
+raster (float32) and node pixel positions sit in shared memory blocks that workers
+attach by name, so only seeds and flooded node indices travel between processes.
+Only --in-flight cities, twice the workers by default, are prepared at a time; the
+next one is read when a city is finished and its blocks are released, so the
+shared memory in use does not grow with the number of cities. A worker
+keeps the tile minima and maxima (TileFlood) and the grid index of the cities it
+served last, each flood then costs what the engine's tiled find_flooded_nodes does.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from label_store import LabelStore
+from node_loader import load_nodes
+from raster import RasterCache, to_grayscale
+from spatial_index import GridIndex
+from transform import CoordinateSystem
+
+SPEC_FILE = "batch.json"
+SUMMARY_COLUMNS = ["city", "nodes", "labeled", "unlabeled", "labels", "seeds", "seeds_off_map", "seconds", "error"]
+CACHED_CITIES = 2 # cities whose flood state a worker keeps
+
+
+class SharedArray:
+    """numpy array in a shared memory block, created once and attached by name elsewhere."""
+
+    def __init__(self, shape, dtype, name=None):
+        size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+        self.shm = SharedMemory(name=name, create=name is None, size=size if name is None else 0)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    @property
+    def handle(self):
+        # what a worker needs to attach
+        return self.shm.name, self.array.shape, self.array.dtype.str
+
+    @classmethod
+    def attach(cls, handle):
+        name, shape, dtype = handle
+        return cls(shape, dtype, name)
+
+    def close(self):
+        self.array = None
+        self.shm.close()
+
+    def unlink(self):
+        self.close()
+        self.shm.unlink()
+
+
+class City:
+    """One network and map of a batch, as prepared by the main process."""
+
+    def __init__(self, name, folder):
+        self.name = name
+        with open(os.path.join(folder, SPEC_FILE)) as f:
+            spec = json.load(f)
+        self.nodes_path = os.path.join(folder, spec.get("nodes") or _only(folder, "*node*.csv"))
+        self.map_path = os.path.join(folder, spec.get("map") or _only(folder, "*.png"))
+        self.tolerance = spec.get("tolerance")
+        seeds = spec.get("seeds", [])
+        if isinstance(seeds, str):
+            seeds = pd.read_csv(os.path.join(folder, seeds))[["x", "y", "label"]].itertuples(index=False)
+        self.seeds = [(float(x), float(y), str(label)) for x, y, label in seeds]
+
+        self.table = load_nodes(self.nodes_path)
+        width, height = Image.open(self.map_path).size # header only, decoding is left to a worker
+        transform = CoordinateSystem()
+        transform.set_georef(self.table.extents, spec.get("georef") or (0, 0, width, height))
+        # world pixels are map pixels, so node image positions are their world positions
+        self.pixels = SharedArray((2, len(self.table)), np.float64)
+        self.pixels.array[0], self.pixels.array[1] = transform.map("data", "world", self.table.x, self.table.y)
+        try:
+            self.gray = SharedArray((height, width), np.float32)
+        except BaseException:
+            self.pixels.unlink()
+            raise
+        self.flooded = [None] * len(self.seeds)
+        self.pending = 0
+        self.start = time.perf_counter()
+
+    def release(self):
+        self.pixels.unlink()
+        self.gray.unlink()
+
+    def labels(self):
+        # apply the seeds in order, later ones overwrite earlier ones
+        store = LabelStore(len(self.table))
+        for (_, _, label), indices in zip(self.seeds, self.flooded):
+            if indices is not None:
+                store.assign(indices, label)
+        return store
+
+
+def _only(folder, pattern):
+    matches = glob.glob(os.path.join(folder, pattern))
+    if len(matches) != 1:
+        raise ValueError(f"{folder}: expected one {pattern} file, found {len(matches)}; name it in {SPEC_FILE}")
+    return os.path.basename(matches[0])
+
+
+# worker side: shared arrays and flood state of the cities served last
+_cities = OrderedDict()
+
+
+def decode_map(path, gray_handle):
+    gray = SharedArray.attach(gray_handle)
+    gray.array[:] = to_grayscale(Image.open(path))
+    gray.close()
+
+
+def flood_seeds(gray_handle, pixels_handle, tolerance, seeds):
+    """Flooded node indices per (x, y) map pixel seed, None for seeds off the map."""
+    key = (gray_handle[0], tolerance)
+    if key not in _cities:
+        gray = SharedArray.attach(gray_handle)
+        pixels = SharedArray.attach(pixels_handle)
+        raster = RasterCache(gray.array, tolerance, tiled=True)
+        _cities[key] = (gray, pixels, raster, GridIndex(pixels.array[0], pixels.array[1]))
+        while len(_cities) > CACHED_CITIES:
+            _, (old_gray, old_pixels, _, _) = _cities.popitem(last=False)
+            old_gray.close()
+            old_pixels.close()
+    _cities.move_to_end(key)
+    gray, pixels, raster, index = _cities[key]
+
+    px, py = pixels.array
+    results = []
+    for x, y in seeds:
+        seed = (int(np.floor(y)), int(np.floor(x)))
+        if not (0 <= seed[0] < raster.shape[0] and 0 <= seed[1] < raster.shape[1]):
+            results.append(None)
+            continue
+        region = raster.flood_region(seed)
+        candidates = index.query_box(*region.bounds())
+        flooded = candidates[region.contains(px[candidates], py[candidates])]
+        results.append(flooded.astype(np.int32))
+    return results
+
+
+class InlineExecutor:
+    # runs submitted work right away, for --workers 0
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self):
+        pass
+
+
+def run_batch(cities_dir, out_dir, workers=None, chunk=8, in_flight=None):
+    """Label every city folder of cities_dir, returns the summary frame.
+
+    At most in_flight cities (default twice the workers) hold shared memory at a time.
+    A city that fails, from its batch.json to writing its labels, gets its error in
+    the summary's error column and the batch goes on with the next one.
+    """
+    names = sorted(name for name in os.listdir(cities_dir)
+                   if os.path.exists(os.path.join(cities_dir, name, SPEC_FILE)))
+    if not names:
+        raise ValueError(f"no city folder with a {SPEC_FILE} in {cities_dir}")
+    os.makedirs(out_dir, exist_ok=True)
+    if in_flight is None:
+        in_flight = 1 if workers == 0 else 2 * (workers or os.cpu_count() or 1)
+    executor = InlineExecutor() if workers == 0 else ProcessPoolExecutor(workers)
+    waiting = iter(names)
+    cities = {}
+    pending = {}
+    rows = []
+    start = time.perf_counter()
+
+    def prepare_next():
+        for name in waiting:
+            try:
+                city = City(name, os.path.join(cities_dir, name))
+            except Exception as e:
+                rows.append(failed_city(name, e))
+                continue
+            cities[name] = city
+            pending[executor.submit(decode_map, city.map_path, city.gray.handle)] = (name, None)
+            city.pending = 1
+            return
+
+    def drop(name, error=None):
+        # the city is done, or failed; its tasks still running find it gone
+        city = cities.pop(name)
+        city.release()
+        if error is not None:
+            rows.append(failed_city(name, error))
+        prepare_next()
+
+    try:
+        for _ in range(max(in_flight, 1)):
+            prepare_next()
+
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                name, first = pending.pop(future)
+                city = cities.get(name)
+                if city is None:
+                    continue
+                try:
+                    result = future.result()
+                except Exception as e:
+                    drop(name, e)
+                    continue
+                city.pending -= 1
+                if first is None:
+                    # map decoded, its seeds can be flooded
+                    for i in range(0, len(city.seeds), chunk):
+                        seeds = [(x, y) for x, y, _ in city.seeds[i:i + chunk]]
+                        pending[executor.submit(flood_seeds, city.gray.handle, city.pixels.handle,
+                                                city.tolerance, seeds)] = (name, i)
+                        city.pending += 1
+                else:
+                    city.flooded[first:first + len(result)] = result
+                if city.pending == 0:
+                    try:
+                        rows.append(finish_city(city, out_dir))
+                    except Exception as e:
+                        drop(name, e)
+                    else:
+                        drop(name)
+    finally:
+        executor.shutdown()
+        for city in cities.values():
+            city.release()
+
+    # failed cities leave the counts empty, the others stay integers
+    summary = pd.DataFrame(rows, columns=SUMMARY_COLUMNS).astype(
+        {column: "Int64" for column in SUMMARY_COLUMNS[1:-2]})
+    summary.to_csv(os.path.join(out_dir, "summary.csv"), index=False)
+    elapsed = time.perf_counter() - start
+    seeds = int(summary["seeds"].sum())
+    failed = int(summary["error"].notna().sum())
+    print(f"{len(summary)} cities ({failed} failed), {seeds} seeds in {elapsed:.2f} s "
+          f"({seeds / elapsed:.1f} seeds/s)", file=sys.stderr)
+    return summary
+
+
+def failed_city(name, error):
+    return {"city": name, "error": f"{type(error).__name__}: {error}"}
+
+
+def finish_city(city, out_dir):
+    store = city.labels()
+    store.save_csv(os.path.join(out_dir, f"{city.name}.csv"), city.table.ids)
+    return {"city": city.name, "nodes": len(store), "labeled": store.labeled_count,
+            "unlabeled": store.unlabeled_count, "labels": int(np.count_nonzero(store.counts())),
+            "seeds": len(city.seeds), "seeds_off_map": sum(indices is None for indices in city.flooded),
+            "seconds": round(time.perf_counter() - city.start, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     epilog="\n".join(__doc__.splitlines()[1:]),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cities", help="directory with one folder per city")
+    parser.add_argument("--out", required=True, help="directory for the labels CSVs and summary.csv")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core, 0: no pool)")
+    parser.add_argument("--chunk", type=int, default=8, help="seeds per task")
+    parser.add_argument("--in-flight", type=int, help="cities prepared at a time (default: twice the workers)")
+    args = parser.parse_args(argv)
+    print(run_batch(args.cities, args.out, args.workers, args.chunk, args.in_flight).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
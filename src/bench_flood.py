@@ -0,0 +1,109 @@
+"""Flood-fill selection benchmark: per-click flood against the cached component lookup.
+
+Run from the src directory:  python bench_flood.py [--clicks 20] [--size 800 600]
+
+The map is resized the way load_image does, the ChicagoSketch nodes are spread over
+the whole image, and each click is answered once by converting and flooding the image
+(the old assign_label_flooded path) and once by RasterCache/NodeComponents. Both must
+select the same nodes.
+
+With --levels the GUI setup is timed instead: the map fitted to an 800x600 world and
+flood filled on the native map or one of its halvings. For each level the region
+labeling time and how closely its selections agree with the native ones is printed.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import skimage as ski
+from PIL import Image
+from skimage.morphology import flood
+
+from raster import RasterCache, NodeComponents
+from labeling_engine import LabelingEngine
+from render import data_extents, node_screen_coords
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "chicago")
+
+
+def legacy_click(image, seed, px, py):
+    gray = ski.color.rgb2gray(ski.util.img_as_ubyte(image)[:, :, :3])
+    mask = flood(gray, seed)
+    return np.flatnonzero(mask[py.astype(int), px.astype(int)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clicks", type=int, default=20)
+    parser.add_argument("--size", type=int, nargs=2, default=None, metavar=("WIDTH", "HEIGHT"),
+                        help="resize the map first (default: native resolution)")
+    parser.add_argument("--map", default=os.path.join(DATA_DIR, "Chicago_neighborhoods_map.png"))
+    parser.add_argument("--nodes", default=os.path.join(DATA_DIR, "ChicagoSketch_node.csv"))
+    parser.add_argument("--levels", type=int, nargs="+", help="compare flood fills on these pyramid levels")
+    args = parser.parse_args()
+    if args.levels:
+        compare_levels(args)
+        return
+
+    image = Image.open(args.map)
+    if args.size:
+        image = image.resize(tuple(args.size), Image.Resampling.LANCZOS)
+    data = pd.read_csv(args.nodes)
+    bbox = (0, 0, image.width - 1, image.height - 1)
+    px, py = node_screen_coords(data['x'], data['y'], data_extents(data['x'], data['y']), bbox)
+
+    start = time.perf_counter()
+    raster = RasterCache.from_image(image)
+    components = NodeComponents(raster, px, py)
+    build = time.perf_counter() - start
+
+    # seed on the nodes themselves so every click selects something
+    rng = np.random.default_rng(0)
+    seeds = [(int(py[i]), int(px[i])) for i in rng.choice(len(px), args.clicks, replace=False)]
+
+    legacy = []
+    cached = []
+    for seed in seeds:
+        start = time.perf_counter()
+        expected = legacy_click(image, seed, px, py)
+        legacy.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        found = np.sort(components.flooded(seed))
+        cached.append(time.perf_counter() - start)
+        assert np.array_equal(found, expected), seed
+
+    print(f"map {image.width}x{image.height}, {len(px)} nodes, {args.clicks} clicks")
+    print(f"cache build (once per load): {build * 1e3:.1f} ms")
+    print(f"per click, convert + flood:   {np.mean(legacy) * 1e3:.2f} ms")
+    print(f"per click, component lookup:  {np.mean(cached) * 1e3:.4f} ms")
+
+
+def compare_levels(args, world_size=(800, 600)):
+    source = Image.open(args.map)
+    engine = LabelingEngine()
+    engine.load_nodes(args.nodes)
+    engine.set_bbox((0, 0) + world_size)
+    px, py = engine.node_pixels()
+    rng = np.random.default_rng(0)
+    clicks = rng.choice(len(px), args.clicks, replace=False)
+
+    reference = None
+    for level in args.levels:
+        start = time.perf_counter()
+        engine.set_raster(RasterCache.from_image(source.reduce(2 ** level) if level else source), world_size)
+        build = time.perf_counter() - start
+        selections = [engine.select_flood(px[i], py[i]) for i in clicks]
+        if reference is None:
+            reference = selections
+        overlap = np.mean([len(np.intersect1d(a, b)) / max(len(np.union1d(a, b)), 1)
+                           for a, b in zip(selections, reference)])
+        height, width = engine.raster.shape
+        print(f"level {level}: raster {width}x{height}, regions {build * 1e3:7.1f} ms, "
+              f"mean overlap with level {args.levels[0]}: {overlap:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Graph labeling benchmark: CSR construction, label propagation and connected selection.
+
+Run from the src directory:  python bench_graph.py [--sizes 100000 1000000]
+
+The ChicagoSketch network is loaded from its edge file, every 50th node is labeled
+by hand and propagation fills the rest. Synthetic road-like networks (square lattices
+with a fraction of their links removed, about two edges per node) are timed at the
+given edge counts the same way.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from labeling_engine import LabelingEngine
+from node_graph import Adjacency
+from bench_flood import DATA_DIR
+
+
+def lattice_edges(edges, seed=0):
+    # nodes on a square lattice, right and down links kept with probability 0.9
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(edges / 1.8)))
+    node = np.arange(side * side).reshape(side, side)
+    source = np.concatenate([node[:, :-1].ravel(), node[:-1, :].ravel()])
+    target = np.concatenate([node[:, 1:].ravel(), node[1:, :].ravel()])
+    keep = rng.random(len(source)) < 0.9
+    x, y = np.meshgrid(np.arange(side, dtype=np.float64), np.arange(side, dtype=np.float64))
+    nodes = pd.DataFrame({"node": node.ravel(), "x": x.ravel(), "y": y.ravel()})
+    return nodes, source[keep], target[keep]
+
+
+def time_labeling(engine, seeds, label_count, box, start):
+    for i, label in enumerate(np.array_split(seeds, label_count)):
+        engine.assign(label, f"group {i}")
+    t = time.perf_counter()
+    changed = engine.propagate_labels()
+    propagate = time.perf_counter() - t
+    t = time.perf_counter()
+    selected = engine.select_connected(box, *start)
+    connected = time.perf_counter() - t
+    return propagate, len(changed), connected, len(selected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000], help="synthetic edge counts")
+    parser.add_argument("--nodes", default=os.path.join(DATA_DIR, "ChicagoSketch_node.csv"))
+    parser.add_argument("--edges", default=os.path.join(DATA_DIR, "ChicagoSketch_net.csv"))
+    args = parser.parse_args()
+
+    engine = LabelingEngine()
+    engine.load_nodes(args.nodes)
+    engine.set_bbox((0, 0, 1999, 1598))
+    t = time.perf_counter()
+    engine.load_edges(args.edges)
+    load = time.perf_counter() - t
+    propagate, filled, connected, selected = time_labeling(
+        engine, np.arange(0, len(engine.nodes), 50), 4, (500, 400, 1500, 1200), (1000, 800))
+    print(f"chicago: {len(engine.nodes)} nodes, {engine.graph.edge_count} edges, load {load * 1e3:.1f} ms, "
+          f"propagate {propagate * 1e3:.2f} ms ({filled} filled), connected box {connected * 1e3:.2f} ms ({selected} nodes)")
+
+    for edges in args.sizes:
+        nodes, source, target = lattice_edges(edges)
+        engine = LabelingEngine()
+        engine.set_nodes(nodes)
+        engine.set_bbox((0, 0, 1000, 1000))
+        t = time.perf_counter()
+        engine.graph = Adjacency.from_edges(source, target, len(nodes))
+        build = time.perf_counter() - t
+        rng = np.random.default_rng(1)
+        seeds = rng.choice(len(nodes), 20, replace=False)
+        propagate, filled, connected, selected = time_labeling(
+            engine, seeds, 5, (400, 400, 600, 600), (500, 500))
+        print(f"{engine.graph.edge_count:>8} edges: CSR build {build * 1e3:7.1f} ms, propagate {propagate * 1e3:8.1f} ms "
+              f"({filled} filled), connected box {connected * 1e3:6.2f} ms ({selected} nodes)")
+
+
+if __name__ == "__main__":
+    main()
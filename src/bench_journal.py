@@ -0,0 +1,73 @@
+"""Microbenchmark of autosaving labels: journal appends against whole-file rewrites.
+
+Run from the src directory:  python bench_journal.py [--nodes 1000000] [--selection 2000]
+
+A session of --edits selections of --selection nodes each is labeled once with the
+labels CSV rewritten after every edit, as a save after each change would, and once
+through a LabelJournal appending each edit. Undo and redo of one edit and the
+recovery of the whole session from the journal directory are timed too.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from label_store import LabelStore
+from label_journal import LabelJournal
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=1000000)
+    parser.add_argument("--selection", type=int, default=2000)
+    parser.add_argument("--edits", type=int, default=20)
+    args = parser.parse_args()
+
+    n = args.nodes
+    nodes = np.arange(n) * 7 + 3
+    rng = np.random.default_rng(0)
+    selections = [rng.choice(n, args.selection, replace=False) for _ in range(args.edits)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = LabelStore(n)
+        filename = os.path.join(tmp, "labels.csv")
+        start = time.perf_counter()
+        for i, indices in enumerate(selections):
+            store.assign(indices, f"region {i % 10}")
+            store.save_csv(filename, nodes)
+        rewrite = (time.perf_counter() - start) / args.edits
+
+        store = LabelStore(n)
+        journal = LabelJournal(store, os.path.join(tmp, "journal"))
+        start = time.perf_counter()
+        for i, indices in enumerate(selections):
+            journal.assign(indices, f"region {i % 10}")
+        append = (time.perf_counter() - start) / args.edits
+        size = os.path.getsize(journal.journal_path)
+
+        start = time.perf_counter()
+        journal.undo()
+        undo = time.perf_counter() - start
+        start = time.perf_counter()
+        journal.redo()
+        redo = time.perf_counter() - start
+        journal.close()
+
+        recovered = LabelStore(n)
+        start = time.perf_counter()
+        LabelJournal(recovered, os.path.join(tmp, "journal"), recover=True).close()
+        recover = time.perf_counter() - start
+        assert np.array_equal(recovered.codes, store.codes)
+
+    print(f"CSV rewrite per edit:       {rewrite * 1e3:10.2f} ms")
+    print(f"journal append per edit:    {append * 1e3:10.2f} ms")
+    print(f"journal size:               {size / 1e3:10.1f} kB")
+    print(f"undo one edit:              {undo * 1e3:10.2f} ms")
+    print(f"redo one edit:              {redo * 1e3:10.2f} ms")
+    print(f"recover session:            {recover * 1e3:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Microbenchmark of label bookkeeping: one selection labeling every node.
+
+Run from the src directory:  python bench_label_store.py [--nodes 100000]
+
+The old bookkeeping (a node -> label dict plus an unlabeled list with per-node
+membership tests and removals) is quadratic and only timed up to --legacy-limit
+nodes. The LabelStore is timed for assign, counts, the unlabeled query and a CSV
+save/load round trip.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from label_store import LabelStore
+
+
+def legacy_assign(nodes, selection, label):
+    selected_nodes = {}
+    unlabeled = list(nodes)
+    for node in selection:
+        selected_nodes[node] = label
+        if node in unlabeled:
+            unlabeled.remove(node)
+    return selected_nodes, unlabeled
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=100000)
+    parser.add_argument("--legacy-limit", type=int, default=20000)
+    args = parser.parse_args()
+
+    n = args.nodes
+    nodes = np.arange(n) * 7 + 3
+    node_index = pd.Index(nodes)
+    # selections do not come in file order, so label in a shuffled order
+    indices = np.random.default_rng(0).permutation(n)
+
+    if n <= args.legacy_limit:
+        legacy, _ = timed(legacy_assign, list(nodes), list(nodes[indices]), "region")
+        print(f"legacy dict + list assign:  {legacy * 1e3:10.2f} ms")
+    else:
+        print(f"legacy dict + list assign:  skipped above {args.legacy_limit} nodes")
+
+    store = LabelStore(n)
+    assign, _ = timed(store.assign, indices, "region")
+    relabel, _ = timed(store.assign, indices[::2], "other region")
+    counts, _ = timed(store.counts)
+    unlabeled, _ = timed(store.unlabeled_indices)
+    print(f"store assign all nodes:     {assign * 1e3:10.3f} ms")
+    print(f"store relabel half:         {relabel * 1e3:10.3f} ms")
+    print(f"store counts:               {counts * 1e3:10.3f} ms")
+    print(f"store unlabeled query:      {unlabeled * 1e3:10.3f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "labels.csv")
+        save, _ = timed(store.save_csv, filename, nodes)
+        loaded = LabelStore(n)
+        load, _ = timed(loaded.load_csv, filename, node_index)
+        assert np.array_equal(np.asarray(loaded.categories)[loaded.codes], np.asarray(store.categories)[store.codes])
+    print(f"store save CSV:             {save * 1e3:10.2f} ms")
+    print(f"store load CSV:             {load * 1e3:10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
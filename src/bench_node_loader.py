@@ -0,0 +1,80 @@
+"""Load time and peak memory of the chunked node loader against a plain pd.read_csv.
+
+Run from the src directory:  python bench_node_loader.py [--rows 1000000 10000000] [--string-ids]
+
+Synthetic node CSVs are written to a temporary directory. Every load runs in a fresh
+interpreter so the reported peak resident set size belongs to that load alone.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from node_loader import load_nodes
+
+
+def write_nodes(filename, rows, string_ids, chunk=1_000_000, seed=0):
+    rng = np.random.default_rng(seed)
+    with open(filename, "w") as f:
+        f.write("node,x,y\n")
+        for start in range(0, rows, chunk):
+            n = min(chunk, rows - start)
+            ids = np.arange(start, start + n)
+            frame = pd.DataFrame({"node": [f"n{i}" for i in ids] if string_ids else ids,
+                                  "x": rng.integers(600000, 720000, n),
+                                  "y": rng.integers(1800000, 2000000, n)})
+            frame.to_csv(f, header=False, index=False)
+
+
+def measure(method, filename):
+    # runs in the child interpreter
+    start = time.perf_counter()
+    if method == "read_csv":
+        data = pd.read_csv(filename)
+        size = int(data.memory_usage(deep=True).sum())
+    else:
+        table = load_nodes(filename)
+        size = table.nbytes
+    seconds = time.perf_counter() - start
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"seconds": seconds, "peak_rss_mb": peak_kb / 1024, "data_mb": size / 2**20}))
+
+
+def run_child(method, filename):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", method, filename],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--string-ids", action="store_true", help="use string node ids like data/test_data.csv")
+    parser.add_argument("--measure", nargs=2, metavar=("METHOD", "FILE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(*args.measure)
+        return
+
+    print(f"{'rows':>10} {'method':>10} {'load (s)':>9} {'peak RSS (MB)':>14} {'columns (MB)':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            filename = os.path.join(tmp, f"nodes_{rows}.csv")
+            write_nodes(filename, rows, args.string_ids)
+            for method in ("read_csv", "chunked"):
+                result = run_child(method, filename)
+                print(f"{rows:>10} {method:>10} {result['seconds']:>9.2f} {result['peak_rss_mb']:>14.1f} "
+                      f"{result['data_mb']:>13.1f}")
+            os.remove(filename)
+
+
+if __name__ == "__main__":
+    main()
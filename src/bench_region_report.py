@@ -0,0 +1,97 @@
+"""Region report benchmark: full build and incremental updates on a large network.
+
+Run from the src directory:  python bench_region_report.py [--edges 3000000] [--labels 100]
+
+A lattice-like network (bench_graph.lattice_edges, about 1.8 edges per node) is labeled into a grid of
+--labels rectangular regions. The report (node counts, centroids, extents and the
+edge cut per label) is built once, then updated after box selections of several
+sizes are relabeled through the engine, and after undoing them. For comparison the
+same statistics are recomputed with pandas from the labels frame, as the separate
+scripts did after save_groups. The table of edges per label pair is timed too and
+checked against the pandas cut. The updated report must equal a fresh build.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from labeling_engine import LabelingEngine
+from node_graph import Adjacency
+from region_report import RegionReport
+from bench_graph import lattice_edges
+
+
+def pandas_report(engine, source, target):
+    # the old way: statistics from the saved node,label table and the edge list
+    labels = engine.labels_frame()
+    nodes = pd.DataFrame({"node": engine.nodes, "x": engine.x, "y": engine.y}).merge(labels, on="node", how="left")
+    stats = nodes.groupby("label", dropna=False).agg(nodes=("node", "size"), centroid_x=("x", "mean"),
+                                                      centroid_y=("y", "mean"), min_x=("x", "min"), max_x=("x", "max"),
+                                                      min_y=("y", "min"), max_y=("y", "max"))
+    label_of = nodes["label"].to_numpy()
+    edges = pd.DataFrame({"a": label_of[source], "b": label_of[target]})
+    cut = edges[edges["a"] != edges["b"]].groupby(["a", "b"], dropna=False).size()
+    return stats, cut
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--edges", type=int, default=3_000_000)
+    parser.add_argument("--labels", type=int, default=100)
+    parser.add_argument("--boxes", type=int, default=10)
+    args = parser.parse_args()
+
+    nodes, source, target = lattice_edges(args.edges)
+    engine = LabelingEngine()
+    engine.set_nodes(nodes)
+    n = len(engine.nodes)
+    engine.graph = Adjacency.from_edges(source, target, n)
+    side = int(np.sqrt(args.labels))
+    cell = (engine.x.max() + 1) / side
+    region = (engine.y // cell).astype(np.int64) * side + (engine.x // cell).astype(np.int64)
+    for i in range(side * side):
+        engine.store.code_for(f"region {i}")
+    engine.journal.set_codes(np.arange(n), region.astype(np.int32))
+    print(f"{n} nodes, {engine.graph.edge_count} edges, {side * side} labels")
+
+    start = time.perf_counter()
+    report = engine.region_report()
+    print(f"full build:                  {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+    start = time.perf_counter()
+    _, pandas_cut = pandas_report(engine, source, target)
+    print(f"pandas recompute:            {(time.perf_counter() - start) * 1e3:8.1f} ms")
+
+    start = time.perf_counter()
+    cuts = engine.region_cut_frame()
+    print(f"label pair table:            {(time.perf_counter() - start) * 1e3:8.1f} ms, {len(cuts)} pairs")
+    assert cuts["edges"].sum() == pandas_cut.sum()
+
+    rng = np.random.default_rng(0)
+    width = engine.x.max()
+    for fraction in (0.01, 0.05, 0.2):
+        updates, undos, selected = [], [], 0
+        for i in range(args.boxes):
+            size = fraction * width
+            x0, y0 = rng.uniform(0, width - size, 2)
+            indices = engine.index.query_box(x0, y0, x0 + size, y0 + size)
+            selected += len(indices)
+            start = time.perf_counter()
+            engine.assign(indices, f"box {i}")
+            updates.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            engine.undo()
+            undos.append(time.perf_counter() - start)
+        print(f"box of {fraction:4.0%} side, {selected // args.boxes:>7} nodes: assign + update "
+              f"{np.median(updates) * 1e3:7.1f} ms, undo + update {np.median(undos) * 1e3:7.1f} ms")
+
+    engine.assign(engine.index.query_box(0, 0, width / 3, width / 3), "corner")
+    fresh = RegionReport(engine.x, engine.y, engine.store.codes, engine.graph, len(engine.store.categories))
+    pd.testing.assert_frame_equal(report.frame(engine.store.categories), fresh.frame(engine.store.categories))
+    rows = min(report.rows, fresh.rows)
+    assert (report.pairs[:rows, :rows] != fresh.pairs[:rows, :rows]).nnz == 0
+
+
+if __name__ == "__main__":
+    main()
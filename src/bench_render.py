@@ -0,0 +1,93 @@
+"""Redraw-time benchmark for the node rendering layer.
+
+Run from the src directory:  python bench_render.py [--sizes 1000 10000 100000]
+
+The draw-list construction (screen coordinates, fill colours and the batched Tcl
+commands) is always timed. When a display is available the full canvas redraw is
+timed as well. The old per-row iterrows loop is timed up to --legacy-limit nodes,
+beyond that it does not finish in reasonable time.
+"""
+import argparse
+import time
+import tkinter as tk
+
+import numpy as np
+import pandas as pd
+
+from render import data_extents, node_screen_coords, node_fill_colors, oval_commands, create_ovals
+
+
+def synthetic_nodes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"node": np.arange(n), "x": rng.uniform(0, 1e6, n), "y": rng.uniform(0, 1e6, n)})
+
+
+def legacy_draw_list(data, unlabeled, bbox):
+    # the pre-vectorization loop from plot_nodes_in_bbox, without the canvas calls
+    x_col, y_col = data['x'], data['y']
+    items = []
+    for index, row in data.iterrows():
+        x = bbox[0] + (bbox[2] - bbox[0]) * ((row['x'] - min(x_col)) / (max(x_col) - min(x_col)))
+        y = bbox[1] + (bbox[3] - bbox[1]) * ((max(y_col) - row['y']) / (max(y_col) - min(y_col)))
+        items.append((x - 2, y - 2, x + 2, y + 2, 'red' if row['node'] in unlabeled else 'white'))
+    return items
+
+
+def vectorized_draw_list(data, extents, labeled, bbox):
+    x, y = node_screen_coords(data['x'], data['y'], extents, bbox)
+    return oval_commands(".c", x, y, 2, node_fill_colors(labeled))
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def open_canvas():
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        return None, None
+    canvas = tk.Canvas(root, width=800, height=600)
+    canvas.pack()
+    return root, canvas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-limit", type=int, default=10000)
+    args = parser.parse_args()
+
+    bbox = (0, 0, 800, 600)
+    root, canvas = open_canvas()
+    if canvas is None:
+        print("no display available, skipping the canvas redraw timings")
+
+    print(f"{'nodes':>8} {'legacy (s)':>12} {'draw list (s)':>14} {'canvas redraw (s)':>18}")
+    for n in args.sizes:
+        data = synthetic_nodes(n)
+        labeled = np.zeros(n, dtype=bool)
+        labeled[::2] = True
+        unlabeled = list(data['node'][~labeled])
+
+        legacy = timed(legacy_draw_list, data, unlabeled, bbox) if n <= args.legacy_limit else float("nan")
+        extents = data_extents(data['x'], data['y'])
+        draw_list = timed(vectorized_draw_list, data, extents, labeled, bbox)
+
+        redraw = float("nan")
+        if canvas is not None:
+            canvas.delete("all")
+            x, y = node_screen_coords(data['x'], data['y'], extents, bbox)
+            redraw = timed(create_ovals, canvas, x, y, 2, node_fill_colors(labeled))
+            root.update()
+
+        print(f"{n:>8} {legacy:>12.4f} {draw_list:>14.4f} {redraw:>18.4f}")
+
+    if root is not None:
+        root.destroy()
+
+
+if __name__ == "__main__":
+    main()
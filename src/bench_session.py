@@ -0,0 +1,84 @@
+"""Labeling-session benchmark: canvas item count and per-label latency over many labels.
+
+Run from the src directory:  python bench_session.py [--nodes 10000] [--labels 200]
+
+Each simulated label selects a random box of nodes and refreshes the canvas, once with
+the old redraw-everything path (a new background image and a new oval per node on
+every label) and once with the NodeLayer registry, which only recolours the ovals that
+changed. Needs a display.
+"""
+import argparse
+import sys
+import time
+import tkinter as tk
+
+import numpy as np
+from PIL import Image, ImageTk
+
+from render import data_extents, node_screen_coords, node_fill_colors, create_ovals, NodeLayer
+from bench_render import synthetic_nodes
+
+
+def random_box(rng, width, height, size=120):
+    x0 = rng.uniform(0, width - size)
+    y0 = rng.uniform(0, height - size)
+    return x0, y0, x0 + size, y0 + size
+
+
+def run_session(canvas, photo, sx, sy, n_labels, incremental, seed=0):
+    rng = np.random.default_rng(seed)
+    canvas.delete("all")
+    labeled = np.zeros(len(sx), dtype=bool)
+    layer = NodeLayer(canvas)
+    canvas.create_image(0, 0, anchor=tk.NW, image=photo)
+    layer.build(sx, sy, 2, labeled)
+
+    latencies = []
+    item_counts = []
+    for _ in range(n_labels):
+        box = random_box(rng, 800, 600)
+        start = time.perf_counter()
+        labeled[(sx >= box[0]) & (sx <= box[2]) & (sy >= box[1]) & (sy <= box[3])] = True
+        if incremental:
+            layer.recolor(labeled)
+        else:
+            canvas.create_image(0, 0, anchor=tk.NW, image=photo)
+            create_ovals(canvas, sx, sy, 2, node_fill_colors(labeled))
+        canvas.update_idletasks()
+        latencies.append(time.perf_counter() - start)
+        item_counts.append(len(canvas.find_all()))
+    return np.asarray(latencies), np.asarray(item_counts)
+
+
+def report(name, latencies, item_counts):
+    quarter = max(1, len(latencies) // 4)
+    print(f"{name}: items {item_counts[0]} -> {item_counts[-1]}, "
+          f"mean latency first quarter {latencies[:quarter].mean() * 1e3:.2f} ms, "
+          f"last quarter {latencies[-quarter:].mean() * 1e3:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--labels", type=int, default=200)
+    parser.add_argument("--legacy-labels", type=int, default=50)
+    args = parser.parse_args()
+
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        sys.exit("no display available, this benchmark needs a Tk canvas")
+    canvas = tk.Canvas(root, width=800, height=600)
+    canvas.pack()
+    photo = ImageTk.PhotoImage(Image.new("RGB", (800, 600), "gray"))
+
+    data = synthetic_nodes(args.nodes)
+    sx, sy = node_screen_coords(data['x'], data['y'], data_extents(data['x'], data['y']), (0, 0, 800, 600))
+
+    report("redraw everything", *run_session(canvas, photo, sx, sy, args.legacy_labels, incremental=False))
+    report("node registry    ", *run_session(canvas, photo, sx, sy, args.labels, incremental=True))
+    root.destroy()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Headless benchmark of GridIndex against the full boolean-mask scans.
+
+Run from the src directory:  python bench_spatial_index.py [--sizes 10000 100000 1000000]
+
+For each size it times index construction, box queries, nearest-node picking and
+polygon queries, and the equivalent full scan over every node coordinate. The lasso
+columns select with a smooth 1000-vertex freehand outline over about a third of the
+nodes: through the index, as a banded scan of all nodes, and with the per-edge loop
+the polygon test used before.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from spatial_index import GridIndex, points_in_polygon
+
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def random_polygon(rng, cx, cy, radius, vertices=64):
+    angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+    radii = radius * rng.uniform(0.5, 1.0, vertices)
+    return cx + radii * np.cos(angles), cy + radii * np.sin(angles)
+
+
+def freehand_lasso(rng, cx, cy, radius, vertices=1000):
+    # closed outline with lobes and a slow hand wobble, like a dragged mouse path
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    wobble = np.convolve(rng.standard_normal(vertices) * 0.2, np.ones(25) / 25, mode="same")
+    radii = radius * (1 + 0.3 * np.sin(7 * angles) + wobble)
+    return cx + radii * np.cos(angles), cy + radii * np.sin(angles)
+
+
+def edge_loop_polygon(x, y, px, py):
+    # the earlier test: one pass over all points per polygon edge
+    inside = np.zeros(len(x), dtype=bool)
+    for i in range(len(px)):
+        ax, ay, bx, by = px[i - 1], py[i - 1], px[i], py[i]
+        if ay == by:
+            continue
+        crosses = (ay > y) != (by > y)
+        inside ^= crosses & (x < ax + (y - ay) * (bx - ax) / (by - ay))
+    return inside
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'nodes':>8} {'build':>9} {'box idx':>9} {'box mask':>9} {'pick idx':>9} {'pick scan':>9} "
+          f"{'poly idx':>9} {'poly scan':>9} {'lasso idx':>9} {'lasso scan':>10} {'lasso loop':>10}   (ms)")
+    for n in args.sizes:
+        x = rng.uniform(0, 1e6, n)
+        y = rng.uniform(0, 1e6, n)
+        build, index = best_of(lambda: GridIndex(x, y), repeat=1)
+
+        box = (4e5, 4e5, 4.5e5, 4.6e5)
+        box_idx, found = best_of(lambda: index.query_box(*box))
+        box_mask, expected = best_of(lambda: np.flatnonzero((x >= box[0]) & (x <= box[2]) & (y >= box[1]) & (y <= box[3])))
+        assert np.array_equal(found, expected)
+
+        qx, qy = 123456.7, 654321.0
+        pick_idx, found = best_of(lambda: index.nearest(qx, qy))
+        pick_scan, expected = best_of(lambda: int(np.argmin((x - qx) ** 2 + (y - qy) ** 2)))
+        assert found == expected
+
+        px, py = random_polygon(rng, 5e5, 5e5, 5e4)
+        poly_idx, found = best_of(lambda: index.query_polygon(px, py))
+        poly_scan, expected = best_of(lambda: np.flatnonzero(points_in_polygon(x, y, px, py)), repeat=1)
+        assert np.array_equal(found, expected)
+
+        px, py = freehand_lasso(rng, 5e5, 5e5, 3e5)
+        lasso_idx, found = best_of(lambda: index.query_polygon(px, py))
+        lasso_scan, expected = best_of(lambda: np.flatnonzero(points_in_polygon(x, y, px, py)), repeat=1)
+        lasso_loop, legacy = best_of(lambda: np.flatnonzero(edge_loop_polygon(x, y, px, py)), repeat=1)
+        assert np.array_equal(found, expected) and np.array_equal(found, legacy)
+
+        print(f"{n:>8} {build * 1e3:>9.2f} {box_idx * 1e3:>9.3f} {box_mask * 1e3:>9.3f} {pick_idx * 1e3:>9.3f} "
+              f"{pick_scan * 1e3:>9.3f} {poly_idx * 1e3:>9.3f} {poly_scan * 1e3:>9.3f} {lasso_idx * 1e3:>9.2f} "
+              f"{lasso_scan * 1e3:>10.2f} {lasso_loop * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Benchmark suite: the labeling pipeline on the Chicago data and synthetic networks.
+
+Run from the src directory:
+
+    python bench_suite.py [--sizes 1000 100000 1000000] [--out results.json] [--compare baseline.json]
+
+Scenario "chicago" is the bundled ChicagoSketch network on its neighbourhood map,
+including the flood fill from map pixel (1000, 800) the old test_flood_fill.py
+script made. Each --sizes entry adds a synthetic scenario generated by synthetic.py
+(cached under --work-dir, one directory per size and seed). Every scenario times,
+without a display: loading the nodes, normalizing their coordinates onto the map,
+loading the map, box selections, flood selections (exact match, then per click
+with a tolerance), assigning labels, loading the edges and propagating labels,
+saving and loading labels and projects, and building draw lists over a zoom
+sequence. Clicks and boxes come from a fixed seed.
+
+Stage times (median and minimum over the repetitions) go to --out as JSON together
+with the environment, by default to bench_results.json in --work-dir. --compare prints each stage against an earlier results file
+and flags stages slower than --threshold times the baseline median; with
+--fail-on-regression the exit status is 1 when any is flagged.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import PIL
+import scipy
+import skimage
+from PIL import Image
+
+from labeling_engine import LabelingEngine
+from render import Viewport, DensityGrid, build_draw_list
+from synthetic import generate
+from bench_flood import DATA_DIR
+from bench_viewport import zoom_sequence, WIDTH, HEIGHT
+
+CHICAGO = {
+    "nodes": os.path.join(DATA_DIR, "ChicagoSketch_node.csv"),
+    "edges": os.path.join(DATA_DIR, "ChicagoSketch_net.csv"),
+    "map": os.path.join(DATA_DIR, "Chicago_neighborhoods_map.png"),
+    "clicks": [(1000, 800)],
+}
+TOLERANCE = 0.02 # grey levels, of 0..1
+
+
+class Stages:
+    """Stage name -> timing dict of one scenario."""
+
+    def __init__(self, repeat):
+        self.repeat = repeat
+        self.results = {}
+
+    def time(self, name, fn, repeat=None, **counts):
+        # run fn repeat times, returns its last result
+        times = []
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        self.results[name] = {"median_ms": float(np.median(times)) * 1e3, "min_ms": min(times) * 1e3,
+                              "runs": len(times), **counts}
+        return result
+
+    def samples(self, name, times, **counts):
+        # one measurement per click or box
+        self.results[name] = {"median_ms": float(np.median(times)) * 1e3, "min_ms": min(times) * 1e3,
+                              "runs": len(times), **counts}
+
+
+def run_scenario(paths, clicks, boxes, repeat, work_dir, seed=0):
+    stages = Stages(repeat)
+    engine = LabelingEngine()
+    stages.time("load nodes", lambda: engine.load_nodes(paths["nodes"]), nodes=0)
+    n = len(engine.nodes)
+    stages.results["load nodes"]["nodes"] = n
+
+    image = Image.open(paths["map"])
+    image.load()
+    width, height = image.size
+
+    def normalize():
+        engine.set_bbox((0, 0, width, height))
+        return engine.node_pixels()
+    stages.time("normalize coordinates", normalize)
+    stages.time("load map", lambda: engine.set_image(image), repeat=1, pixels=width * height)
+
+    rng = np.random.default_rng(seed)
+    times, selected = [], 0
+    for _ in range(boxes):
+        w, h = rng.uniform(0.02, 0.2) * width, rng.uniform(0.02, 0.2) * height
+        x0, y0 = rng.uniform(0, width - w), rng.uniform(0, height - h)
+        start = time.perf_counter()
+        selected += len(engine.select_box((x0, y0, x0 + w, y0 + h)))
+        times.append(time.perf_counter() - start)
+    stages.samples("box selection", times, mean_nodes=selected / boxes)
+
+    points = list(clicks) + [tuple(p) for p in rng.uniform((0, 0), (width, height), (boxes - len(clicks), 2))]
+    times, selections = [], []
+    for x, y in points:
+        start = time.perf_counter()
+        selections.append(engine.select_flood(x, y))
+        times.append(time.perf_counter() - start)
+    stages.samples("flood selection", times, mean_nodes=sum(map(len, selections)) / len(selections))
+
+    times = []
+    for i, indices in enumerate(selections):
+        start = time.perf_counter()
+        engine.assign(indices, f"region {i}")
+        times.append(time.perf_counter() - start)
+    stages.samples("assign label", times)
+
+    # per-click floods on the tiled raster, as with a flood tolerance
+    stages.time("load map, tolerance", lambda: engine.set_image(image, tolerance=TOLERANCE), repeat=1)
+    times, selected = [], 0
+    for x, y in points:
+        start = time.perf_counter()
+        selected += len(engine.select_flood(x, y))
+        times.append(time.perf_counter() - start)
+    stages.samples("flood selection, tolerance", times, mean_nodes=selected / len(points))
+
+    stages.time("load edges", lambda: engine.load_edges(paths["edges"]), repeat=1)
+    stages.results["load edges"]["edges"] = engine.graph.edge_count
+    before = engine.store.codes.copy()
+
+    def propagate():
+        engine.store.codes[:] = before
+        return engine.propagate_labels()
+    stages.time("propagate labels", propagate)
+
+    labels = os.path.join(work_dir, "labels.csv")
+    stages.time("save labels", lambda: engine.save_labels(labels))
+    stages.time("load labels", lambda: engine.load_labels(labels))
+    project = os.path.join(work_dir, "project.nlproj")
+    stages.time("save project", lambda: engine.save_project(project, image), repeat=1)
+    stages.time("open project", lambda: LabelingEngine().load_project(project))
+
+    # draw lists of a canvas-sized world, as the GUI fits the map to its canvas
+    engine.set_bbox((0, 0, WIDTH, HEIGHT))
+    density = stages.time("density grid", lambda: DensityGrid(*engine.node_pixels(), engine.labeled, WIDTH, HEIGHT))
+    viewport = Viewport(WIDTH, HEIGHT)
+    times, items = [], []
+    for factor in zoom_sequence(40):
+        viewport.zoom_at(WIDTH / 2, HEIGHT / 2, factor)
+        start = time.perf_counter()
+        items.append(len(build_draw_list(viewport, engine, density, 2).sx))
+        times.append(time.perf_counter() - start)
+    stages.samples("draw list", times, max_items=max(items))
+    return {"nodes": n, "map": [width, height], "stages": stages.results}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"created": datetime.datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "pandas": pd.__version__, "scipy": scipy.__version__,
+            "skimage": skimage.__version__, "pillow": PIL.__version__}
+
+
+def compare(results, baseline, threshold):
+    # print every stage found in both files, returns the number flagged as regressions
+    flagged = 0
+    for name, scenario in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old is None:
+            continue
+        print(f"{name}:")
+        for stage, timing in scenario["stages"].items():
+            if stage not in old["stages"]:
+                continue
+            ratio = timing["median_ms"] / max(old["stages"][stage]["median_ms"], 1e-6)
+            mark = "  REGRESSION" if ratio > threshold else ""
+            flagged += bool(mark)
+            print(f"  {stage:<27} {old['stages'][stage]['median_ms']:10.2f} -> {timing['median_ms']:10.2f} ms"
+                  f"  x{ratio:5.2f}{mark}")
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1_000, 100_000, 1_000_000],
+                        help="synthetic node counts, 1k to 10M")
+    parser.add_argument("--map-size", type=int, nargs=2, default=(2048, 1638), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--no-chicago", action="store_true", help="skip the bundled Chicago scenario")
+    parser.add_argument("--clicks", type=int, default=20, help="flood clicks and boxes per scenario")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "node_labeling_bench"))
+    parser.add_argument("--out", help="results file, default bench_results.json in --work-dir")
+    parser.add_argument("--compare", metavar="BASELINE")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    scenarios = {}
+    if not args.no_chicago:
+        with tempfile.TemporaryDirectory() as tmp:
+            scenarios["chicago"] = run_scenario(CHICAGO, CHICAGO["clicks"], args.clicks, args.repeat, tmp, args.seed)
+    for n in args.sizes:
+        paths = generate(os.path.join(args.work_dir, f"synthetic-{n}-seed{args.seed}"), n,
+                         [tuple(args.map_size)], seed=args.seed)
+        paths["map"] = paths["maps"][tuple(args.map_size)]
+        with tempfile.TemporaryDirectory() as tmp:
+            scenarios[f"synthetic-{n}"] = run_scenario(paths, [], args.clicks, args.repeat, tmp, args.seed)
+
+    for name, scenario in scenarios.items():
+        print(f"{name} ({scenario['nodes']} nodes, map {scenario['map'][0]}x{scenario['map'][1]}):")
+        for stage, timing in scenario["stages"].items():
+            print(f"  {stage:<27} median {timing['median_ms']:10.2f} ms   min {timing['min_ms']:10.2f} ms")
+
+    results = {"environment": environment(), "seed": args.seed, "scenarios": scenarios}
+    if args.out is None:
+        os.makedirs(args.work_dir, exist_ok=True)
+        args.out = os.path.join(args.work_dir, "bench_results.json")
+    with open(args.out, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            flagged = compare(results, json.load(f), args.threshold)
+        if flagged and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
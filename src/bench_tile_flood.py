@@ -0,0 +1,98 @@
+"""Tiled flood fill benchmark against skimage's flood on a full-size raster.
+
+Run from the src directory:  python bench_tile_flood.py [--clicks 10] [--synthetic-size 16384]
+
+Both floods start from the same random seeds on the Chicago map (native resolution,
+exact match and with a tolerance) and on a synthetic uint8 map of region patches
+separated by borders. flood() allocates a full-size mask per click; the tiled flood
+keeps whole tiles as flags and only stores masks for tiles on the region edge. The
+regions must agree pixel for pixel on sampled points.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from PIL import Image
+from skimage.morphology import flood
+
+from raster import to_grayscale
+from tile_flood import TileFlood
+from bench_flood import DATA_DIR
+
+
+def synthetic_map(size, regions=200, block=16, seed=0):
+    # nearest-seed patches on a coarse grid, scaled up block times, with dark borders
+    rng = np.random.default_rng(seed)
+    coarse = size // block
+    centres = rng.uniform(0, coarse, (regions, 2))
+    yy, xx = np.mgrid[0:coarse, 0:coarse]
+    best = np.zeros((coarse, coarse), dtype=np.int32)
+    best_d = np.full((coarse, coarse), np.inf)
+    for i, (cy, cx) in enumerate(centres):
+        d = (yy - cy) ** 2 + (xx - cx) ** 2
+        closer = d < best_d
+        best[closer], best_d[closer] = i, d[closer]
+    shades = rng.integers(40, 250, regions).astype(np.uint8)
+    small = shades[best]
+    border = np.zeros_like(best, dtype=bool)
+    border[:-1] |= best[:-1] != best[1:]
+    border[:, :-1] |= best[:, :-1] != best[:, 1:]
+    small[border] = 0
+    return np.repeat(np.repeat(small, block, axis=0), block, axis=1)
+
+
+def compare(name, gray, clicks, tolerance, tile, rng):
+    start = time.perf_counter()
+    tiles = TileFlood(gray, tile)
+    build = time.perf_counter() - start
+
+    dense_t, tiled_t, dense_bytes, tiled_bytes, pixels = [], [], [], [], []
+    for _ in range(clicks):
+        seed = (int(rng.integers(gray.shape[0])), int(rng.integers(gray.shape[1])))
+        start = time.perf_counter()
+        mask = flood(gray, seed, tolerance=tolerance)
+        dense_t.append(time.perf_counter() - start)
+        dense_bytes.append(mask.nbytes)
+
+        start = time.perf_counter()
+        region = tiles.flood(seed, tolerance)
+        tiled_t.append(time.perf_counter() - start)
+        tiled_bytes.append(region.nbytes)
+        pixels.append(region.pixel_count)
+
+        ys = rng.integers(0, gray.shape[0], 100_000)
+        xs = rng.integers(0, gray.shape[1], 100_000)
+        assert np.array_equal(region.contains(xs, ys), mask[ys, xs]), seed
+        assert region.pixel_count == np.count_nonzero(mask), seed
+        del mask
+
+    print(f"{name}: {gray.shape[1]}x{gray.shape[0]} {gray.dtype}, tolerance {tolerance}, tile {tile}, "
+          f"mean region {np.mean(pixels):,.0f} px")
+    print(f"  tile min/max (once per image): {build * 1e3:8.1f} ms")
+    print(f"  flood():     {np.mean(dense_t) * 1e3:8.1f} ms/click, {np.mean(dense_bytes) / 2**20:7.1f} MiB mask")
+    print(f"  tiled flood: {np.mean(tiled_t) * 1e3:8.1f} ms/click, {np.mean(tiled_bytes) / 2**20:7.1f} MiB mask")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clicks", type=int, default=10)
+    parser.add_argument("--tile", type=int, default=256)
+    parser.add_argument("--synthetic-size", type=int, default=16384)
+    parser.add_argument("--map", default=os.path.join(DATA_DIR, "Chicago_neighborhoods_map.png"))
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    gray = to_grayscale(Image.open(args.map))
+    compare("chicago", gray, args.clicks, None, args.tile, rng)
+    compare("chicago", gray, args.clicks, 0.05, args.tile, rng)
+    del gray
+
+    start = time.perf_counter()
+    gray = synthetic_map(args.synthetic_size)
+    print(f"synthetic map generated in {time.perf_counter() - start:.1f} s")
+    compare("synthetic", gray, args.clicks, None, args.tile, rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Per-frame cost of viewport culling and level-of-detail rendering.
+
+Run from the src directory:  python bench_viewport.py [--sizes 10000 100000 1000000]
+
+A zoom sequence from the whole network down to a small window is replayed without a
+display. Each frame builds the draw list (clusters from the density grid when too many
+nodes are visible, otherwise the visible nodes from the grid index) and renders the
+background window from the image pyramid of the Chicago map. The old path rebuilt
+every node of the bounding box on each redraw, its item count is printed for scale.
+The pyramid window is compared with resampling the same window from the full map.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from labeling_engine import LabelingEngine
+from render import Viewport, DensityGrid, ImagePyramid, build_draw_list
+from bench_render import synthetic_nodes
+from bench_flood import DATA_DIR
+
+WIDTH, HEIGHT = 800, 600
+
+
+def zoom_sequence(frames):
+    # zoom in on the centre of the canvas, then back out
+    factors = [1.25] * (frames // 2) + [0.8] * (frames - frames // 2)
+    return factors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--frames", type=int, default=40)
+    parser.add_argument("--map", default=os.path.join(DATA_DIR, "Chicago_neighborhoods_map.png"))
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        engine = LabelingEngine()
+        engine.set_nodes(synthetic_nodes(n))
+        engine.set_bbox((0, 0, WIDTH, HEIGHT))
+        engine.assign(np.arange(0, n, 3), "sample")
+
+        start = time.perf_counter()
+        density = DensityGrid(*engine.node_pixels(), engine.labeled, WIDTH, HEIGHT)
+        build = time.perf_counter() - start
+
+        viewport = Viewport(WIDTH, HEIGHT)
+        times = []
+        items = []
+        for factor in zoom_sequence(args.frames):
+            viewport.zoom_at(WIDTH / 2, HEIGHT / 2, factor)
+            start = time.perf_counter()
+            draw_list = build_draw_list(viewport, engine, density, 2)
+            times.append(time.perf_counter() - start)
+            items.append(len(draw_list.sx))
+
+        print(f"{n:>9} nodes: density grid {build * 1e3:7.1f} ms, per frame mean {np.mean(times) * 1e3:6.2f} ms, "
+              f"max {np.max(times) * 1e3:6.2f} ms, items {min(items)}-{max(items)} (old path: {n} per redraw)")
+
+    source = Image.open(args.map)
+    pyramid = ImagePyramid(source)
+    world = (WIDTH, HEIGHT)
+    viewport = Viewport(WIDTH, HEIGHT)
+    full = []
+    windowed = []
+    for factor in zoom_sequence(args.frames):
+        viewport.zoom_at(WIDTH / 2, HEIGHT / 2, factor)
+        start = time.perf_counter()
+        # the same window resampled from the full-resolution map
+        spw = source.width / world[0]
+        box = tuple(int(round(value * spw)) for value in viewport.world_rect())
+        source.resize((WIDTH, HEIGHT), Image.Resampling.BILINEAR, box=box)
+        full.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        pyramid.render(viewport.world_rect(), (WIDTH, HEIGHT), pyramid.size[0] / world[0])
+        windowed.append(time.perf_counter() - start)
+    print(f"map {source.width}x{source.height}, {len(pyramid.levels)} pyramid levels: "
+          f"full-resolution window {np.mean(full) * 1e3:.1f} ms/frame, pyramid window {np.mean(windowed) * 1e3:.1f} ms/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Label a node network against a map image without starting a display.
+
+Example, run from the src directory:
+
+    python label_cli.py --nodes ../data/chicago/ChicagoSketch_node.csv \\
+        --map ../data/chicago/Chicago_neighborhoods_map.png --georef 0 0 1999 1598 \\
+        --seed 1000 800 "north lawndale" --box 100 100 400 300 loop --out labels.csv
+
+The georeference is the rectangle x0 y0 x1 y1 of the map, in map pixels, onto which
+the extents of the node coordinates are stretched (the bounding box drawn in the GUI).
+Seeds and boxes are also given in map pixels and are applied in command line order,
+so later selections overwrite earlier ones. --auto labels every node from the map
+regions before any seed or box is applied. With --edges, --propagate finally spreads
+the labels along the links to the unlabeled nodes they reach.
+
+With --size the map is flood filled at the reduced size, like the GUI used to do;
+--flood-level floods the native map (0) or one of its halvings (1, 2, ...) instead,
+while coordinates stay in pixels of the --size map.
+
+--save-project writes nodes, labels and the decoded map raster to a project
+directory, which --project later memory-maps instead of re-reading the inputs.
+--report writes per label statistics, the unlabeled nodes as the row without a label;
+with --edges the edges between each pair of labels go to a second file next to it,
+report_cuts.csv for --report report.csv.
+
+--profile and --trace write the time of every stage as JSON or as a Chrome trace,
+--cprofile and --tracemalloc add a cProfile dump and per stage allocations.
+"""
+import argparse
+import sys
+
+import pandas as pd
+from PIL import Image
+
+from labeling_engine import LabelingEngine
+from raster import RasterCache
+from profiling import profiler
+
+
+class AppendSelection(argparse.Action):
+    # keep --seed and --box in one list so they are applied in the order given
+    def __call__(self, parser, namespace, values, option_string=None):
+        selections = getattr(namespace, self.dest) or []
+        *coords, label = values
+        try:
+            coords = [float(value) for value in coords]
+        except ValueError:
+            parser.error(f"{option_string} expects numeric coordinates followed by a label")
+        selections.append((self.const, coords, label))
+        setattr(namespace, self.dest, selections)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     epilog="\n".join(__doc__.splitlines()[1:]),
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project", help="open a saved project instead of --nodes, --map and --georef")
+    parser.add_argument("--nodes", help="node CSV with node, x and y columns")
+    parser.add_argument("--map", help="map image used for flood fill selections")
+    parser.add_argument("--georef", type=float, nargs=4, metavar=("X0", "Y0", "X1", "Y1"),
+                        help="map pixel rectangle the node extents are mapped onto")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        help="resize the map before labeling, as the GUI does to fit its canvas")
+    parser.add_argument("--flood-level", type=int, metavar="LEVEL",
+                        help="flood fill the native map (0) or the map halved LEVEL times")
+    parser.add_argument("--edges", help="from,to CSV of links between the nodes")
+    parser.add_argument("--labels", help="existing labels CSV to start from")
+    parser.add_argument("--auto", action="store_true",
+                        help="first label every node with the map region it sits in")
+    parser.add_argument("--seed-table", help="node,label CSV naming the regions for --auto, "
+                                             "regions without a seeded node stay unlabeled")
+    parser.add_argument("--seed", nargs=3, action=AppendSelection, const="seed", dest="selections",
+                        metavar=("X", "Y", "LABEL"), help="flood fill from a map pixel and label the flooded nodes")
+    parser.add_argument("--box", nargs=5, action=AppendSelection, const="box", dest="selections",
+                        metavar=("X0", "Y0", "X1", "Y1", "LABEL"), help="label the nodes inside a map pixel rectangle")
+    parser.add_argument("--propagate", action="store_true",
+                        help="after all selections, label unlabeled nodes from their labeled neighbours")
+    parser.add_argument("--out", help="labels CSV to write")
+    parser.add_argument("--save-project", help="also save nodes, labels and the map raster as a project directory")
+    parser.add_argument("--report", help="also write node counts, centroids, extents and edge cuts per label as CSV")
+    parser.add_argument("--profile", metavar="FILE", help="write stage timings as JSON")
+    parser.add_argument("--trace", metavar="FILE", help="write stage timings as a Chrome trace")
+    parser.add_argument("--cprofile", metavar="FILE", help="write cProfile stats of the run")
+    parser.add_argument("--tracemalloc", action="store_true", help="record the memory each stage allocates")
+    return parser
+
+
+def run(args):
+    engine = LabelingEngine()
+    image = None
+    if args.project:
+        with profiler.stage("open project"):
+            project = engine.load_project(args.project)
+        image = project.image
+        if args.georef:
+            engine.set_bbox(args.georef)
+    else:
+        with profiler.stage("load nodes") as counts:
+            engine.load_nodes(args.nodes)
+            counts["nodes"] = len(engine.nodes)
+        engine.set_bbox(args.georef)
+
+    if args.edges:
+        with profiler.stage("load edges"):
+            dropped = engine.load_edges(args.edges)
+        if dropped:
+            print(f"{dropped} edges name unknown nodes and were skipped", file=sys.stderr)
+
+    if args.map:
+        with profiler.stage("load map"):
+            source = Image.open(args.map)
+            image = source.resize(tuple(args.size), Image.Resampling.LANCZOS) if args.size else source
+            if args.flood_level is None:
+                engine.set_image(image)
+            else:
+                raster_image = source.reduce(2 ** args.flood_level) if args.flood_level else source
+                engine.set_raster(RasterCache.from_image(raster_image), image.size)
+
+    if args.labels:
+        with profiler.stage("load labels"):
+            engine.load_labels(args.labels)
+
+    if args.auto:
+        if engine.raster is None:
+            raise SystemExit("--auto needs --map")
+        with profiler.stage("auto label"):
+            engine.auto_label(pd.read_csv(args.seed_table) if args.seed_table else None)
+
+    for kind, coords, label in args.selections or []:
+        if kind == "seed":
+            if engine.raster is None:
+                raise SystemExit("--seed needs --map")
+            with profiler.stage("seed") as counts:
+                indices = engine.select_flood(*coords)
+                engine.assign(indices, label)
+                counts["nodes"] = len(indices)
+        else:
+            x0, y0, x1, y1 = coords
+            with profiler.stage("box") as counts:
+                indices = engine.select_box((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)))
+                engine.assign(indices, label)
+                counts["nodes"] = len(indices)
+
+    if args.propagate:
+        if engine.graph is None:
+            raise SystemExit("--propagate needs --edges")
+        with profiler.stage("propagate"):
+            engine.propagate_labels()
+
+    with profiler.stage("save"):
+        if args.out:
+            engine.save_labels(args.out)
+        if args.save_project:
+            engine.save_project(args.save_project, image)
+        if args.report:
+            engine.save_region_report(args.report)
+    print(f"{len(engine.nodes) - engine.unlabeled_count} labeled, {engine.unlabeled_count} unlabeled nodes",
+          file=sys.stderr)
+    return engine
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.project and not (args.nodes and args.georef):
+        parser.error("either --project or both --nodes and --georef are required")
+    if not args.out and not args.save_project and not args.report:
+        parser.error("nothing to write, give --out, --save-project and/or --report")
+    profiler.configure(bool(args.profile or args.trace), args.cprofile, args.tracemalloc)
+    try:
+        run(args)
+    finally:
+        if args.profile:
+            profiler.save_json(args.profile)
+        if args.trace:
+            profiler.save_chrome_trace(args.trace)
+        profiler.close()
+
+
+if __name__ == "__main__":
+    main()
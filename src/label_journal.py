@@ -0,0 +1,331 @@
+"""Undo/redo history of label changes, optionally kept in an append-only file.
+
+Every change is a diff: the node indices, their previous codes and the new code (or
+one new code per node). Undo and redo apply a diff backwards or forwards, so their
+cost follows the size of the change. With a directory the diffs are also appended to
+journal.bin as they happen, after the label names they introduce (as JSON values,
+so numeric labels stay numbers), each record with a CRC so a write torn by a crash
+is recognised and dropped on recovery. When the
+journal grows larger than the label codes themselves it is compacted: snapshot.npy
+and snapshot.json receive the current codes and names and the journal starts over.
+Once the labels are saved, mark_saved() compacts the journal and notes the snapshot
+as saved, and close() removes the files of a journal without unsaved changes, so
+only a session that ended with unsaved labels leaves something to recover.
+
+Records carry the codes they set rather than a reference to earlier records, so
+replaying a journal over a newer snapshot, after a crash during compaction, still
+ends in the same state.
+"""
+import hashlib
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from label_store import UNLABELED
+
+MAGIC = b"NLJ1"
+FILE_HEADER = struct.Struct("<4sI") # magic, number of nodes
+RECORD = struct.Struct("<BBIi") # kind, flags, count, code
+CRC = struct.Struct("<I")
+
+CHANGE, UNDO, REDO, LABEL = 1, 2, 3, 4
+PER_NODE = 1 # flag: one new code per node follows the old codes
+
+AUTOSAVE_ROOT = os.path.join(os.path.expanduser("~"), ".node_labeling", "autosave")
+
+
+def autosave_directory(source):
+    """Journal directory of a labeling session on the node file or project at source."""
+    source = os.path.abspath(source)
+    digest = hashlib.sha1(source.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(AUTOSAVE_ROOT, f"{os.path.basename(source.rstrip(os.sep))}-{digest}")
+
+
+class Diff:
+    """Codes of some nodes before and after one change."""
+
+    def __init__(self, indices, old, new):
+        self.indices = indices
+        self.old = old
+        self.new = new # a single code, or one code per index
+
+    def __len__(self):
+        return len(self.indices)
+
+    def inverse(self):
+        new = self.new if np.ndim(self.new) else np.full(len(self.indices), self.new, dtype=np.int32)
+        return Diff(self.indices, new, self.old)
+
+
+class LabelJournal:
+    """Records the changes made through it to a LabelStore, with undo and redo.
+
+    Without a directory the history only lives in memory. With one, recover=True
+    first restores the store from the snapshot and journal found there, otherwise
+    any previous journal in the directory is replaced. Every listener is called as
+    listener(indices, old, new) after each change, undo and redo. unsaved tells
+    whether a change was made, undone or redone since the last mark_saved().
+    """
+
+    def __init__(self, store, directory=None, recover=False):
+        self.store = store
+        self.directory = directory
+        self.undo_stack = []
+        self.redo_stack = []
+        self.listeners = []
+        self.file = None
+        self.recovered = 0
+        self.unsaved = False
+        if directory is None:
+            return
+        os.makedirs(directory, exist_ok=True)
+        if recover and self.exists(directory):
+            self.recovered = self._recover()
+            self.unsaved = True
+        else:
+            self.compact()
+        self.file = open(self.journal_path, "ab")
+        self.names_written = len(store.categories)
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, "journal.bin"))
+
+    @staticmethod
+    def has_unsaved(directory):
+        """Whether the journal in directory holds changes made after the labels were last
+        saved, by a session that did not close cleanly."""
+        path = os.path.join(directory, "journal.bin")
+        if not os.path.exists(path):
+            return False
+        if os.path.getsize(path) > FILE_HEADER.size:
+            return True
+        try:
+            with open(os.path.join(directory, "snapshot.json")) as f:
+                return json.load(f).get("unsaved", False)
+        except (OSError, ValueError):
+            return False
+
+    @property
+    def journal_path(self):
+        return os.path.join(self.directory, "journal.bin")
+
+    def assign(self, indices, label):
+        """Label the nodes at indices, returns those indices, each once.
+
+        Diffs and listeners only ever see every node once, so their counts stay exact
+        when a selection names a node twice.
+        """
+        indices, _ = _unique(indices)
+        code = self.store.code_for(label)
+        old = self.store.set_codes(indices, code)
+        self._push(Diff(indices, old, code))
+        return indices
+
+    def set_codes(self, indices, codes):
+        # a node given twice keeps the code given last, as a plain array write would
+        indices, codes = _unique(indices, codes)
+        old = self.store.set_codes(indices, codes)
+        self._push(Diff(indices, old, codes))
+        return indices
+
+    def record_since(self, before):
+        # record whatever changed in the store since its codes were before
+        changed = np.flatnonzero(before != self.store.codes)
+        if len(changed):
+            self._push(Diff(changed, before[changed], self.store.codes[changed].copy()))
+        return changed
+
+    def undo(self):
+        """Revert the last change, returns the indices it touched or None."""
+        if not self.undo_stack:
+            return None
+        diff = self.undo_stack.pop()
+        self.store.set_codes(diff.indices, diff.old)
+        self.redo_stack.append(diff)
+        self.unsaved = True
+        self._notify(diff.inverse())
+        self._write(UNDO, diff.inverse())
+        return diff.indices
+
+    def redo(self):
+        if not self.redo_stack:
+            return None
+        diff = self.redo_stack.pop()
+        self.store.set_codes(diff.indices, diff.new)
+        self.undo_stack.append(diff)
+        self.unsaved = True
+        self._notify(diff)
+        self._write(REDO, diff)
+        return diff.indices
+
+    def _push(self, diff):
+        if len(diff) == 0:
+            return
+        self.undo_stack.append(diff)
+        self.redo_stack.clear()
+        self.unsaved = True
+        self._notify(diff)
+        self._write(CHANGE, diff)
+
+    def _notify(self, diff):
+        for listener in self.listeners:
+            listener(diff.indices, diff.old, diff.new)
+
+    def _write(self, kind, diff):
+        if self.file is None:
+            return
+        parts = []
+        # names of labels created since the last record come first
+        for code in range(self.names_written, len(self.store.categories)):
+            name = json.dumps(_plain(self.store.categories[code])).encode("utf-8")
+            parts.append(_record(LABEL, 0, len(name), code, [name]))
+        self.names_written = len(self.store.categories)
+
+        indices = diff.indices.astype(np.int32).tobytes()
+        old = np.asarray(diff.old, dtype=np.int32).tobytes()
+        if np.ndim(diff.new):
+            parts.append(_record(kind, PER_NODE, len(diff), UNLABELED,
+                                 [indices, old, np.asarray(diff.new, dtype=np.int32).tobytes()]))
+        else:
+            parts.append(_record(kind, 0, len(diff), int(diff.new), [indices, old]))
+        self.file.write(b"".join(parts))
+        _sync(self.file)
+
+        if self.file.tell() > max(self.store.codes.nbytes, 1 << 16):
+            self.compact()
+
+    def compact(self):
+        """Write the current labels as the snapshot and start an empty journal."""
+        if self.directory is None:
+            return
+        with open(_partial(self.directory, "snapshot.npy"), "wb") as f:
+            np.save(f, self.store.codes)
+            _sync(f)
+        with open(_partial(self.directory, "snapshot.json"), "w") as f:
+            json.dump({"categories": [_plain(label) for label in self.store.categories], "unsaved": self.unsaved}, f)
+            _sync(f)
+        with open(_partial(self.directory, "journal.bin"), "wb") as f:
+            f.write(FILE_HEADER.pack(MAGIC, len(self.store)))
+            _sync(f)
+        # the snapshot is in place before the journal it replaces is emptied
+        for name in ("snapshot.npy", "snapshot.json", "journal.bin"):
+            os.replace(_partial(self.directory, name), os.path.join(self.directory, name))
+        if self.file is not None:
+            self.file.close()
+            self.file = open(self.journal_path, "ab")
+        self.names_written = len(self.store.categories)
+
+    def _recover(self):
+        # snapshot, then every intact record of the journal; returns the changes replayed
+        with open(os.path.join(self.directory, "snapshot.json")) as f:
+            categories = json.load(f)["categories"]
+        codes = np.load(os.path.join(self.directory, "snapshot.npy"))
+        if len(codes) != len(self.store):
+            raise ValueError(f"journal in {self.directory} is for {len(codes)} nodes, not {len(self.store)}")
+        self.store.set_categories(categories)
+        self.store.codes[:] = codes
+
+        replayed = 0
+        with open(self.journal_path, "r+b") as f:
+            data = f.read()
+            magic, n_nodes = FILE_HEADER.unpack_from(data)
+            if magic != MAGIC or n_nodes != len(codes):
+                raise ValueError(f"{self.journal_path} is not a label journal for this snapshot")
+            end = FILE_HEADER.size
+            for kind, flags, count, code, payload, stop in _records(data, FILE_HEADER.size):
+                if kind == LABEL:
+                    name = json.loads(payload.decode("utf-8"))
+                    if self.store.code_for(name) != code:
+                        raise ValueError(f"journal in {self.directory} does not match its snapshot")
+                else:
+                    indices = np.frombuffer(payload, dtype=np.int32, count=count).astype(np.int64)
+                    old = np.frombuffer(payload, dtype=np.int32, count=count, offset=4 * count)
+                    new = code
+                    if flags & PER_NODE:
+                        new = np.frombuffer(payload, dtype=np.int32, count=count, offset=8 * count).copy()
+                    self.store.set_codes(indices, new)
+                    diff = Diff(indices, old.copy(), new)
+                    if kind == CHANGE:
+                        self.undo_stack.append(diff)
+                        self.redo_stack.clear()
+                    elif kind == UNDO and self.undo_stack:
+                        self.redo_stack.append(self.undo_stack.pop())
+                    elif kind == REDO and self.redo_stack:
+                        self.undo_stack.append(self.redo_stack.pop())
+                    replayed += 1
+                end = stop
+            # drop a torn record at the end so new records follow intact ones
+            f.truncate(end)
+        return replayed
+
+    def mark_saved(self):
+        # the labels as they are now were written elsewhere, nothing is left to recover
+        self.unsaved = False
+        self.compact()
+
+    def close(self, discard=False):
+        """Stop writing the journal. Its files are removed when every change was saved,
+        or with discard=True, otherwise they stay for recovery."""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.directory is not None and (discard or not self.unsaved):
+            for name in ("journal.bin", "snapshot.npy", "snapshot.json"):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+            try:
+                os.rmdir(self.directory)
+            except OSError:
+                pass
+
+
+def _unique(indices, codes=None):
+    # sorted unique indices and, per index, the code given last for it
+    indices = np.asarray(indices, dtype=np.int64)
+    if codes is not None:
+        codes = np.broadcast_to(np.asarray(codes, dtype=np.int32), indices.shape)
+    if len(indices) < 2 or np.all(indices[1:] > indices[:-1]):
+        # selections already come sorted and unique
+        return indices, None if codes is None else codes.copy()
+    unique, last = np.unique(indices[::-1], return_index=True)
+    return unique, None if codes is None else codes[::-1][last]
+
+
+def _record(kind, flags, count, code, payload):
+    body = RECORD.pack(kind, flags, count, code) + b"".join(payload)
+    return body + CRC.pack(zlib.crc32(body))
+
+
+def _records(data, offset):
+    # (kind, flags, count, code, payload, end offset) of every intact record from offset on
+    while offset + RECORD.size <= len(data):
+        kind, flags, count, code = RECORD.unpack_from(data, offset)
+        size = count if kind == LABEL else count * 4 * (3 if flags & PER_NODE else 2)
+        stop = offset + RECORD.size + size + CRC.size
+        if stop > len(data):
+            return
+        (crc,) = CRC.unpack_from(data, stop - CRC.size)
+        if zlib.crc32(data[offset:stop - CRC.size]) != crc:
+            return
+        yield kind, flags, count, code, data[offset + RECORD.size:stop - CRC.size], stop
+        offset = stop
+
+
+def _plain(label):
+    # label names keep their JSON type (string or number), numpy scalars included
+    return label.item() if isinstance(label, np.generic) else label
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _partial(directory, name):
+    return os.path.join(directory, name + ".tmp")
@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from node_loader import node_positions
+
+UNLABELED = -1
+
+
+class LabelStore:
+    """Integer label code per node index plus the table of label names.
+
+    Code UNLABELED (-1) marks a node without a label. Label names get a code the
+    first time they are used and keep it for the lifetime of the store.
+    """
+
+    def __init__(self, n_nodes):
+        self.codes = np.full(n_nodes, UNLABELED, dtype=np.int32)
+        self.categories = []
+        self._lookup = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def code_for(self, label):
+        code = self._lookup.get(label)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(label)
+            self._lookup[label] = code
+        return code
+
+    def assign(self, indices, label):
+        """Give all nodes at indices the same label, returns their previous codes."""
+        indices = np.asarray(indices, dtype=np.int64)
+        old = self.codes[indices]
+        self.codes[indices] = self.code_for(label)
+        return old
+
+    def set_codes(self, indices, codes):
+        # write raw codes back, e.g. to restore the codes returned by assign
+        indices = np.asarray(indices, dtype=np.int64)
+        old = self.codes[indices]
+        self.codes[indices] = codes
+        return old
+
+    def set_categories(self, categories):
+        # replace the table of label names, codes are left as they are
+        self.categories = list(categories)
+        self._lookup = {label: code for code, label in enumerate(self.categories)}
+
+    def unassign(self, indices):
+        return self.set_codes(indices, UNLABELED)
+
+    def clear(self):
+        self.codes[:] = UNLABELED
+
+    @property
+    def labeled(self):
+        return self.codes != UNLABELED
+
+    @property
+    def labeled_count(self):
+        return int(np.count_nonzero(self.codes != UNLABELED))
+
+    @property
+    def unlabeled_count(self):
+        return len(self.codes) - self.labeled_count
+
+    def unlabeled_indices(self):
+        return np.flatnonzero(self.codes == UNLABELED)
+
+    def indices_of(self, label):
+        code = self._lookup.get(label)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.flatnonzero(self.codes == code)
+
+    def counts(self):
+        # number of nodes per label code
+        return np.bincount(self.codes[self.codes != UNLABELED], minlength=len(self.categories))
+
+    def label_of(self, index):
+        code = self.codes[index]
+        return None if code == UNLABELED else self.categories[code]
+
+    def to_frame(self, node_ids):
+        """node,label frame of the labeled nodes in node order."""
+        indices = np.flatnonzero(self.codes != UNLABELED)
+        labels = pd.Categorical.from_codes(self.codes[indices], categories=pd.Index(self.categories, dtype=object))
+        return pd.DataFrame({"node": node_ids[indices], "label": labels})
+
+    def update_from_frame(self, node_index, frame):
+        """Apply a node,label frame, node_index is a pandas Index of the node ids.
+
+        Rows whose node is not in node_index are skipped. Returns the number applied.
+        """
+        positions = node_positions(frame['node'], node_index)
+        found = (positions >= 0) & frame['label'].notna().to_numpy()
+        codes, labels = pd.factorize(frame['label'].to_numpy()[found])
+        table = np.array([self.code_for(label) for label in labels], dtype=np.int32)
+        self.codes[positions[found]] = table[codes]
+        return int(np.count_nonzero(found))
+
+    def save_csv(self, filename, node_ids):
+        self.to_frame(node_ids).to_csv(filename, index=False)
+
+    def load_csv(self, filename, node_index):
+        # replaces all labels with the ones in the file
+        self.clear()
+        return self.update_from_frame(node_index, pd.read_csv(filename))
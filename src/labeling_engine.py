@@ -0,0 +1,359 @@
+import numpy as np
+import pandas as pd
+
+from transform import CoordinateSystem
+from spatial_index import GridIndex
+from raster import RasterCache, NodeComponents
+from label_store import LabelStore
+from label_journal import LabelJournal
+from region_report import RegionReport, cuts_filename
+from node_loader import NodeTable, load_nodes, node_positions
+from node_graph import load_edges
+from project_file import save_project, open_project
+from profiling import profiler
+
+
+class LabelingEngine:
+    """Node data, selections and label bookkeeping, independent of any widget toolkit.
+
+    Selections work in world pixels, the background as shown at zoom 1: bbox is the
+    world rectangle (x0, y0, x1, y1) onto which the extents of the node coordinates
+    are mapped. Flood fills run on a raster whose pixels may be finer or coarser than
+    world pixels, transform holds the maps between data, world, image and canvas
+    coordinates. Selections return node indices, labels are kept per node index in a
+    LabelStore and only keyed by node id when reading or writing CSV files. Label
+    changes go through a LabelJournal, which keeps their undo history and, once
+    start_journal gave it a directory, appends them to disk as they happen.
+    """
+
+    def __init__(self):
+        self.table = None
+        self.nodes = None
+        self.node_index = None
+        self.x = None
+        self.y = None
+        self.extents = None
+        self.index = None
+        self.graph = None
+
+        self.store = LabelStore(0)
+        self.journal = LabelJournal(self.store)
+        self.report = None
+
+        self.raster = None
+        self.bbox = None
+        self.node_components = None
+        self.transform = CoordinateSystem()
+
+    def load_nodes(self, filename):
+        self.set_nodes(load_nodes(filename))
+
+    def set_nodes(self, table):
+        # a NodeTable, or a DataFrame with node, x and y columns
+        if not isinstance(table, NodeTable):
+            table = NodeTable.from_frame(table)
+        self.table = table
+        self.nodes = table.ids
+        self.node_index = table.index
+        self.x = table.x
+        self.y = table.y
+        self.extents = table.extents
+        if self.bbox is not None:
+            self.transform.set_georef(self.extents, self.bbox)
+        self.index = GridIndex(self.x, self.y) # spatial index in data space
+        self.set_store(LabelStore(len(self.nodes)))
+        self.node_components = None
+        self.graph = None
+
+    def set_store(self, store):
+        # a new store starts with an empty history kept in memory
+        self.journal.close()
+        self.store = store
+        self.journal = LabelJournal(store)
+        self.report = None
+
+    def start_journal(self, directory, recover=False):
+        """Append label changes to the journal in directory from now on.
+
+        With recover=True the labels are first restored from a journal left there,
+        returns the number of changes replayed from it.
+        """
+        self.journal.close()
+        self.journal = LabelJournal(self.store, directory, recover=recover)
+        self.report = None
+        return self.journal.recovered
+
+    def region_report(self):
+        """Per label node counts, centroids, extents and edge cuts, see RegionReport.
+
+        Built on first use and then kept up to date by every label change.
+        """
+        if self.report is None:
+            self.report = RegionReport(self.x, self.y, self.store.codes, self.graph, len(self.store.categories))
+            self.journal.listeners.append(self.report.update)
+        return self.report
+
+    def region_frame(self):
+        return self.region_report().frame(self.store.categories)
+
+    def region_cut_frame(self):
+        # edges between each pair of labels, needs the edges
+        return self.region_report().cut_frame(self.store.categories)
+
+    def save_region_report(self, filename):
+        """Write the region report as CSV, with the edges loaded also the edges between
+        each pair of labels to cuts_filename(filename). Returns the files written."""
+        self.region_frame().to_csv(filename, index=False)
+        if self.graph is None:
+            return [filename]
+        self.region_cut_frame().to_csv(cuts_filename(filename), index=False)
+        return [filename, cuts_filename(filename)]
+
+    def _drop_report(self):
+        # rebuilt on the next request, e.g. once edges changed
+        if self.report is not None:
+            self.journal.listeners.remove(self.report.update)
+            self.report = None
+
+    def undo(self):
+        """Revert the last label change, returns the indices it touched or None."""
+        return self.journal.undo()
+
+    def redo(self):
+        return self.journal.redo()
+
+    def load_edges(self, filename):
+        """Read the links between the loaded nodes, returns how many edges were dropped
+        because they name unknown nodes."""
+        self.graph, dropped = load_edges(filename, self.node_index)
+        self._drop_report()
+        return dropped
+
+    def set_image(self, image, tolerance=None, level=0):
+        """Convert the background and label its flood regions once per load.
+
+        World pixels are the pixels of image. level > 0 floods a copy reduced 2**level
+        times instead, faster and coarser.
+        """
+        raster_image = image.reduce(2 ** level) if level else image
+        self.set_raster(RasterCache.from_image(raster_image, tolerance), image.size)
+
+    def set_raster(self, raster, world_size=None):
+        # a RasterCache prepared elsewhere, e.g. on a worker thread, covering the world
+        # rectangle (0, 0) - world_size; by default one raster pixel per world pixel
+        height, width = raster.shape
+        world_width, world_height = world_size if world_size is not None else (width, height)
+        self.raster = raster
+        self.transform.set_image_scale(width / world_width, height / world_height)
+        self.node_components = None
+
+    def set_bbox(self, bbox):
+        self.bbox = tuple(bbox)
+        if self.extents is not None:
+            self.transform.set_georef(self.extents, self.bbox)
+        self.node_components = None
+
+    @property
+    def image_scale(self):
+        # raster pixels per world pixel along x and y
+        to_image = self.transform.affine("world", "image")
+        return (to_image.sx, to_image.sy)
+
+    @property
+    def labeled(self):
+        return self.store.labeled
+
+    @property
+    def unlabeled_count(self):
+        return self.store.unlabeled_count
+
+    def node_pixels(self, indices=None):
+        # node positions in world pixels, for all nodes or the given indices
+        x, y = (self.x, self.y) if indices is None else (self.x[indices], self.y[indices])
+        return self.transform.map("data", "world", x, y)
+
+    def image_pixels(self):
+        # node positions in raster pixels
+        return self.transform.map("data", "image", self.x, self.y)
+
+    def select_box(self, box):
+        """Indices of the nodes inside box = (x0, y0, x1, y1) given in world pixels."""
+        return self.index.query_box(*self.transform.rect("world", "data", box))
+
+    def select_polygon(self, px, py):
+        """Indices of the nodes inside the polygon with vertices (px, py) in world pixels."""
+        x, y = self.transform.map("world", "data", px, py)
+        return self.index.query_polygon(x, y)
+
+    def select_nearest(self, px, py, max_pixels=5):
+        # index of the node closest to a world pixel, as an array of zero or one index
+        to_data = self.transform.affine("world", "data")
+        x, y = to_data(px, py)
+        node = self.index.nearest(float(x), float(y), max_distance=abs(to_data.sx) * max_pixels)
+        return np.array([node] if node >= 0 else [], dtype=np.int64)
+
+    def select_connected(self, box, px, py):
+        """Indices of the nodes inside box linked, through edges inside box, to the node
+        nearest pixel (px, py). Without a node near (px, py) the largest linked group
+        inside box is selected."""
+        inside = self.select_box(box)
+        if len(inside) == 0:
+            return inside
+        component = self.graph.components_within(inside)
+        nearest = self.select_nearest(px, py)
+        position = np.searchsorted(inside, nearest)
+        if len(nearest) and position[0] < len(inside) and inside[position[0]] == nearest[0]:
+            target = component[position[0]]
+        else:
+            target = np.bincount(component).argmax()
+        return inside[component == target]
+
+    def select_flood(self, px, py):
+        """Indices of the nodes in the region flood filled from world pixel (px, py)."""
+        ix, iy = self.transform.map("world", "image", px, py)
+        seed = (int(np.floor(iy)), int(np.floor(ix)))
+        if not (0 <= seed[0] < self.raster.shape[0] and 0 <= seed[1] < self.raster.shape[1]):
+            return np.zeros(0, dtype=np.int64)
+        if self.raster.components is not None:
+            # the flood region is a precomputed component, look up its nodes
+            if self.node_components is None:
+                self.node_components = NodeComponents(self.raster, *self.image_pixels())
+            return np.sort(self.node_components.flooded(seed))
+        return self.find_flooded_nodes(seed)
+
+    def find_flooded_nodes(self, seed):
+        if self.raster.tiles is not None:
+            # tile-sparse region, only the tiles it touches are looked at
+            with profiler.stage("flood fill") as counts:
+                region = self.raster.flood_region(seed)
+                counts["partial_tiles"] = len(region.partial)
+            with profiler.stage("nodes in region") as counts:
+                box = self.transform.rect("image", "data", region.bounds())
+                candidates = self.index.query_box(*box)
+                x, y = self.transform.map("data", "image", self.x[candidates], self.y[candidates])
+                flooded = candidates[region.contains(x, y)]
+                counts.update(candidates=len(candidates), nodes=len(flooded))
+            return flooded
+
+        # Flood the image from the seed point
+        with profiler.stage("flood fill") as counts:
+            mask = self.raster.flood_mask(seed)
+            counts["pixels"] = mask.size
+
+        with profiler.stage("nodes in region") as counts:
+            # only nodes inside the bounding rectangle of the flooded region can be flooded
+            rows = np.flatnonzero(mask.any(axis=1))
+            cols = np.flatnonzero(mask.any(axis=0))
+            box = self.transform.rect("image", "data", (cols[0], rows[0], cols[-1] + 1, rows[-1] + 1))
+            candidates = self.index.query_box(*box)
+
+            # Get the nodes that are in the flooded region
+            x, y = self.transform.map("data", "image", self.x[candidates], self.y[candidates])
+            x = x.astype(np.int64)
+            y = y.astype(np.int64)
+            inside = (x >= 0) & (x < mask.shape[1]) & (y >= 0) & (y < mask.shape[0])
+            candidates, x, y = candidates[inside], x[inside], y[inside]
+            flooded = candidates[mask[y, x]]
+            counts.update(candidates=len(candidates), nodes=len(flooded))
+        return flooded
+
+    def auto_label(self, seed_labels=None, overwrite=True):
+        """Label every node with the flood region of the map it sits in.
+
+        Without seed_labels each region becomes its own label, "region <id>". With a
+        node,label table (like data/chicago/t1.csv) every region holding seeded nodes
+        takes the most common seed label, regions sharing a label are merged, and
+        regions without seeds stay unlabeled. Returns the number of nodes labeled.
+        """
+        return self.apply_region_labels(*self.region_labels(seed_labels, overwrite))
+
+    def region_labels(self, seed_labels=None, overwrite=True):
+        """The nodes auto_label would label, without changing any label: their indices,
+        the label names and the position of each node's name among them."""
+        if self.raster is None:
+            raise ValueError("automatic labeling needs a map, none is loaded")
+        if self.raster.tolerance is not None:
+            raise ValueError("automatic labeling needs the exact-match flood regions (tolerance=None)")
+        self.raster.label_components()
+        if self.node_components is None:
+            self.node_components = NodeComponents(self.raster, *self.image_pixels())
+        node_component = self.node_components.node_component
+
+        if seed_labels is None:
+            region_ids = np.unique(node_component[node_component > 0])
+            region_names = [f"region {i}" for i in region_ids]
+            region_label = np.full(len(self.node_components.start) - 1, -1, dtype=np.int64)
+            region_label[region_ids] = np.arange(len(region_ids))
+        else:
+            seed_index = node_positions(seed_labels['node'], self.node_index)
+            found = seed_index >= 0
+            seeds = pd.DataFrame({"region": node_component[seed_index[found]],
+                                  "label": seed_labels['label'].to_numpy()[found]})
+            seeds = seeds[seeds['region'] > 0]
+            # the most common seed label in each region
+            votes = seeds.groupby(['region', 'label']).size().reset_index(name='votes')
+            votes = votes.sort_values('votes', ascending=False, kind='stable').drop_duplicates('region')
+            codes, region_names = pd.factorize(votes['label'])
+            region_label = np.full(len(self.node_components.start) - 1, -1, dtype=np.int64)
+            region_label[votes['region'].to_numpy()] = codes
+
+        node_label = region_label[node_component]
+        if not overwrite:
+            node_label[self.labeled] = -1
+        indices = np.flatnonzero(node_label >= 0)
+        return indices, list(region_names), node_label[indices]
+
+    def apply_region_labels(self, indices, names, positions):
+        # translate the names into store codes and write them in one go
+        codes = np.array([self.store.code_for(label) for label in names], dtype=np.int32)
+        self.journal.set_codes(indices, codes[positions])
+        return len(indices)
+
+    def propagate_labels(self, max_iterations=None):
+        """Label unlabeled nodes from their labeled neighbours along the edges, returns
+        the indices of the nodes that got a label."""
+        codes, _ = self.graph.propagate(self.store.codes, max_iterations)
+        changed = np.flatnonzero(codes != self.store.codes)
+        self.journal.set_codes(changed, codes[changed])
+        return changed
+
+    def assign(self, indices, label):
+        # returns the labeled indices, each once
+        return self.journal.assign(indices, label)
+
+    def load_labels(self, filename):
+        before = self.store.codes.copy()
+        self.store.load_csv(filename, self.node_index)
+        self.journal.record_since(before)
+
+    def labels_frame(self):
+        return self.store.to_frame(self.nodes)
+
+    def save_labels(self, filename):
+        self.store.save_csv(filename, self.nodes)
+        self.journal.mark_saved()
+
+    def save_project(self, path, image=None):
+        save_project(path, self.table, self.store, self.bbox, self.raster, image, self.graph,
+                     self.image_scale if self.raster is not None else None)
+        self.journal.mark_saved()
+
+    def load_project(self, path):
+        """Open a project saved by save_project, returns it for its background image."""
+        project = open_project(path)
+        self.bbox = None
+        self.set_nodes(project.table)
+        self.set_store(project.store)
+        if project.bbox is not None:
+            self.set_bbox(project.bbox)
+        if project.raster is not None:
+            height, width = project.raster.shape
+            sx, sy = project.image_scale
+            self.set_raster(project.raster, (width / sx, height / sy))
+        else:
+            # no flood fills until a map is loaded for this project
+            self.raster = None
+            self.transform.set_image_scale(1.0, 1.0)
+        self.graph = project.graph
+        self._drop_report()
+        return project
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from label_store import UNLABELED
+from node_loader import node_positions
+
+
+class Adjacency:
+    """Undirected node graph in compressed sparse row form.
+
+    The neighbours of node i are neighbors[indptr[i]:indptr[i + 1]], sorted, where
+    nodes are the positions of the node table (the same indices selections return).
+    """
+
+    def __init__(self, indptr, neighbors):
+        self.indptr = np.asarray(indptr)
+        self.neighbors = np.asarray(neighbors)
+        self._matrix = None
+
+    @classmethod
+    def from_edges(cls, source, target, n):
+        # both directions of every edge, without self loops and duplicates
+        source = np.asarray(source, dtype=np.int64)
+        target = np.asarray(target, dtype=np.int64)
+        keep = source != target
+        rows = np.concatenate([source[keep], target[keep]])
+        cols = np.concatenate([target[keep], source[keep]])
+        # scipy sorts the rows and sums duplicate entries while converting to CSR
+        matrix = sp.coo_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n, n)).tocsr()
+        matrix.sum_duplicates()
+        index_type = np.int32 if matrix.nnz < 2**31 and n < 2**31 else np.int64
+        return cls(matrix.indptr.astype(index_type), matrix.indices.astype(index_type))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def edge_count(self):
+        return len(self.neighbors) // 2
+
+    def neighbors_of(self, node):
+        return self.neighbors[self.indptr[node]:self.indptr[node + 1]]
+
+    def degree(self):
+        return np.diff(self.indptr)
+
+    @property
+    def matrix(self):
+        # scipy view of the same arrays, for sparse products and csgraph routines
+        if self._matrix is None:
+            data = np.ones(len(self.neighbors), dtype=np.float32)
+            self._matrix = sp.csr_matrix((data, self.neighbors, self.indptr), shape=(len(self), len(self)))
+        return self._matrix
+
+    def components_within(self, nodes):
+        """Connected component of each of the given nodes, counting only edges among them."""
+        nodes = np.asarray(nodes)
+        sub = self.matrix[nodes][:, nodes]
+        return connected_components(sub, directed=False)[1]
+
+    def neighbors_of_many(self, nodes):
+        # (position in nodes, neighbour) pairs for all neighbours of the given nodes
+        nodes = np.asarray(nodes)
+        starts = self.indptr[nodes].astype(np.int64)
+        counts = self.indptr[nodes + 1] - starts
+        row = np.repeat(np.arange(len(nodes)), counts)
+        offsets = np.arange(len(row)) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        return row, self.neighbors[offsets]
+
+    def propagate(self, codes, max_iterations=None):
+        """Fill unlabeled nodes from labeled neighbours, one hop per iteration.
+
+        Each pass gives every unlabeled node that has labeled neighbours the label most
+        of them carry (the lowest code on ties). Labels already set never change. Only
+        the neighbours of the nodes labeled in the previous pass are visited, so a pass
+        costs the size of the frontier, not of the graph.
+        Returns the new codes and the number of iterations run.
+        """
+        codes = np.array(codes, dtype=np.int32)
+        changed = np.flatnonzero(codes != UNLABELED)
+        iterations = 0
+        while len(changed) and (max_iterations is None or iterations < max_iterations):
+            # unlabeled neighbours of the nodes labeled last time
+            _, frontier = self.neighbors_of_many(changed)
+            frontier = np.unique(frontier[codes[frontier] == UNLABELED])
+            if len(frontier) == 0:
+                break
+            # count the labels of their labeled neighbours, pick the most common per node
+            row, neighbor = self.neighbors_of_many(frontier)
+            known = codes[neighbor] != UNLABELED
+            row, label = row[known], codes[neighbor[known]].astype(np.int64)
+            pairs, votes = np.unique(row * (int(codes.max()) + 1) + label, return_counts=True)
+            row, label = np.divmod(pairs, int(codes.max()) + 1)
+            best = np.lexsort((label, -votes, row))
+            first = best[np.r_[True, row[best][1:] != row[best][:-1]]]
+            codes[frontier[row[first]]] = label[first]
+            changed = frontier[row[first]]
+            iterations += 1
+        return codes, iterations
+
+
+def load_edges(filename, node_index):
+    """Read a from,to edge CSV into an Adjacency over the nodes of node_index.
+
+    The file may have a header or not (ChicagoSketch_net.csv has none). Edges naming
+    nodes that are not in node_index are dropped, their number is returned as well.
+    """
+    edges = pd.read_csv(filename, header=None, usecols=[0, 1], names=["from", "to"])
+    if len(edges) and not is_node(edges.iloc[0, 0], node_index):
+        # the first row is a header
+        edges = edges.iloc[1:]
+    source = node_positions(edges["from"], node_index)
+    target = node_positions(edges["to"], node_index)
+    known = (source >= 0) & (target >= 0)
+    return Adjacency.from_edges(source[known], target[known], len(node_index)), int(np.count_nonzero(~known))
+
+
+def is_node(value, node_index):
+    return node_positions(pd.Series([value]), node_index)[0] >= 0
+
@@ -0,0 +1,166 @@
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 250_000
+
+INT32_MIN = np.iinfo(np.int32).min
+INT32_MAX = np.iinfo(np.int32).max
+
+
+class NodeTable:
+    """Node ids and coordinates as contiguous, compact columns.
+
+    ids is an int32 array when every node id is an integer that fits, an int64 array
+    for larger integer ids (OSM ids, say), otherwise a pandas Categorical of the id
+    strings. x and y are float32.
+    """
+
+    def __init__(self, ids, x, y, extents=None):
+        self.ids = ids
+        self.x = np.ascontiguousarray(x, dtype=np.float32)
+        self.y = np.ascontiguousarray(y, dtype=np.float32)
+        if extents is None:
+            extents = (float(self.x.min()), float(self.x.max()), float(self.y.min()), float(self.y.max()))
+        self.extents = extents
+        self._index = None
+
+    @classmethod
+    def from_frame(cls, data):
+        return cls(compact_ids(data['node']), data['x'].to_numpy(), data['y'].to_numpy())
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def index(self):
+        # pandas Index over the node ids, for looking up node positions by id
+        if self._index is None:
+            self._index = pd.Index(self.ids)
+        return self._index
+
+    @property
+    def nbytes(self):
+        ids = self.ids.codes.nbytes + self.ids.categories.memory_usage(deep=True) \
+            if isinstance(self.ids, pd.Categorical) else self.ids.nbytes
+        return ids + self.x.nbytes + self.y.nbytes
+
+    def frame(self):
+        return pd.DataFrame({"node": self.ids, "x": self.x, "y": self.y})
+
+
+def compact_ids(ids):
+    # int32 when every id is an integer in range, int64 for other integers,
+    # categorical strings otherwise
+    ids = pd.Series(ids)
+    if pd.api.types.is_integer_dtype(ids.dtype):
+        return ids.to_numpy(dtype=np.int32 if _fits_int32(ids) else np.int64)
+    return pd.Categorical(ids.astype(str))
+
+
+def _fits_int32(ids):
+    return len(ids) == 0 or (ids.min() >= INT32_MIN and ids.max() <= INT32_MAX)
+
+
+def node_positions(ids, node_index):
+    """Positions of the ids in node_index, -1 for unknown ids.
+
+    Ids are matched by value whatever type they were read as: ids read as text or
+    floats are matched as integers when the node ids are integers, and integer ids
+    as their text when the node ids are strings.
+    """
+    ids = pd.Series(ids)
+    if pd.api.types.is_integer_dtype(node_index.dtype):
+        numeric = pd.to_numeric(ids, errors="coerce")
+        if pd.api.types.is_integer_dtype(numeric.dtype):
+            return node_index.get_indexer(numeric.to_numpy(dtype=np.int64))
+        numeric = numeric.to_numpy(dtype=np.float64)
+        positions = np.full(len(numeric), -1, dtype=np.int64)
+        valid = np.isfinite(numeric) & (numeric == np.round(numeric))
+        positions[valid] = node_index.get_indexer(numeric[valid].astype(np.int64))
+        return positions
+    if pd.api.types.is_float_dtype(ids.dtype):
+        # integer ids with gaps read as floats, 12.0 is node "12"
+        ids = ids.astype("Int64") if (ids.dropna() == ids.dropna().round()).all() else ids
+    return node_index.get_indexer(ids.astype(str))
+
+
+def load_nodes(filename, chunksize=CHUNK_SIZE, progress=None):
+    """Read a node,x,y CSV in chunks into a NodeTable.
+
+    The rows are counted first so the columns are allocated once at their final size,
+    only one chunk of parsed text is alive at a time on top of them. Coordinates are
+    parsed straight into float32 and the extents are updated chunk by chunk. Integer
+    ids are kept as int32, widened to int64 at the first chunk with an id out of the
+    32 bit range. From the first id that is not an integer on all ids are strings,
+    stored as codes into one growing table of distinct ids.
+    progress, if given, is called with the fraction of rows read after every chunk.
+    """
+    rows = count_rows(filename)
+    int_ids = np.empty(rows, dtype=np.int32)
+    codes = None
+    categories = pd.Index([], dtype=object)
+    x = np.empty(rows, dtype=np.float32)
+    y = np.empty(rows, dtype=np.float32)
+    filled = 0
+    min_x = min_y = np.inf
+    max_x = max_y = -np.inf
+
+    reader = pd.read_csv(filename, usecols=['node', 'x', 'y'], dtype={'x': np.float32, 'y': np.float32},
+                         chunksize=chunksize)
+    for chunk in reader:
+        stop = filled + len(chunk)
+        node = chunk['node']
+        if codes is None and pd.api.types.is_integer_dtype(node.dtype):
+            if int_ids.dtype == np.int32 and not _fits_int32(node):
+                int_ids = int_ids.astype(np.int64)
+            int_ids[filled:stop] = node.to_numpy()
+        else:
+            if codes is None:
+                # switch to string ids, the integer ids read so far included
+                codes = np.empty(rows, dtype=np.int32)
+                codes[:filled], categories = _encode(pd.Series(int_ids[:filled]).astype(str), categories)
+                int_ids = None
+            codes[filled:stop], categories = _encode(node.astype(str), categories)
+        x[filled:stop] = chunk['x'].to_numpy()
+        y[filled:stop] = chunk['y'].to_numpy()
+        if stop > filled:
+            min_x, max_x = min(min_x, float(x[filled:stop].min())), max(max_x, float(x[filled:stop].max()))
+            min_y, max_y = min(min_y, float(y[filled:stop].min())), max(max_y, float(y[filled:stop].max()))
+        filled = stop
+        if progress is not None:
+            progress(filled / max(rows, 1))
+
+    # blank lines are counted but not parsed
+    x = x[:filled]
+    y = y[:filled]
+    if codes is None:
+        ids = int_ids[:filled]
+    else:
+        ids = pd.Categorical.from_codes(codes[:filled], categories=categories)
+    return NodeTable(ids, x, y, (min_x, max_x, min_y, max_y))
+
+
+def count_rows(filename, block_size=1 << 24):
+    # number of data lines after the header, without parsing them
+    lines = 0
+    last = b"\n"
+    with open(filename, "rb") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def _encode(values, categories):
+    # codes of values in categories, appending ids not seen before
+    part_codes, uniques = pd.factorize(values)
+    positions = categories.get_indexer(uniques)
+    new = positions < 0
+    positions[new] = np.arange(len(categories), len(categories) + np.count_nonzero(new))
+    categories = categories.append(pd.Index(uniques[new], dtype=object))
+    return positions[part_codes].astype(np.int32), categories
@@ -0,0 +1,187 @@
+"""Opt-in timing of the stages of GUI and engine operations.
+
+Code marks a stage with
+
+    with profiler.stage("flood fill") as counts:
+        ...
+        counts["nodes"] = len(indices)
+
+which costs a function call while profiling is off. When on, each stage records its
+wall time, the thread it ran on, how deeply it is nested, the item counts the code
+put in counts and, given a canvas, the number of canvas items before and after. With
+allocation tracing on, tracemalloc adds the net bytes a stage allocated and its peak
+above the starting level (nested stages restart the peak of the stage around them).
+Records can be summarized per stage name, written as JSON or as a Chrome trace
+(chrome://tracing, Perfetto).
+
+Profiling is switched on by the environment or by configure() from a command line:
+
+    NODE_LABELING_PROFILE=1            record stage timings
+    NODE_LABELING_CPROFILE=<file>      also run cProfile, stats written to file on close
+    NODE_LABELING_TRACEMALLOC=1        also trace allocations per stage
+"""
+import contextlib
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+
+class Stage:
+    """One timed run of a stage."""
+
+    __slots__ = ("name", "start", "duration", "thread", "depth", "counts", "allocated", "peak")
+
+    def __init__(self, name, start, duration, thread, depth, counts, allocated=None, peak=None):
+        self.name = name
+        self.start = start # seconds since the profiler was created
+        self.duration = duration
+        self.thread = thread
+        self.depth = depth # 0 for a stage not nested in another on its thread
+        self.counts = counts
+        self.allocated = allocated
+        self.peak = peak
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Profiler:
+    """Stage records of a session, plus optional cProfile and tracemalloc capture."""
+
+    def __init__(self, enabled=False, cprofile=None, trace_memory=False, limit=100000):
+        self.records = deque(maxlen=limit)
+        self._lock = threading.Lock() # stages end on the worker thread while the GUI reads
+        self.origin = time.perf_counter()
+        self.enabled = False
+        self.cprofile_path = None
+        self.cprofile = None
+        self.trace_memory = False
+        self._local = threading.local()
+        self.configure(enabled, cprofile, trace_memory)
+
+    @classmethod
+    def from_environment(cls):
+        return cls(enabled=os.environ.get("NODE_LABELING_PROFILE", "") not in ("", "0"),
+                   cprofile=os.environ.get("NODE_LABELING_CPROFILE") or None,
+                   trace_memory=os.environ.get("NODE_LABELING_TRACEMALLOC", "") not in ("", "0"))
+
+    def configure(self, enabled=True, cprofile=None, trace_memory=False):
+        # capture can be added but is not taken away, a session keeps what it started with
+        self.enabled = self.enabled or enabled or cprofile is not None or trace_memory
+        if cprofile is not None and self.cprofile is None:
+            self.cprofile_path = cprofile
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        if trace_memory and not self.trace_memory:
+            self.trace_memory = True
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, name, canvas=None, **counts):
+        if not self.enabled:
+            yield counts
+            return
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        if canvas is not None:
+            items_before = len(canvas.find_all())
+        if self.trace_memory:
+            memory_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            duration = time.perf_counter() - start
+            self._local.depth = depth
+            allocated = peak = None
+            if self.trace_memory:
+                current, highest = tracemalloc.get_traced_memory()
+                allocated, peak = current - memory_before, highest - memory_before
+            if canvas is not None:
+                counts["canvas_items"] = len(canvas.find_all())
+                counts["canvas_items_added"] = counts["canvas_items"] - items_before
+            record = Stage(name, start - self.origin, duration, threading.current_thread().name,
+                           depth, counts, allocated, peak)
+            with self._lock:
+                self.records.append(record)
+
+    def snapshot(self):
+        # the records so far as a list, safe to read while other threads add stages
+        with self._lock:
+            return list(self.records)
+
+    def last_operation(self):
+        """The latest stage not nested in another and the stages nested in it."""
+        records = self.snapshot()
+        for record in reversed(records):
+            if record.depth == 0:
+                end = record.start + record.duration
+                inner = [r for r in records if r.thread == record.thread and r.depth > 0
+                         and record.start <= r.start <= end]
+                return record, inner
+        return None, []
+
+    def summary(self):
+        """Per stage name: calls, total, mean and max milliseconds and the last counts."""
+        table = {}
+        for record in self.snapshot():
+            row = table.setdefault(record.name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            row["calls"] += 1
+            row["total_ms"] += record.duration * 1e3
+            row["max_ms"] = max(row["max_ms"], record.duration * 1e3)
+            row["counts"] = record.counts
+            if record.allocated is not None:
+                row["max_peak_bytes"] = max(row.get("max_peak_bytes", 0), record.peak)
+        for row in table.values():
+            row["mean_ms"] = row["total_ms"] / row["calls"]
+        return table
+
+    def save_json(self, filename):
+        records = self.snapshot()
+        with open(filename, "w") as f:
+            json.dump({"summary": self.summary(), "stages": [record.to_dict() for record in records]},
+                      f, indent=1, default=_plain)
+
+    def save_chrome_trace(self, filename):
+        # complete events ("X") in microseconds, one track per thread
+        threads = {}
+        events = []
+        for record in self.snapshot():
+            tid = threads.setdefault(record.thread, len(threads))
+            args = dict(record.counts)
+            if record.allocated is not None:
+                args.update(allocated_bytes=record.allocated, peak_bytes=record.peak)
+            events.append({"name": record.name, "ph": "X", "pid": os.getpid(), "tid": tid,
+                           "ts": record.start * 1e6, "dur": record.duration * 1e6, "args": args})
+        events.extend({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                      for name, tid in threads.items())
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, default=_plain)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+    def close(self):
+        # write the cProfile stats and stop capturing
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_path)
+            self.cprofile = None
+        if self.trace_memory:
+            tracemalloc.stop()
+            self.trace_memory = False
+
+
+def _plain(value):
+    # numpy scalars in counts
+    return value.item() if hasattr(value, "item") else str(value)
+
+
+profiler = Profiler.from_environment()
@@ -0,0 +1,158 @@
+"""Labeling projects stored as a directory of .npy arrays plus a small meta.json.
+
+Every array is a plain uncompressed .npy file, so opening a project memory-maps them
+instead of parsing CSVs and decoding the map again, and processes opening the same
+project share the pages. Layout of a project directory:
+
+    meta.json         format version, extents, bbox, label names, raster tolerance and
+                      raster pixels per world pixel
+    x.npy, y.npy      float32 node coordinates
+    ids.npy           int32 or int64 node ids, or
+    id_codes.npy      int32 codes into
+    id_names.npy      fixed-width unicode node ids, for string ids
+    label_codes.npy   int32 label code per node, -1 for unlabeled
+    gray.npy          grayscale raster used for flood fill (optional)
+    components.npy    flood-fill regions of the raster (optional)
+    image.npy         RGB background as uint8 rows x columns x 3 (optional)
+    graph_indptr.npy  CSR row offsets of the node links (optional)
+    graph_neighbors.npy  CSR neighbour node indices (optional)
+
+The labels CSV written by save_groups stays the interchange format.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from node_loader import NodeTable
+from label_store import LabelStore
+from raster import RasterCache
+from node_graph import Adjacency
+
+FORMAT_VERSION = 1
+EXTENSION = ".nlproj"
+
+
+class Project:
+    """Arrays of an opened project, memory-mapped unless opened with mmap_mode=None."""
+
+    def __init__(self, table, store, bbox=None, raster=None, image=None, graph=None, image_scale=(1.0, 1.0)):
+        self.table = table
+        self.store = store
+        self.bbox = bbox
+        self.raster = raster
+        self.image = image
+        self.graph = graph
+        self.image_scale = image_scale
+
+
+def save_project(path, table, store, bbox=None, raster=None, image=None, graph=None, image_scale=None):
+    """Write a project directory at path, replacing a project saved there before.
+
+    The arrays are written to a new directory next to path that then takes its place,
+    so no array of an earlier save is left behind and a project memory-mapped from
+    path stays readable while it is saved over.
+    """
+    path = os.fspath(path)
+    if os.path.exists(path) and not os.path.exists(os.path.join(path, "meta.json")) and os.listdir(path):
+        raise ValueError(f"{path} is not a project directory")
+    meta = {
+        "version": FORMAT_VERSION,
+        "id_kind": "categorical" if isinstance(table.ids, pd.Categorical) else "integer",
+        "extents": [float(value) for value in table.extents],
+        "bbox": [_plain(value) for value in bbox] if bbox is not None else None,
+        # labels read from CSV may be numpy scalars
+        "categories": [_plain(label) for label in store.categories],
+        "raster": None,
+    }
+    if raster is not None:
+        meta["raster"] = {"tolerance": _plain(raster.tolerance), "tiled": raster.tiles is not None,
+                          "image_scale": [float(value) for value in image_scale] if image_scale is not None
+                          else [1.0, 1.0]}
+    meta_text = json.dumps(meta, indent=1)
+
+    parent = os.path.dirname(os.path.abspath(path))
+    staging = tempfile.mkdtemp(prefix=os.path.basename(path) + ".", suffix=".saving", dir=parent)
+    try:
+        _write_arrays(staging, table, store, raster, image, graph)
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            f.write(meta_text)
+        if os.path.exists(path):
+            old = staging[:-len(".saving")] + ".old"
+            os.rename(path, old)
+            os.rename(staging, path)
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.rename(staging, path)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _write_arrays(path, table, store, raster, image, graph):
+    def save(name, array):
+        np.save(os.path.join(path, name + ".npy"), np.ascontiguousarray(array))
+
+    save("x", table.x)
+    save("y", table.y)
+    if isinstance(table.ids, pd.Categorical):
+        save("id_codes", table.ids.codes.astype(np.int32))
+        save("id_names", np.asarray(table.ids.categories, dtype=str))
+    else:
+        save("ids", table.ids)
+    save("label_codes", store.codes)
+    if raster is not None:
+        save("gray", raster.gray)
+        if raster.components is not None:
+            save("components", raster.components)
+    if image is not None:
+        save("image", np.asarray(image.convert("RGB")) if hasattr(image, "convert") else image)
+    if graph is not None:
+        save("graph_indptr", graph.indptr)
+        save("graph_neighbors", graph.neighbors)
+
+
+def _plain(value):
+    # a Python value json can write, numpy scalars included
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def open_project(path, mmap_mode="r"):
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["version"] > FORMAT_VERSION:
+        raise ValueError(f"{path} was written by a newer version (format {meta['version']})")
+
+    def load(name):
+        filename = os.path.join(path, name + ".npy")
+        return np.load(filename, mmap_mode=mmap_mode) if os.path.exists(filename) else None
+
+    if meta["id_kind"] == "categorical":
+        ids = pd.Categorical.from_codes(load("id_codes"), categories=pd.Index(load("id_names"), dtype=object))
+    else:
+        ids = load("ids")
+    table = NodeTable(ids, load("x"), load("y"), tuple(meta["extents"]))
+
+    # the label codes are edited, so they are read into memory
+    store = LabelStore(len(table))
+    store.codes[:] = load("label_codes")
+    for label in meta["categories"]:
+        store.code_for(label)
+
+    raster = None
+    image_scale = (1.0, 1.0)
+    if meta["raster"] is not None:
+        raster = RasterCache(load("gray"), meta["raster"]["tolerance"], load("components"),
+                             meta["raster"]["tiled"])
+        image_scale = tuple(meta["raster"]["image_scale"])
+
+    graph = None
+    indptr = load("graph_indptr")
+    if indptr is not None:
+        graph = Adjacency(indptr, load("graph_neighbors"))
+
+    bbox = tuple(meta["bbox"]) if meta["bbox"] is not None else None
+    return Project(table, store, bbox, raster, load("image"), graph, image_scale)
@@ -0,0 +1,101 @@
+import numpy as np
+import skimage as ski
+from skimage.morphology import flood
+
+from tile_flood import TileFlood
+
+# rasters with more pixels than this are flood filled by tiles instead of labeled up front
+TILED_PIXELS = 4096 * 4096
+
+
+def to_grayscale(image):
+    # same conversion the flood fill has always used: drop alpha, then rgb2gray
+    return ski.color.rgb2gray(np.asarray(image.convert("RGB")))
+
+
+def equal_value_components(gray):
+    """Label the 8-connected regions of equal grey value.
+
+    With the default tolerance, flood(gray, seed) returns exactly the region that
+    contains the seed, so a region is the flood result of any of its pixels.
+    Labels start at 1.
+    """
+    values, codes = np.unique(gray, return_inverse=True)
+    codes = codes.reshape(gray.shape).astype(np.int32)
+    return ski.measure.label(codes, background=-1, connectivity=2).astype(np.int32)
+
+
+class RasterCache:
+    """Grayscale raster and its flood-fill regions, computed once per loaded image.
+
+    The connected components only reproduce flood() for the default exact-match
+    tolerance. With a tolerance the regions grown from different seeds overlap, so
+    those selections flood from the seed instead. Tiled rasters (by default those
+    with a tolerance or more than TILED_PIXELS pixels) flood through a TileFlood and
+    skip the up-front labeling, other rasters fall back to flood().
+    """
+
+    def __init__(self, gray, tolerance=None, components=None, tiled=None):
+        self.gray = gray
+        self.tolerance = tolerance
+        if tiled is None:
+            tiled = tolerance is not None or (components is None and gray.size > TILED_PIXELS)
+        self.tiles = TileFlood(gray) if tiled else None
+        if tolerance is None and components is None and not tiled:
+            components = equal_value_components(gray)
+        self.components = components if tolerance is None else None
+
+    @classmethod
+    def from_image(cls, image, tolerance=None, tiled=None):
+        return cls(to_grayscale(image), tolerance, tiled=tiled)
+
+    @property
+    def shape(self):
+        return self.gray.shape
+
+    def label_components(self):
+        # the regions of a tiled raster, computed when something needs all of them
+        if self.tolerance is not None:
+            raise ValueError("flood regions only exist for the exact-match tolerance (tolerance=None)")
+        if self.components is None:
+            self.components = equal_value_components(self.gray)
+        return self.components
+
+    def flood_mask(self, seed):
+        return flood(self.gray, seed, tolerance=self.tolerance)
+
+    def flood_region(self, seed):
+        # the flooded region as a TileMask, only for tiled rasters
+        return self.tiles.flood(seed, self.tolerance)
+
+    def pixel_components(self, px, py):
+        # component id under each pixel position, 0 for positions outside the raster
+        px = np.asarray(px).astype(np.int64)
+        py = np.asarray(py).astype(np.int64)
+        inside = (px >= 0) & (px < self.shape[1]) & (py >= 0) & (py < self.shape[0])
+        ids = np.zeros(len(px), dtype=np.int32)
+        ids[inside] = self.components[py[inside], px[inside]]
+        return ids
+
+
+class NodeComponents:
+    """Node indices grouped by the raster component they sit in.
+
+    Looking up the nodes flooded from a seed is then a single slice.
+    """
+
+    def __init__(self, raster, px, py):
+        self.raster = raster
+        self.node_component = raster.pixel_components(px, py)
+        self.order = np.argsort(self.node_component, kind="stable")
+        counts = np.bincount(self.node_component, minlength=int(raster.components.max()) + 1)
+        self.start = np.concatenate(([0], np.cumsum(counts)))
+
+    def nodes(self, component):
+        if component <= 0 or component + 1 >= len(self.start):
+            return np.zeros(0, dtype=np.int64)
+        return self.order[self.start[component]:self.start[component + 1]]
+
+    def flooded(self, seed):
+        # node indices in the region flood() would return for seed = (row, col)
+        return self.nodes(int(self.raster.components[seed]))
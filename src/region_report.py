@@ -0,0 +1,199 @@
+"""Per label statistics of a labeling: node counts, centroids, extents and edge cuts.
+
+Row 0 of every statistic belongs to the unlabeled nodes (code UNLABELED), row c + 1
+to label code c. A full build takes a few bincount passes over the nodes and one
+over the edges. After that, update() applies a change of labels, given like the
+diffs of a LabelJournal. Counts and coordinate sums are adjusted by the changed
+nodes alone. Extents are widened by the added nodes and only recomputed for the
+labels that lost a node on their border. The edge cut is adjusted by the edges
+touching changed nodes. Its matrix counts each edge once, between its two labels
+(lower row first), the diagonal holds the edges inside a label.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from label_store import UNLABELED
+
+# pair counts use one bincount while rows * rows stays below this, np.unique above
+BINCOUNT_PAIRS = 1 << 22
+
+
+class RegionReport:
+    """Statistics of node coordinates x, y and an optional Adjacency per label code."""
+
+    def __init__(self, x, y, codes, graph=None, categories=0):
+        # extents keep the coordinate type, ufunc.at is only fast without casting
+        self.x = x if np.issubdtype(x.dtype, np.floating) else x.astype(np.float64)
+        self.y = y if np.issubdtype(y.dtype, np.floating) else y.astype(np.float64)
+        self.codes = codes # the LabelStore's codes, read after each change
+        self.graph = graph
+        self.rows = max(categories, int(codes.max(initial=UNLABELED)) + 1) + 1
+        self.build()
+
+    def build(self):
+        rows = self.rows
+        k = self.codes + 1
+        self.count = np.bincount(k, minlength=rows).astype(np.int64)
+        self.sum_x = np.bincount(k, self.x, minlength=rows)
+        self.sum_y = np.bincount(k, self.y, minlength=rows)
+        self._build_extents()
+        self.pairs = sp.csr_matrix((rows, rows), dtype=np.int64)
+        if self.graph is None:
+            return
+        degree = self.graph.degree()
+        if rows * rows <= BINCOUNT_PAIRS:
+            # the adjacency holds every edge in both directions: count the directed label
+            # pairs and fold them onto the upper triangle, halving the diagonal
+            keys = np.repeat(k * rows, degree) + k[self.graph.neighbors]
+            directed = np.bincount(keys, minlength=rows * rows).reshape(rows, rows)
+            self.pairs = sp.csr_matrix(np.triu(directed, 1) + np.diag(directed.diagonal() // 2))
+        else:
+            # each edge once, from its lower to its higher node
+            source = np.repeat(np.arange(len(degree), dtype=self.graph.neighbors.dtype), degree)
+            once = source < self.graph.neighbors
+            self.pairs = self._pair_matrix(k[source[once]], k[self.graph.neighbors[once]])
+
+    def _build_extents(self):
+        self.min_x = np.full(self.rows, np.inf, dtype=self.x.dtype)
+        self.max_x = np.full(self.rows, -np.inf, dtype=self.x.dtype)
+        self.min_y = np.full(self.rows, np.inf, dtype=self.y.dtype)
+        self.max_y = np.full(self.rows, -np.inf, dtype=self.y.dtype)
+        self._widen(self.codes + 1, self.x, self.y)
+
+    def _widen(self, k, x, y):
+        np.minimum.at(self.min_x, k, x)
+        np.maximum.at(self.max_x, k, x)
+        np.minimum.at(self.min_y, k, y)
+        np.maximum.at(self.max_y, k, y)
+
+    def _pair_matrix(self, a, b, weights=None):
+        # sparse rows x rows counts of the label pairs (a, b), lower row first
+        lo, hi = np.minimum(a, b).astype(np.int64), np.maximum(a, b).astype(np.int64)
+        keys = lo * self.rows + hi
+        if self.rows * self.rows <= BINCOUNT_PAIRS:
+            counts = np.bincount(keys, weights, minlength=self.rows * self.rows)
+            keys = np.flatnonzero(counts)
+            counts = counts[keys]
+        elif weights is None:
+            keys, counts = np.unique(keys, return_counts=True)
+        else:
+            keys, inverse = np.unique(keys, return_inverse=True)
+            counts = np.bincount(inverse, weights)
+        return sp.csr_matrix((counts.astype(np.int64), (keys // self.rows, keys % self.rows)),
+                             shape=(self.rows, self.rows))
+
+    def _grow(self, rows):
+        # room for label codes added since the last update
+        extra = rows - self.rows
+        self.count = np.concatenate([self.count, np.zeros(extra, dtype=np.int64)])
+        self.sum_x = np.concatenate([self.sum_x, np.zeros(extra)])
+        self.sum_y = np.concatenate([self.sum_y, np.zeros(extra)])
+        self.min_x = np.concatenate([self.min_x, np.full(extra, np.inf, dtype=self.x.dtype)])
+        self.max_x = np.concatenate([self.max_x, np.full(extra, -np.inf, dtype=self.x.dtype)])
+        self.min_y = np.concatenate([self.min_y, np.full(extra, np.inf, dtype=self.y.dtype)])
+        self.max_y = np.concatenate([self.max_y, np.full(extra, -np.inf, dtype=self.y.dtype)])
+        self.pairs.resize((rows, rows))
+        self.rows = rows
+
+    def update(self, indices, old, new):
+        """Apply a change already made to codes: the nodes at indices went from the
+        codes old to new (one code or one per node)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        old = np.broadcast_to(np.asarray(old, dtype=np.int64), indices.shape)
+        new = np.broadcast_to(np.asarray(new, dtype=np.int64), indices.shape)
+        changed = old != new
+        if not changed.any():
+            return
+        indices, old_k, new_k = indices[changed], old[changed] + 1, new[changed] + 1
+        needed = int(new_k.max()) + 1
+        if needed > self.rows:
+            self._grow(max(needed, 2 * self.rows))
+        rows = self.rows
+        x, y = self.x[indices], self.y[indices]
+
+        self.count += np.bincount(new_k, minlength=rows) - np.bincount(old_k, minlength=rows)
+        self.sum_x += np.bincount(new_k, x, minlength=rows) - np.bincount(old_k, x, minlength=rows)
+        self.sum_y += np.bincount(new_k, y, minlength=rows) - np.bincount(old_k, y, minlength=rows)
+
+        # labels that lost a node lying on their border have their extents rescanned,
+        # the others only grow by the nodes they gained
+        on_border = ((x == self.min_x[old_k]) | (x == self.max_x[old_k])
+                     | (y == self.min_y[old_k]) | (y == self.max_y[old_k]))
+        stale = np.zeros(rows, dtype=bool)
+        stale[old_k[on_border]] = True
+        self._widen(new_k, x, y)
+        if stale.any():
+            self.min_x[stale] = self.min_y[stale] = np.inf
+            self.max_x[stale] = self.max_y[stale] = -np.inf
+            members = np.flatnonzero(stale[self.codes + 1])
+            self._widen(self.codes[members] + 1, self.x[members], self.y[members])
+
+        if self.graph is not None:
+            self._update_pairs(indices, old_k)
+
+    def _update_pairs(self, indices, old_k):
+        # the edges touching changed nodes leave their old label pair for the new one;
+        # an edge between two changed nodes is met from both ends and taken once
+        position, neighbour = self.graph.neighbors_of_many(indices)
+        if len(neighbour) == 0:
+            return
+        order = np.argsort(indices)
+        found = order[np.minimum(np.searchsorted(indices, neighbour, sorter=order), len(indices) - 1)]
+        in_change = indices[found] == neighbour
+        keep = ~in_change | (indices[position] < neighbour)
+        position, neighbour, in_change, found = position[keep], neighbour[keep], in_change[keep], found[keep]
+
+        source_k = self.codes[indices[position]].astype(np.int64) + 1
+        neighbour_k = self.codes[neighbour].astype(np.int64) + 1
+        # unchanged neighbours still have the code they had before
+        old_neighbour_k = neighbour_k.copy()
+        old_neighbour_k[in_change] = old_k[found[in_change]]
+        weights = np.concatenate([np.ones(len(position)), -np.ones(len(position))])
+        delta = self._pair_matrix(np.concatenate([source_k, old_k[position]]),
+                                  np.concatenate([neighbour_k, old_neighbour_k]), weights)
+        self.pairs = self.pairs + delta
+        self.pairs.eliminate_zeros()
+
+    def cuts(self):
+        # edges inside each row and edges leaving it
+        diagonal = self.pairs.diagonal()
+        touching = np.asarray(self.pairs.sum(axis=0)).ravel() + np.asarray(self.pairs.sum(axis=1)).ravel()
+        return diagonal, touching - 2 * diagonal
+
+    def frame(self, categories):
+        """One row per label with nodes, and the unlabeled nodes first with label None."""
+        internal, cut = self.cuts()
+        rows = np.flatnonzero(self.count)
+        rows = np.concatenate([[0], rows[rows > 0]])
+        count = self.count[rows]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            frame = pd.DataFrame({
+                "label": [None] + [categories[row - 1] for row in rows[1:]],
+                "nodes": count,
+                "centroid_x": self.sum_x[rows] / count, "centroid_y": self.sum_y[rows] / count,
+                "min_x": self.min_x[rows].astype(np.float64), "min_y": self.min_y[rows].astype(np.float64),
+                "max_x": self.max_x[rows].astype(np.float64), "max_y": self.max_y[rows].astype(np.float64)})
+        # extents of an empty row are +-inf, shown as missing
+        frame[["min_x", "min_y", "max_x", "max_y"]] = frame[["min_x", "min_y", "max_x", "max_y"]].replace(
+            [np.inf, -np.inf], np.nan)
+        if self.graph is not None:
+            frame["internal_edges"] = internal[rows]
+            frame["cut_edges"] = cut[rows]
+        return frame
+
+    def cut_frame(self, categories):
+        """Edges between each pair of different labels that are linked, most first."""
+        pairs = sp.triu(self.pairs, k=1).tocoo()
+        names = [None] + list(categories)
+        frame = pd.DataFrame({"label": [names[row] for row in pairs.row],
+                              "other": [names[col] for col in pairs.col], "edges": pairs.data})
+        return frame.sort_values("edges", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def cuts_filename(filename):
+    # where the label pair table goes next to a report CSV: report.csv -> report_cuts.csv
+    root, ext = os.path.splitext(filename)
+    return f"{root}_cuts{ext or '.csv'}"
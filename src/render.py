@@ -0,0 +1,310 @@
+import numpy as np
+from PIL import Image
+
+from transform import Affine
+
+# number of canvas items sent to Tcl in a single eval
+BATCH_SIZE = 5000
+
+
+def data_extents(x, y):
+    # (min_x, max_x, min_y, max_y) of the node coordinates, computed once per load
+    x = np.asarray(x)
+    y = np.asarray(y)
+    return (float(x.min()), float(x.max()), float(y.min()), float(y.max()))
+
+
+def node_screen_coords(x, y, extents, bbox):
+    """Map data coordinates onto the canvas rectangle bbox = (x0, y0, x1, y1).
+
+    The data y axis points up while the canvas y axis points down, so y is flipped.
+    This is the data to world map of a CoordinateSystem georeferenced on bbox.
+    """
+    min_x, max_x, min_y, max_y = extents
+    return Affine.from_rects((min_x, max_y, max_x, min_y), bbox)(x, y)
+
+
+def node_fill_colors(labeled, labeled_color='white', unlabeled_color='red'):
+    # one fill colour per node picked from the boolean labeled mask
+    return np.where(labeled, labeled_color, unlabeled_color)
+
+
+def oval_commands(widget, sx, sy, radius, fills, tags=None):
+    # build the Tcl "create oval" commands for a batch of nodes
+    sx = np.asarray(sx)
+    sy = np.asarray(sy)
+    corners = np.column_stack([sx - radius, sy - radius, sx + radius, sy + radius]).round(1).tolist()
+    suffix = f" -tags {{{tags}}}" if tags else ""
+    return [f"lappend ids [{widget} create oval {a} {b} {c} {d} -fill {f}{suffix}]"
+            for (a, b, c, d), f in zip(corners, np.asarray(fills).tolist())]
+
+
+def create_ovals(canvas, sx, sy, radius, fills, tags=None, batch_size=BATCH_SIZE):
+    """Create one oval per node, sending the canvas commands to Tcl in batches.
+
+    Returns the canvas item ids in node order.
+    """
+    ids = []
+    widget = str(canvas)
+    for start in range(0, len(sx), batch_size):
+        stop = start + batch_size
+        commands = oval_commands(widget, sx[start:stop], sy[start:stop], radius, fills[start:stop], tags)
+        script = "set ids {}\n" + "\n".join(commands) + "\nset ids"
+        ids.extend(canvas.tk.splitlist(canvas.tk.eval(script)))
+    return np.asarray(ids, dtype=np.int64)
+
+
+def line_commands(widget, x0, y0, x1, y1, fill, tags=None):
+    # build the Tcl "create line" commands for a batch of edges
+    ends = np.column_stack([x0, y0, x1, y1]).round(1).tolist()
+    suffix = f" -tags {{{tags}}}" if tags else ""
+    return [f"{widget} create line {a} {b} {c} {d} -fill {fill}{suffix}" for a, b, c, d in ends]
+
+
+def create_lines(canvas, x0, y0, x1, y1, fill='gray', tags=None, batch_size=BATCH_SIZE):
+    # one line per edge, sent to Tcl in batches like the ovals
+    widget = str(canvas)
+    for start in range(0, len(x0), batch_size):
+        stop = start + batch_size
+        canvas.tk.eval("\n".join(line_commands(widget, x0[start:stop], y0[start:stop],
+                                                x1[start:stop], y1[start:stop], fill, tags)))
+
+
+class NodeLayer:
+    """Registry of the canvas ovals drawn for the current frame.
+
+    The ovals are kept in the order of the node indices they stand for, so a label
+    change only reconfigures the items whose colour actually changed.
+    """
+
+    def __init__(self, canvas, tag="nodes", labeled_color='white', unlabeled_color='red'):
+        self.canvas = canvas
+        self.tag = tag
+        self.labeled_color = labeled_color
+        self.unlabeled_color = unlabeled_color
+        self.item_ids = np.zeros(0, dtype=np.int64)
+        self.indices = None # node index of each oval, None when every node is drawn
+        self.drawn_labeled = np.zeros(0, dtype=bool)
+
+    def build(self, sx, sy, radius, labeled, indices=None):
+        # replace whatever this layer drew before, labeled is given per drawn oval
+        self.canvas.delete(self.tag)
+        labeled = np.asarray(labeled, dtype=bool)
+        fills = node_fill_colors(labeled, self.labeled_color, self.unlabeled_color)
+        self.item_ids = create_ovals(self.canvas, sx, sy, radius, fills, tags=self.tag)
+        self.indices = indices
+        self.drawn_labeled = labeled.copy()
+
+    def recolor(self, labeled):
+        """Reconfigure only the ovals whose labeled state changed, returns how many.
+
+        labeled is the state of every node, the drawn subset is picked from it.
+        """
+        labeled = np.asarray(labeled, dtype=bool)
+        if self.indices is not None:
+            labeled = labeled[self.indices]
+        changed = np.flatnonzero(labeled != self.drawn_labeled)
+        if len(changed) == 0:
+            return 0
+        widget = str(self.canvas)
+        fills = node_fill_colors(labeled[changed], self.labeled_color, self.unlabeled_color).tolist()
+        ids = self.item_ids[changed].tolist()
+        for start in range(0, len(ids), BATCH_SIZE):
+            stop = start + BATCH_SIZE
+            self.canvas.tk.eval("\n".join(f"{widget} itemconfigure {i} -fill {f}"
+                                          for i, f in zip(ids[start:stop], fills[start:stop])))
+        self.drawn_labeled[changed] = labeled[changed]
+        return len(changed)
+
+    def clear(self):
+        self.canvas.delete(self.tag)
+        self.item_ids = np.zeros(0, dtype=np.int64)
+        self.indices = None
+        self.drawn_labeled = np.zeros(0, dtype=bool)
+
+
+class Viewport:
+    """Zoom and pan state mapping world coordinates onto the canvas.
+
+    World coordinates are pixels of the background as it was first fitted to the
+    canvas, so at zoom 1 without panning they equal canvas coordinates.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.scale = 1.0
+        self.offset_x = 0.0 # world coordinate shown at the left canvas edge
+        self.offset_y = 0.0 # world coordinate shown at the top canvas edge
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+
+    def to_canvas(self, wx, wy):
+        return (np.asarray(wx) - self.offset_x) * self.scale, (np.asarray(wy) - self.offset_y) * self.scale
+
+    def to_world(self, cx, cy):
+        return np.asarray(cx) / self.scale + self.offset_x, np.asarray(cy) / self.scale + self.offset_y
+
+    def zoom_at(self, cx, cy, factor):
+        # keep the world point under the cursor in place
+        wx, wy = self.to_world(cx, cy)
+        self.scale *= factor
+        self.offset_x = float(wx - cx / self.scale)
+        self.offset_y = float(wy - cy / self.scale)
+
+    def pan(self, dx, dy):
+        # move the view by dx, dy canvas pixels
+        self.offset_x -= dx / self.scale
+        self.offset_y -= dy / self.scale
+
+    def canvas_to_world(self):
+        return Affine(1.0 / self.scale, self.offset_x, 1.0 / self.scale, self.offset_y)
+
+    def world_rect(self):
+        return (self.offset_x, self.offset_y,
+                self.offset_x + self.width / self.scale, self.offset_y + self.height / self.scale)
+
+
+class DensityGrid:
+    """Node and labeled-node counts on a fixed grid of cell x cell world pixels.
+
+    Built once per bounding box. Zoomed-out frames pool these counts into clusters,
+    so their cost depends on the grid size and not on the number of nodes.
+    """
+
+    def __init__(self, wx, wy, labeled, width, height, cell=2.0):
+        self.cell = cell
+        self.nx = int(np.ceil(width / cell)) + 1
+        self.ny = int(np.ceil(height / cell)) + 1
+        cx = np.clip(np.asarray(wx) / cell, 0, self.nx - 1).astype(np.int32)
+        cy = np.clip(np.asarray(wy) / cell, 0, self.ny - 1).astype(np.int32)
+        self.cell_of = cy * self.nx + cx
+        self.counts = np.bincount(self.cell_of, minlength=self.nx * self.ny).reshape(self.ny, self.nx)
+        self.set_labeled(labeled)
+
+    def set_labeled(self, labeled):
+        self.node_labeled = np.asarray(labeled, dtype=bool).copy()
+        self.labeled = np.bincount(self.cell_of[self.node_labeled], minlength=self.nx * self.ny).reshape(self.ny, self.nx)
+
+    def update_labeled(self, indices, labeled):
+        # adjust the labeled counts for the nodes at indices whose state changed
+        indices = np.asarray(indices, dtype=np.int64)
+        now = np.asarray(labeled, dtype=bool)[indices]
+        flipped = now != self.node_labeled[indices]
+        changed = indices[flipped]
+        if len(changed):
+            np.add.at(self.labeled.ravel(), self.cell_of[changed], np.where(now[flipped], 1, -1))
+            self.node_labeled[changed] = now[flipped]
+
+    def _cell_range(self, rect):
+        x0 = int(np.clip(np.floor(rect[0] / self.cell), 0, self.nx))
+        y0 = int(np.clip(np.floor(rect[1] / self.cell), 0, self.ny))
+        x1 = int(np.clip(np.ceil(rect[2] / self.cell), 0, self.nx))
+        y1 = int(np.clip(np.ceil(rect[3] / self.cell), 0, self.ny))
+        return x0, y0, x1, y1
+
+    def count_in(self, rect):
+        x0, y0, x1, y1 = self._cell_range(rect)
+        return int(self.counts[y0:y1, x0:x1].sum())
+
+    def clusters(self, rect, size):
+        """Pool the cells inside rect into clusters of about size world pixels.
+
+        Returns the world centre, node count and labeled count of every non-empty cluster.
+        """
+        x0, y0, x1, y1 = self._cell_range(rect)
+        pool = max(1, int(round(size / self.cell)))
+        # round the window out to whole clusters
+        x1 = min(self.nx, x0 + -(-(x1 - x0) // pool) * pool)
+        y1 = min(self.ny, y0 + -(-(y1 - y0) // pool) * pool)
+        counts = _sum_pool(self.counts[y0:y1, x0:x1], pool)
+        labeled = _sum_pool(self.labeled[y0:y1, x0:x1], pool)
+        rows, cols = np.nonzero(counts)
+        wx = (x0 + (cols + 0.5) * pool) * self.cell
+        wy = (y0 + (rows + 0.5) * pool) * self.cell
+        return wx, wy, counts[rows, cols], labeled[rows, cols]
+
+
+def _sum_pool(grid, pool):
+    # sum pool x pool blocks, a ragged last row or column of blocks included
+    ny, nx = grid.shape
+    padded = np.zeros((-(-ny // pool) * pool, -(-nx // pool) * pool), dtype=grid.dtype)
+    padded[:ny, :nx] = grid
+    return padded.reshape(padded.shape[0] // pool, pool, padded.shape[1] // pool, pool).sum(axis=(1, 3))
+
+
+class DrawList:
+    """Canvas items for one frame: individual nodes or aggregated clusters."""
+
+    def __init__(self, kind, sx, sy, radius, fills, indices=None, edges=None):
+        self.kind = kind
+        self.sx = sx
+        self.sy = sy
+        self.radius = radius
+        self.fills = fills
+        self.indices = indices
+        self.edges = edges # (first, second) positions into sx, sy of the edges to draw
+
+    def __len__(self):
+        return len(self.sx)
+
+
+def build_draw_list(viewport, engine, density, node_radius, max_nodes=4000, cluster_px=24):
+    """Draw list for the visible part of the network.
+
+    At most max_nodes visible nodes are drawn one by one, denser views are drawn as
+    clusters from the density grid, sized by node count and coloured red (nothing
+    labeled), orange (partly labeled) or white (all labeled).
+    """
+    rect = viewport.world_rect()
+    if density.count_in(rect) > max_nodes:
+        wx, wy, counts, labeled = density.clusters(rect, cluster_px / viewport.scale)
+        sx, sy = viewport.to_canvas(wx, wy)
+        radius = np.minimum(2 + 1.5 * np.log2(counts), cluster_px / 2)
+        fills = np.where(labeled == counts, 'white', np.where(labeled == 0, 'red', 'orange'))
+        return DrawList("clusters", sx, sy, radius, fills)
+
+    indices = engine.select_box(rect)
+    sx, sy = viewport.to_canvas(*engine.node_pixels(indices=indices))
+    edges = None
+    if engine.graph is not None:
+        # links between visible nodes, each once
+        links = engine.graph.matrix[indices][:, indices].tocoo()
+        once = links.row < links.col
+        edges = (links.row[once], links.col[once])
+    return DrawList("nodes", sx, sy, node_radius, node_fill_colors(engine.labeled[indices]), indices, edges)
+
+
+class ImagePyramid:
+    """Background image at full resolution and at successive halvings.
+
+    A frame crops the visible window from the coarsest level that still has at least
+    one source pixel per canvas pixel and resamples only that window, so the cost of
+    a frame depends on the canvas size rather than on the zoom level. The crop copies
+    its pixels, but at the chosen level the window is less than twice the canvas size
+    along each axis (smaller when zoomed in past the full resolution, at most the
+    coarsest level when zoomed out past it), so taking it from the level directly
+    costs no more than assembling it from stored tiles would.
+    """
+
+    def __init__(self, image, min_size=256):
+        self.levels = [image.convert("RGB")]
+        while min(self.levels[-1].size) // 2 >= min_size:
+            self.levels.append(self.levels[-1].reduce(2))
+
+    @property
+    def size(self):
+        return self.levels[0].size
+
+    def render(self, world_rect, out_size, source_per_world):
+        # source pixels covered by the visible world rectangle
+        x0, y0, x1, y1 = (value * source_per_world for value in world_rect)
+        ratio = (x1 - x0) / max(out_size[0], 1)
+        level = int(np.clip(np.floor(np.log2(max(ratio, 1.0))), 0, len(self.levels) - 1))
+        factor = 2 ** level
+        box = tuple(int(round(value / factor)) for value in (x0, y0, x1, y1))
+        if box[2] <= box[0] or box[3] <= box[1]:
+            return Image.new("RGB", out_size)
+        return self.levels[level].crop(box).resize(out_size, Image.Resampling.BILINEAR)
@@ -0,0 +1,214 @@
+import numpy as np
+from scipy import ndimage
+
+
+def points_in_polygon(x, y, px, py, chunk_size=250_000):
+    """Even-odd point-in-polygon test for all points (x, y) against polygon (px, py).
+
+    The polygon's height is cut into horizontal bands, about one per edge, and every
+    edge is listed under the bands it spans. A point is then only tested against the
+    edges of its own band, which for a freehand outline are a handful, instead of
+    against all edges.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    px = np.asarray(px, dtype=np.float64)
+    py = np.asarray(py, dtype=np.float64)
+    inside = np.zeros(len(x), dtype=bool)
+
+    # edges from vertex i - 1 to vertex i, horizontal ones never cross a ray
+    ax, ay, bx, by = np.roll(px, 1), np.roll(py, 1), px, py
+    keep = ay != by
+    ax, ay, bx, by = ax[keep], ay[keep], bx[keep], by[keep]
+    if len(ax) == 0:
+        return inside
+
+    # edges listed per band, as one array sorted by band
+    min_y, max_y = float(py.min()), float(py.max())
+    bands = len(ax)
+    height = (max_y - min_y) / bands or 1.0
+    first = np.clip(((np.minimum(ay, by) - min_y) / height).astype(np.int64), 0, bands - 1)
+    last = np.clip(((np.maximum(ay, by) - min_y) / height).astype(np.int64), 0, bands - 1)
+    spans = last - first + 1
+    band_edges = np.repeat(np.arange(len(ax)), spans)
+    edge_band = np.repeat(first, spans) + (np.arange(len(band_edges)) - np.repeat(np.cumsum(spans) - spans, spans))
+    order = np.argsort(edge_band, kind="stable")
+    band_edges = band_edges[order]
+    band_start = np.concatenate(([0], np.cumsum(np.bincount(edge_band, minlength=bands))))
+
+    candidates = np.flatnonzero((y >= min_y) & (y <= max_y))
+    for start in range(0, len(candidates), chunk_size):
+        points = candidates[start:start + chunk_size]
+        band = np.clip(((y[points] - min_y) / height).astype(np.int64), 0, bands - 1)
+        # one (point, edge) pair per edge in the point's band
+        counts = band_start[band + 1] - band_start[band]
+        pair_point = np.repeat(np.arange(len(points)), counts)
+        offsets = np.arange(len(pair_point)) - np.repeat(np.cumsum(counts) - counts, counts)
+        edge = band_edges[np.repeat(band_start[band], counts) + offsets]
+        qx, qy = x[points][pair_point], y[points][pair_point]
+        # edges crossing the horizontal ray through each point, counted on the left
+        crosses = (ay[edge] > qy) != (by[edge] > qy)
+        x_cross = ax[edge] + (qy - ay[edge]) * (bx[edge] - ax[edge]) / (by[edge] - ay[edge])
+        hits = np.bincount(pair_point[crosses & (qx < x_cross)], minlength=len(points))
+        inside[points] = hits % 2 == 1
+    return inside
+
+
+class GridIndex:
+    """Uniform grid over node coordinates in data space.
+
+    Node indices are sorted by grid cell, cells are numbered row by row, so the
+    cells of one grid row inside a query box form one contiguous slice of the
+    sorted indices.
+    """
+
+    def __init__(self, x, y, nodes_per_cell=8):
+        # float32 coordinates are kept as they are, other types become float64
+        self.x = np.ascontiguousarray(x)
+        self.y = np.ascontiguousarray(y)
+        if not np.issubdtype(self.x.dtype, np.floating):
+            self.x = self.x.astype(np.float64)
+        if not np.issubdtype(self.y.dtype, np.floating):
+            self.y = self.y.astype(np.float64)
+        n = len(self.x)
+        if n == 0:
+            raise ValueError("cannot index an empty set of nodes")
+
+        self.min_x, self.max_x = float(self.x.min()), float(self.x.max())
+        self.min_y, self.max_y = float(self.y.min()), float(self.y.max())
+        span_x = (self.max_x - self.min_x) or 1.0
+        span_y = (self.max_y - self.min_y) or 1.0
+
+        # square cells holding about nodes_per_cell nodes on average
+        cell_size = np.sqrt(span_x * span_y * nodes_per_cell / n)
+        self.nx = max(1, min(int(np.ceil(span_x / cell_size)), 4096))
+        self.ny = max(1, min(int(np.ceil(span_y / cell_size)), 4096))
+        self.cell_w = span_x / self.nx
+        self.cell_h = span_y / self.ny
+
+        cells = self._cell_y(self.y) * self.nx + self._cell_x(self.x)
+        self.order = np.argsort(cells, kind="stable").astype(np.int32 if n < 2**31 else np.int64)
+        counts = np.bincount(cells, minlength=self.nx * self.ny)
+        self.cell_start = np.concatenate(([0], np.cumsum(counts)))
+
+    def __len__(self):
+        return len(self.x)
+
+    def _cell_x(self, x):
+        return np.clip(((np.asarray(x, dtype=np.float64) - self.min_x) / self.cell_w).astype(np.int64), 0, self.nx - 1)
+
+    def _cell_y(self, y):
+        return np.clip(((np.asarray(y, dtype=np.float64) - self.min_y) / self.cell_h).astype(np.int64), 0, self.ny - 1)
+
+    def _candidates(self, x0, y0, x1, y1):
+        # node indices in all cells overlapping the box, one slice per grid row
+        if x1 < self.min_x or x0 > self.max_x or y1 < self.min_y or y0 > self.max_y:
+            return np.zeros(0, dtype=self.order.dtype)
+        cx0, cx1 = int(self._cell_x(x0)), int(self._cell_x(x1))
+        cy0, cy1 = int(self._cell_y(y0)), int(self._cell_y(y1))
+        rows = [self.order[self.cell_start[cy * self.nx + cx0]:self.cell_start[cy * self.nx + cx1 + 1]]
+                for cy in range(cy0, cy1 + 1)]
+        return np.concatenate(rows)
+
+    def query_box(self, x0, y0, x1, y1):
+        """Sorted indices of the nodes inside the box, edges included."""
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        idx = self._candidates(x0, y0, x1, y1)
+        x = self.x[idx].astype(np.float64)
+        y = self.y[idx].astype(np.float64)
+        idx = idx[(x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)]
+        idx.sort()
+        return idx
+
+    def query_polygon(self, px, py):
+        """Sorted indices of the nodes inside the polygon with vertices (px, py).
+
+        Only nodes in cells the outline passes through are tested one by one. The
+        other cells of the polygon's bounding box form groups the outline does not
+        cross, so one cell centre per group decides whether all its nodes are inside.
+        """
+        px = np.asarray(px, dtype=np.float64)
+        py = np.asarray(py, dtype=np.float64)
+        x0, y0, x1, y1 = px.min(), py.min(), px.max(), py.max()
+        if x1 < self.min_x or x0 > self.max_x or y1 < self.min_y or y0 > self.max_y:
+            return np.zeros(0, dtype=self.order.dtype)
+        cx0, cx1 = int(self._cell_x(x0)), int(self._cell_x(x1))
+        cy0, cy1 = int(self._cell_y(y0)), int(self._cell_y(y1))
+
+        # cells the outline passes through, from points sampled along every edge less
+        # than half a cell apart, widened by one cell for edges that only clip a corner
+        ax, ay = np.roll(px, 1), np.roll(py, 1)
+        steps = np.ceil(np.hypot(px - ax, py - ay) / (0.5 * min(self.cell_w, self.cell_h))).astype(np.int64) + 1
+        edge = np.repeat(np.arange(len(px)), steps)
+        fraction = (np.arange(len(edge)) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(np.maximum(steps - 1, 1), steps)
+        sx = ax[edge] + fraction * (px - ax)[edge]
+        sy = ay[edge] + fraction * (py - ay)[edge]
+        outline = np.zeros((cy1 - cy0 + 1, cx1 - cx0 + 1), dtype=bool)
+        outline[np.clip(self._cell_y(sy), cy0, cy1) - cy0, np.clip(self._cell_x(sx), cx0, cx1) - cx0] = True
+        outline = ndimage.binary_dilation(outline, structure=np.ones((3, 3), dtype=bool))
+
+        # groups of cells away from the outline lie wholly inside or wholly outside
+        groups, count = ndimage.label(~outline)
+        _, first = np.unique(groups.ravel(), return_index=True)
+        first = first[1:] if groups.ravel()[first[0]] == 0 else first
+        rows, cols = np.divmod(first, outline.shape[1])
+        centre_x = self.min_x + (cx0 + cols + 0.5) * self.cell_w
+        centre_y = self.min_y + (cy0 + rows + 0.5) * self.cell_h
+        group_inside = np.zeros(count + 1, dtype=bool)
+        group_inside[groups.ravel()[first]] = points_in_polygon(centre_x, centre_y, px, py)
+
+        inner = self._cell_nodes(np.flatnonzero(group_inside[groups].ravel()), cx0, cy0, outline.shape[1])
+        edge_nodes = self._cell_nodes(np.flatnonzero(outline.ravel()), cx0, cy0, outline.shape[1])
+        edge_nodes = edge_nodes[points_in_polygon(self.x[edge_nodes], self.y[edge_nodes], px, py)]
+        idx = np.concatenate([inner, edge_nodes])
+        idx.sort()
+        return idx
+
+    def _cell_nodes(self, local_cells, cx0, cy0, width):
+        # node indices in the given cells, numbered row by row within a window of the grid
+        rows, cols = np.divmod(local_cells, width)
+        cells = (cy0 + rows) * self.nx + cx0 + cols
+        starts = self.cell_start[cells]
+        counts = self.cell_start[cells + 1] - starts
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return self.order[np.repeat(starts, counts) + offsets]
+
+    def nearest(self, qx, qy, max_distance=np.inf):
+        """Index of the node closest to (qx, qy), or -1 if none lies within max_distance."""
+        cx, cy = int(self._cell_x(qx)), int(self._cell_y(qy))
+        best, best_d2 = -1, np.inf
+        ring = 0
+        while True:
+            idx = self._ring(cx, cy, ring)
+            if len(idx):
+                d2 = (self.x[idx].astype(np.float64) - qx) ** 2 + (self.y[idx].astype(np.float64) - qy) ** 2
+                i = int(np.argmin(d2))
+                if d2[i] < best_d2:
+                    best, best_d2 = int(idx[i]), float(d2[i])
+            # every unvisited cell is at least this far away from the query point
+            reach = ring * min(self.cell_w, self.cell_h)
+            if reach * reach > min(best_d2, max_distance * max_distance):
+                break
+            if ring > max(self.nx, self.ny):
+                break
+            ring += 1
+        if best_d2 > max_distance * max_distance:
+            return -1
+        return best
+
+    def _ring(self, cx, cy, ring):
+        # node indices in the square ring of cells at Chebyshev distance ring from (cx, cy)
+        x0, x1 = max(cx - ring, 0), min(cx + ring, self.nx - 1)
+        y0, y1 = max(cy - ring, 0), min(cy + ring, self.ny - 1)
+        parts = []
+        for row in range(y0, y1 + 1):
+            if row == cy - ring or row == cy + ring:
+                parts.append(self.order[self.cell_start[row * self.nx + x0]:self.cell_start[row * self.nx + x1 + 1]])
+            else:
+                for col in (cx - ring, cx + ring):
+                    if 0 <= col < self.nx:
+                        parts.append(self.order[self.cell_start[row * self.nx + col]:self.cell_start[row * self.nx + col + 1]])
+        if not parts:
+            return np.zeros(0, dtype=self.order.dtype)
+        return np.concatenate(parts)
@@ -0,0 +1,130 @@
+"""Synthetic labeling inputs: node CSVs, region maps and edge lists of any size.
+
+Run from the src directory:
+
+    python synthetic.py --nodes 1000000 --map-size 4096 3277 --out ../data/synthetic
+
+Nodes are spread uniformly over coordinates like those of the ChicagoSketch network
+and written as node,x,y with ids 1..n. Each node is linked to its nearest neighbours,
+written headerless from,to like ChicagoSketch_net.csv. The map is a Voronoi partition
+of the same area into coloured regions with black borders, so every region is one
+exact-match flood fill; the partition does not depend on the map size, so maps of
+one seed at several resolutions show the same regions. The node extents are
+stretched over the whole map, the georeference is (0, 0, width, height).
+
+Everything is determined by the seed, files of one seed are identical on every run.
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+from scipy.spatial import cKDTree
+
+# min_x, max_x, min_y, max_y of the generated node coordinates
+EXTENTS = (600000, 720000, 1800000, 2000000)
+
+
+def node_coordinates(n, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.integers(EXTENTS[0], EXTENTS[1], n, endpoint=True)
+    y = rng.integers(EXTENTS[2], EXTENTS[3], n, endpoint=True)
+    # the corners fix the extents whatever n is
+    if n >= 2:
+        x[:2] = EXTENTS[:2]
+        y[:2] = EXTENTS[2:]
+    return x, y
+
+
+def write_nodes(filename, x, y, chunk=1_000_000):
+    with open(filename, "w") as f:
+        f.write("node,x,y\n")
+        for start in range(0, len(x), chunk):
+            stop = min(start + chunk, len(x))
+            pd.DataFrame({"node": np.arange(start + 1, stop + 1), "x": x[start:stop], "y": y[start:stop]}) \
+                .to_csv(f, header=False, index=False)
+
+
+def nearest_edges(x, y, k=3, chunk=1_000_000):
+    """Links from every node to its k nearest neighbours, each pair once, as index arrays."""
+    points = np.column_stack([x, y]).astype(np.float64)
+    tree = cKDTree(points)
+    sources, targets = [], []
+    for start in range(0, len(points), chunk):
+        _, near = tree.query(points[start:start + chunk], k=k + 1)
+        source = np.repeat(np.arange(start, start + len(near)), k)
+        target = near[:, 1:].ravel()
+        sources.append(np.minimum(source, target))
+        targets.append(np.maximum(source, target))
+    pairs = np.unique(np.column_stack([np.concatenate(sources), np.concatenate(targets)]), axis=0)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def write_edges(filename, source, target, chunk=5_000_000):
+    # node ids are index + 1, as written by write_nodes
+    with open(filename, "w") as f:
+        for start in range(0, len(source), chunk):
+            pd.DataFrame({"from": source[start:start + chunk] + 1, "to": target[start:start + chunk] + 1}) \
+                .to_csv(f, header=False, index=False)
+
+
+def region_map(width, height, regions=200, seed=0, detail=1024):
+    """RGB map of Voronoi regions, computed on a grid of at most detail cells a side
+    and scaled up to width x height."""
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform(0, 1, (regions, 2))
+    colours = rng.integers(40, 250, (regions, 3)).astype(np.uint8)
+
+    block = max(1, int(np.ceil(max(width, height) / detail)))
+    gw, gh = int(np.ceil(width / block)), int(np.ceil(height / block))
+    gx, gy = np.meshgrid((np.arange(gw) + 0.5) / gw, (np.arange(gh) + 0.5) / gh)
+    _, region = cKDTree(centres).query(np.column_stack([gx.ravel(), gy.ravel()]))
+    region = region.reshape(gh, gw)
+
+    small = colours[region]
+    border = np.zeros(region.shape, dtype=bool)
+    border[:-1] |= region[:-1] != region[1:]
+    border[:, :-1] |= region[:, :-1] != region[:, 1:]
+    small[border] = 0
+    pixels = np.repeat(np.repeat(small, block, axis=0), block, axis=1)[:height, :width]
+    return Image.fromarray(np.ascontiguousarray(pixels))
+
+
+def generate(directory, n, map_sizes=((2048, 1638),), regions=200, k=3, seed=0):
+    """Write nodes, edges and a map per size into directory, skipping files already there.
+
+    Returns a dict with the paths: nodes, edges and maps (size -> path).
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = {"nodes": os.path.join(directory, "nodes.csv"), "edges": os.path.join(directory, "edges.csv"),
+             "maps": {}}
+    if not (os.path.exists(paths["nodes"]) and os.path.exists(paths["edges"])):
+        x, y = node_coordinates(n, seed)
+        write_nodes(paths["nodes"], x, y)
+        write_edges(paths["edges"], *nearest_edges(x, y, k))
+    for width, height in map_sizes:
+        path = os.path.join(directory, f"map_{width}x{height}.png")
+        if not os.path.exists(path):
+            region_map(width, height, regions, seed).save(path)
+        paths["maps"][(width, height)] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=100_000)
+    parser.add_argument("--map-size", type=int, nargs=2, action="append", metavar=("WIDTH", "HEIGHT"),
+                        help="map size, may be given several times (default 2048 1638)")
+    parser.add_argument("--regions", type=int, default=200)
+    parser.add_argument("--neighbours", type=int, default=3, help="links per node")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="directory to write to")
+    args = parser.parse_args()
+    paths = generate(args.out, args.nodes, [tuple(size) for size in args.map_size or [(2048, 1638)]],
+                     args.regions, args.neighbours, args.seed)
+    print(paths["nodes"], paths["edges"], *paths["maps"].values())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Background work for the GUI.
+
+Long stages (reading node files, decoding maps, flood fills) run on a worker thread
+while Tk keeps handling events. The worker never touches widgets: it reports
+progress into its Task, and a root.after poll on the Tk thread forwards progress and
+delivers the result or the error to callbacks there.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+
+
+class Cancelled(Exception):
+    """Raised inside a task once cancellation was requested."""
+
+
+class Task:
+    """Progress and cancellation state shared between a worker and the Tk thread."""
+
+    def __init__(self, name):
+        self.name = name
+        self.fraction = None # None while the amount of work left is unknown
+        self.message = name
+        self.future = None
+        self._cancel = threading.Event()
+
+    def report(self, fraction=None, message=None):
+        # called by the worker, also the point where a cancelled task stops
+        self.check()
+        self.fraction = fraction
+        if message is not None:
+            self.message = message
+
+    def check(self):
+        if self._cancel.is_set():
+            raise Cancelled(self.name)
+
+    def cancel(self):
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+
+class TaskRunner:
+    """Runs one task at a time on a worker thread and polls it from the Tk loop.
+
+    work(task) runs on the worker. on_done(result) runs on the Tk thread, on_error(error)
+    as well, with a Cancelled error when the task was cancelled. on_progress(task) is
+    called on every poll while the task runs.
+    """
+
+    def __init__(self, root, poll_ms=50):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = None
+
+    @property
+    def busy(self):
+        return self.task is not None
+
+    def submit(self, name, work, on_done, on_error=None, on_progress=None):
+        if self.busy:
+            raise RuntimeError(f"cannot start {name!r} while {self.task.name!r} is running")
+        task = Task(name)
+        task.future = self.executor.submit(work, task)
+        self.task = task
+        self.root.after(self.poll_ms, self._poll, task, on_done, on_error, on_progress)
+        return task
+
+    def cancel(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    def _poll(self, task, on_done, on_error, on_progress):
+        if not task.future.done():
+            if on_progress is not None:
+                on_progress(task)
+            self.root.after(self.poll_ms, self._poll, task, on_done, on_error, on_progress)
+            return
+        self.task = None
+        try:
+            result = task.future.result()
+        except CancelledError:
+            error = Cancelled(task.name)
+        except Exception as e:
+            error = e
+        else:
+            if task.cancelled:
+                error = Cancelled(task.name)
+            else:
+                on_done(result)
+                return
+        if on_error is not None:
+            on_error(error)
+        elif not isinstance(error, Cancelled):
+            raise error
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,79 @@
+"""Labels saved to CSV load back onto the same nodes, whatever type the node ids have.
+
+Run from the src directory:  python -m pytest test_node_ids.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from labeling_engine import LabelingEngine
+from node_loader import load_nodes
+
+IDS = {
+    "int32": [3, 1, 2, 7, 5],
+    "int64": [5_000_000_000, 5_000_000_001, 7, 9_007_199_254_740_993, 5_000_000_004],
+    "string": ["a", "b", "c", "d", "e"],
+    "mixed": ["a", "12", "b", "40", "7"],
+    "numeric strings": ["0012", "1", "2", "3", "4"],
+}
+
+
+def write_nodes(path, ids):
+    frame = pd.DataFrame({"node": ids, "x": np.arange(len(ids), dtype=float), "y": np.arange(len(ids), dtype=float)})
+    frame.to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("kind", IDS)
+def test_labels_round_trip(tmp_path, kind):
+    engine = LabelingEngine()
+    engine.load_nodes(write_nodes(tmp_path / "nodes.csv", IDS[kind]))
+    engine.assign([0, 1], "north")
+    engine.assign([3], "south")
+    engine.save_labels(tmp_path / "labels.csv")
+
+    other = LabelingEngine()
+    other.load_nodes(tmp_path / "nodes.csv")
+    other.load_labels(tmp_path / "labels.csv")
+    assert other.store.labeled_count == 3
+    assert [other.store.label_of(i) for i in range(5)] == ["north", "north", None, "south", None]
+
+
+@pytest.mark.parametrize("kind", IDS)
+def test_project_round_trip(tmp_path, kind):
+    engine = LabelingEngine()
+    engine.load_nodes(write_nodes(tmp_path / "nodes.csv", IDS[kind]))
+    engine.assign([2, 4], "east")
+    engine.save_project(tmp_path / "project.nlproj")
+
+    other = LabelingEngine()
+    other.load_project(tmp_path / "project.nlproj")
+    assert list(map(str, other.nodes)) == list(map(str, engine.nodes))
+    engine.save_labels(tmp_path / "labels.csv")
+    other.load_labels(tmp_path / "labels.csv")
+    assert list(other.store.indices_of("east")) == [2, 4]
+
+
+def test_int64_ids_after_int32_chunk(tmp_path):
+    # the first chunk fits int32, a later one does not
+    ids = [1, 2, 3, 5_000_000_000, 5_000_000_001]
+    table = load_nodes(write_nodes(tmp_path / "nodes.csv", ids), chunksize=2)
+    assert table.ids.dtype == np.int64
+    assert list(table.ids) == ids
+
+
+def test_string_ids_after_int_chunk(tmp_path):
+    table = load_nodes(write_nodes(tmp_path / "nodes.csv", [1, 2, 5_000_000_000, "x", 4]), chunksize=2)
+    assert list(table.ids) == ["1", "2", "5000000000", "x", "4"]
+
+
+def test_string_ids_with_numeric_labels_file(tmp_path):
+    # only the ids that look like integers are labeled, so the labels file reads as ints
+    engine = LabelingEngine()
+    engine.load_nodes(write_nodes(tmp_path / "nodes.csv", IDS["mixed"]))
+    engine.assign([1, 4], "west")
+    engine.save_labels(tmp_path / "labels.csv")
+    other = LabelingEngine()
+    other.load_nodes(tmp_path / "nodes.csv")
+    other.load_labels(tmp_path / "labels.csv")
+    assert list(other.store.indices_of("west")) == [1, 4]
@@ -0,0 +1,74 @@
+"""Region report kept up to date by label changes equals one built from scratch.
+
+Run from the src directory:  python -m pytest test_region_report.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import region_report
+from labeling_engine import LabelingEngine
+from node_graph import Adjacency
+from region_report import RegionReport
+from synthetic import node_coordinates, nearest_edges
+
+
+@pytest.fixture
+def engine():
+    x, y = node_coordinates(2000, seed=1)
+    engine = LabelingEngine()
+    engine.set_nodes(pd.DataFrame({"node": np.arange(1, len(x) + 1), "x": x, "y": y}))
+    engine.graph = Adjacency.from_edges(*nearest_edges(x, y), len(x))
+    return engine
+
+
+def assert_rebuilt(engine):
+    report = engine.region_report()
+    fresh = RegionReport(engine.x, engine.y, engine.store.codes, engine.graph, len(engine.store.categories))
+    pd.testing.assert_frame_equal(report.frame(engine.store.categories), fresh.frame(engine.store.categories))
+    rows = max(report.rows, fresh.rows)
+    a, b = report.pairs.copy(), fresh.pairs.copy()
+    a.resize((rows, rows))
+    b.resize((rows, rows))
+    assert (a != b).nnz == 0
+
+
+@pytest.mark.parametrize("bincount_pairs", [region_report.BINCOUNT_PAIRS, 0])
+def test_incremental_equals_rebuilt(engine, monkeypatch, bincount_pairs):
+    monkeypatch.setattr(region_report, "BINCOUNT_PAIRS", bincount_pairs)
+    n = len(engine.nodes)
+    rng = np.random.default_rng(0)
+    engine.region_report()
+    for step in range(200):
+        op = rng.integers(4)
+        if op == 0:
+            # random nodes, some of them more than once
+            engine.assign(rng.integers(0, n, rng.integers(1, 300)), f"L{rng.integers(20)}")
+        elif op == 1:
+            engine.undo()
+        elif op == 2:
+            engine.redo()
+        else:
+            start = rng.integers(n)
+            engine.assign(np.arange(start, min(n, start + 40)), rng.integers(5))
+        if step % 20 == 0:
+            assert_rebuilt(engine)
+    engine.propagate_labels()
+    assert_rebuilt(engine)
+
+
+def test_duplicate_indices(engine):
+    engine.region_report()
+    engine.assign([5, 5, 7, 5], "a")
+    b = engine.store.code_for("b")
+    # node 7 keeps the code given last for it
+    engine.journal.set_codes([7, 9, 7], [0, 0, b])
+    assert_rebuilt(engine)
+    assert engine.store.label_of(7) == "b"
+    frame = engine.region_frame()
+    assert frame["label"].tolist()[1:] == ["a", "b"]
+    assert frame["nodes"].tolist() == [1997, 2, 1]
+    engine.undo()
+    engine.undo()
+    assert_rebuilt(engine)
+    assert engine.store.labeled_count == 0
@@ -0,0 +1,28 @@
+"""Density grid counts kept up to date by label changes equal a fresh count.
+
+Run from the src directory:  python -m pytest test_render.py
+"""
+import numpy as np
+
+from label_store import LabelStore
+from label_journal import LabelJournal
+from render import DensityGrid
+
+
+def test_density_grid_with_duplicate_indices():
+    rng = np.random.default_rng(0)
+    wx, wy = rng.uniform(0, 100, (2, 500))
+    store = LabelStore(500)
+    journal = LabelJournal(store)
+    grid = DensityGrid(wx, wy, store.labeled, 100, 100)
+    for _ in range(50):
+        if rng.random() < 0.7:
+            # the indices the journal hands back are the ones to refresh, each once
+            indices = journal.assign(rng.integers(0, 500, 40), "a")
+        else:
+            indices = journal.undo()
+            if indices is None:
+                continue
+        grid.update_labeled(indices, store.labeled)
+        fresh = DensityGrid(wx, wy, store.labeled, 100, 100)
+        assert np.array_equal(grid.labeled, fresh.labeled)
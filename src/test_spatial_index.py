@@ -0,0 +1,44 @@
+"""GridIndex queries return exactly what a scan of every node returns.
+
+Run from the src directory:  python -m pytest test_spatial_index.py
+"""
+import numpy as np
+import pytest
+
+from spatial_index import GridIndex, points_in_polygon
+from bench_spatial_index import random_polygon, freehand_lasso, edge_loop_polygon
+
+
+@pytest.fixture(params=[1_000, 50_000])
+def points(request):
+    rng = np.random.default_rng(request.param)
+    return rng, rng.uniform(0, 1e6, request.param), rng.uniform(0, 1e6, request.param)
+
+
+def test_box(points):
+    rng, x, y = points
+    index = GridIndex(x, y)
+    for _ in range(20):
+        x0, y0 = rng.uniform(-1e5, 1e6, 2)
+        x1, y1 = x0 + rng.uniform(0, 3e5), y0 + rng.uniform(0, 3e5)
+        expected = np.flatnonzero((x >= x0) & (x <= x1) & (y >= y0) & (y <= y1))
+        assert np.array_equal(index.query_box(x0, y0, x1, y1), expected)
+
+
+def test_nearest(points):
+    rng, x, y = points
+    index = GridIndex(x, y)
+    for qx, qy in rng.uniform(-1e5, 1.1e6, (20, 2)):
+        assert index.nearest(qx, qy) == int(np.argmin((x - qx) ** 2 + (y - qy) ** 2))
+    assert index.nearest(-1e7, -1e7, max_distance=1.0) == -1
+
+
+@pytest.mark.parametrize("outline", [random_polygon, freehand_lasso])
+def test_polygon(points, outline):
+    rng, x, y = points
+    index = GridIndex(x, y)
+    for radius in (2e4, 3e5):
+        px, py = outline(rng, 5e5, 5e5, radius)
+        found = index.query_polygon(px, py)
+        assert np.array_equal(found, np.flatnonzero(points_in_polygon(x, y, px, py)))
+        assert np.array_equal(found, np.flatnonzero(edge_loop_polygon(x, y, px, py)))
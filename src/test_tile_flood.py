@@ -0,0 +1,38 @@
+"""The tiled flood fills exactly the pixels skimage's flood fills.
+
+Run from the src directory:  python -m pytest test_tile_flood.py
+"""
+import numpy as np
+import pytest
+from skimage.morphology import flood
+
+from tile_flood import TileFlood
+from bench_tile_flood import synthetic_map
+
+
+@pytest.fixture(scope="module")
+def gray():
+    # odd size, so the last row and column of tiles are partial
+    return synthetic_map(1000, regions=30, block=8)[:997, :1000]
+
+
+@pytest.mark.parametrize("tile", [64, 100])
+@pytest.mark.parametrize("tolerance", [None, 0, 30])
+def test_flood_matches_skimage(gray, tile, tolerance):
+    rng = np.random.default_rng(tile)
+    tiles = TileFlood(gray, tile)
+    for _ in range(8):
+        seed = (int(rng.integers(gray.shape[0])), int(rng.integers(gray.shape[1])))
+        mask = flood(gray, seed, tolerance=tolerance)
+        region = tiles.flood(seed, tolerance)
+        assert region.pixel_count == np.count_nonzero(mask), seed
+        assert np.array_equal(region.to_dense(), mask), seed
+        ys = rng.integers(0, gray.shape[0], 10_000)
+        xs = rng.integers(0, gray.shape[1], 10_000)
+        assert np.array_equal(region.contains(xs, ys), mask[ys, xs]), seed
+
+
+def test_uniform_image():
+    region = TileFlood(np.full((300, 200), 7, dtype=np.uint8), 64).flood((5, 5))
+    assert region.pixel_count == 300 * 200
+    assert region.to_dense().all()
@@ -0,0 +1,205 @@
+"""Flood fill on a tiled raster, touching full-resolution pixels only along the region edge.
+
+The raster is cut into square tiles and the minimum and maximum of every tile are
+computed once per image, a coarse level of the raster. For one flood the tiles then
+fall into three kinds: tiles whose every pixel is within tolerance of the seed, tiles
+with no such pixel, and mixed tiles. The flood walks the tile grid from the seed
+tile: a uniform tile joins the region whole and passes the region on along all its
+borders, a mixed tile is labeled at full resolution and only the pieces reached
+through its borders join. The result is exactly flood()'s 8-connected region, kept
+as a TileMask: a flag per whole tile plus boolean masks of the mixed tiles, so time
+and memory follow the region outline rather than the image area.
+"""
+from collections import deque
+
+import numpy as np
+import skimage as ski
+
+# 8-neighbourhood of a tile, as (row step, column step)
+NEIGHBOURS = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+def tile_extrema(gray, tile):
+    # per tile minimum and maximum, edge tiles may be smaller than tile x tile; each band
+    # of tile rows is reduced down its columns first, which walks memory in order
+    col_starts = np.arange(0, gray.shape[1], tile)
+    bands = [gray[r:r + tile] for r in range(0, gray.shape[0], tile)]
+    tile_min = np.stack([np.minimum.reduceat(band.min(axis=0), col_starts) for band in bands])
+    tile_max = np.stack([np.maximum.reduceat(band.max(axis=0), col_starts) for band in bands])
+    return tile_min, tile_max
+
+
+class TileMask:
+    """Flood region over a tile grid: whole tiles plus masks of partly covered tiles."""
+
+    def __init__(self, shape, tile, full, partial):
+        self.shape = shape
+        self.tile = tile
+        self.full = full # bool per tile, True where the whole tile is in the region
+        self.partial = partial # (tile row, tile column) -> bool mask of that tile
+
+    @property
+    def nbytes(self):
+        return self.full.nbytes + sum(mask.nbytes for mask in self.partial.values())
+
+    @property
+    def pixel_count(self):
+        rows, cols = np.nonzero(self.full)
+        whole = sum(self._tile_shape(r, c)[0] * self._tile_shape(r, c)[1] for r, c in zip(rows, cols))
+        return int(whole + sum(np.count_nonzero(mask) for mask in self.partial.values()))
+
+    def bounds(self):
+        """Pixel rectangle (x0, y0, x1, y1), end exclusive, of the tiles the region touches."""
+        rows, cols = np.nonzero(self.full)
+        if self.partial:
+            keys = np.array(list(self.partial))
+            rows = np.concatenate([rows, keys[:, 0]])
+            cols = np.concatenate([cols, keys[:, 1]])
+        if len(rows) == 0:
+            return None
+        return (int(cols.min()) * self.tile, int(rows.min()) * self.tile,
+                min((int(cols.max()) + 1) * self.tile, self.shape[1]),
+                min((int(rows.max()) + 1) * self.tile, self.shape[0]))
+
+    def contains(self, px, py):
+        # whether each integer pixel position lies in the region
+        px = np.asarray(px).astype(np.int64)
+        py = np.asarray(py).astype(np.int64)
+        inside = (px >= 0) & (px < self.shape[1]) & (py >= 0) & (py < self.shape[0])
+        result = np.zeros(len(px), dtype=bool)
+        px, py = px[inside], py[inside]
+        rows, cols = py // self.tile, px // self.tile
+        hit = self.full[rows, cols]
+        if self.partial:
+            # group the remaining points by tile once, then look each group up in the
+            # mask of its tile
+            rest = np.flatnonzero(~hit)
+            keys = rows[rest] * self.full.shape[1] + cols[rest]
+            order = np.argsort(keys, kind="stable")
+            rest, keys = rest[order], keys[order]
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            for start, stop in zip(starts, np.r_[starts[1:], len(keys)]):
+                mask = self.partial.get(divmod(int(keys[start]), self.full.shape[1]))
+                if mask is None:
+                    continue
+                at = rest[start:stop]
+                hit[at] = mask[py[at] % self.tile, px[at] % self.tile]
+        result[inside] = hit
+        return result
+
+    def to_dense(self):
+        mask = np.zeros(self.shape, dtype=bool)
+        for r, c in zip(*np.nonzero(self.full)):
+            mask[r * self.tile:(r + 1) * self.tile, c * self.tile:(c + 1) * self.tile] = True
+        for (r, c), part in self.partial.items():
+            mask[r * self.tile:(r + 1) * self.tile, c * self.tile:(c + 1) * self.tile] |= part
+        return mask
+
+    def _tile_shape(self, r, c):
+        return (min(self.tile, self.shape[0] - r * self.tile), min(self.tile, self.shape[1] - c * self.tile))
+
+
+class TileFlood:
+    """Tile minima and maxima of a raster, computed once, and floods that use them."""
+
+    def __init__(self, gray, tile=256):
+        self.gray = gray
+        self.tile = tile
+        self.tile_min, self.tile_max = tile_extrema(gray, tile)
+
+    @property
+    def grid_shape(self):
+        return self.tile_min.shape
+
+    def flood(self, seed, tolerance=None):
+        """Region flood(gray, seed, tolerance=tolerance) would return, as a TileMask."""
+        value = self.gray[seed].item()
+        if tolerance is None:
+            lo = hi = value
+        else:
+            lo, hi = value - tolerance, value + tolerance
+        uniform = (self.tile_min >= lo) & (self.tile_max <= hi)
+        empty = (self.tile_max < lo) | (self.tile_min > hi)
+
+        full = np.zeros(self.grid_shape, dtype=bool)
+        partial = {}
+        labels = {} # mixed tile -> component labels of its pixels within tolerance
+        joined = {} # mixed tile -> component labels already in the region
+        entries = {} # tile -> pixel rows and columns through which the region reaches it
+        start = (seed[0] // self.tile, seed[1] // self.tile)
+        entries[start] = ([seed[0] % self.tile], [seed[1] % self.tile])
+        queue = deque([start])
+
+        while queue:
+            t = queue.popleft()
+            rows, cols = entries.pop(t)
+            if uniform[t]:
+                if full[t]:
+                    continue
+                full[t] = True
+                added = None
+            else:
+                if t not in labels:
+                    pixels = self._tile_pixels(t)
+                    labels[t] = ski.measure.label((pixels >= lo) & (pixels <= hi), connectivity=2)
+                    joined[t] = np.zeros(labels[t].max() + 1, dtype=bool)
+                reached = np.unique(labels[t][np.asarray(rows), np.asarray(cols)])
+                reached = reached[(reached > 0) & ~joined[t][reached]]
+                if len(reached) == 0:
+                    continue
+                joined[t][reached] = True
+                new = np.zeros(len(joined[t]), dtype=bool)
+                new[reached] = True
+                added = new[labels[t]]
+                if t in partial:
+                    partial[t] |= added
+                else:
+                    partial[t] = added.copy()
+            for nt, entry in self._spread(t, added, empty, full):
+                if nt in entries:
+                    entries[nt] = (np.concatenate([entries[nt][0], entry[0]]),
+                                   np.concatenate([entries[nt][1], entry[1]]))
+                else:
+                    entries[nt] = entry
+                    queue.append(nt)
+        return TileMask(self.gray.shape, self.tile, full, partial)
+
+    def _tile_shape(self, t):
+        return (min(self.tile, self.gray.shape[0] - t[0] * self.tile),
+                min(self.tile, self.gray.shape[1] - t[1] * self.tile))
+
+    def _tile_pixels(self, t):
+        return self.gray[t[0] * self.tile:(t[0] + 1) * self.tile, t[1] * self.tile:(t[1] + 1) * self.tile]
+
+    def _spread(self, t, added, empty, full):
+        # (neighbour tile, entry pixels) for every neighbour the newly added pixels touch;
+        # added is None when the whole tile was added
+        h, w = self._tile_shape(t)
+        if added is None:
+            added = np.ones((h, w), dtype=bool)
+        for dr, dc in NEIGHBOURS:
+            nt = (t[0] + dr, t[1] + dc)
+            if not (0 <= nt[0] < self.grid_shape[0] and 0 <= nt[1] < self.grid_shape[1]):
+                continue
+            if empty[nt] or full[nt]:
+                continue
+            nh, nw = self._tile_shape(nt)
+            if dr == 0 or dc == 0:
+                # across a side: the edge of this tile, widened by one for diagonal steps
+                edge = added[:, -1 if dc > 0 else 0] if dc else added[-1 if dr > 0 else 0, :]
+                touched = edge.copy()
+                touched[1:] |= edge[:-1]
+                touched[:-1] |= edge[1:]
+                along = np.flatnonzero(touched)
+                if len(along) == 0:
+                    continue
+                if dc:
+                    entry = (along, np.full(len(along), 0 if dc > 0 else nw - 1))
+                else:
+                    entry = (np.full(len(along), 0 if dr > 0 else nh - 1), along)
+            else:
+                # across a corner: only the corner pixels touch
+                if not added[-1 if dr > 0 else 0, -1 if dc > 0 else 0]:
+                    continue
+                entry = (np.array([0 if dr > 0 else nh - 1]), np.array([0 if dc > 0 else nw - 1]))
+            yield nt, entry
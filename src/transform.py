@@ -0,0 +1,88 @@
+"""Coordinate spaces of a labeling session and the maps between them.
+
+    data    node coordinates as read from the node file, y pointing up
+    world   pixels of the background as first fitted to the canvas; the bounding box
+            (georeference) is the world rectangle the data extents are stretched onto
+    image   pixels of the raster flood fills run on, the native map or a pyramid level
+    canvas  pixels of the widget, after zoom and pan
+
+Every map is axis aligned, a scale and an offset per axis, so maps compose into
+maps of the same form. Each space keeps its map to world; the map between two
+spaces is composed on first use and cached until one of the two spaces changes.
+"""
+import numpy as np
+
+
+class Affine:
+    """x' = sx * x + tx, y' = sy * y + ty."""
+
+    def __init__(self, sx=1.0, tx=0.0, sy=1.0, ty=0.0):
+        self.sx = float(sx)
+        self.tx = float(tx)
+        self.sy = float(sy)
+        self.ty = float(ty)
+
+    @classmethod
+    def from_rects(cls, source, target):
+        """Map rectangle source = (x0, y0, x1, y1) onto target, corner to corner.
+
+        Flipping an axis is a matter of giving its source edges in reverse order. A
+        source rectangle without width or height is treated as one unit wide.
+        """
+        sx = (target[2] - target[0]) / ((source[2] - source[0]) or 1.0)
+        sy = (target[3] - target[1]) / ((source[3] - source[1]) or 1.0)
+        return cls(sx, target[0] - sx * source[0], sy, target[1] - sy * source[1])
+
+    def __call__(self, x, y):
+        return (np.asarray(x, dtype=np.float64) * self.sx + self.tx,
+                np.asarray(y, dtype=np.float64) * self.sy + self.ty)
+
+    def then(self, other):
+        # self followed by other
+        return Affine(other.sx * self.sx, other.sx * self.tx + other.tx,
+                      other.sy * self.sy, other.sy * self.ty + other.ty)
+
+    def inverse(self):
+        return Affine(1.0 / self.sx, -self.tx / self.sx, 1.0 / self.sy, -self.ty / self.sy)
+
+    def rect(self, rect):
+        # image of an (x0, y0, x1, y1) rectangle, normalized so x0 <= x1 and y0 <= y1
+        x, y = self([rect[0], rect[2]], [rect[1], rect[3]])
+        return (float(min(x)), float(min(y)), float(max(x)), float(max(y)))
+
+    def __repr__(self):
+        return f"Affine(sx={self.sx!r}, tx={self.tx!r}, sy={self.sy!r}, ty={self.ty!r})"
+
+
+class CoordinateSystem:
+    """Maps between the data, world, image and canvas spaces, composed lazily."""
+
+    def __init__(self):
+        self.to_world = {"world": Affine()}
+        self._cache = {}
+
+    def set_space(self, name, to_world):
+        # replace the map of one space, only the maps touching it are recomposed
+        self.to_world[name] = to_world
+        self._cache = {pair: affine for pair, affine in self._cache.items() if name not in pair}
+
+    def set_georef(self, extents, bbox):
+        """Stretch the data extents (min_x, max_x, min_y, max_y) over the world rectangle bbox."""
+        min_x, max_x, min_y, max_y = extents
+        self.set_space("data", Affine.from_rects((min_x, max_y, max_x, min_y), bbox))
+
+    def set_image_scale(self, sx, sy):
+        # image pixels per world pixel along each axis
+        self.set_space("image", Affine(sx, 0.0, sy, 0.0).inverse())
+
+    def affine(self, source, target):
+        pair = (source, target)
+        if pair not in self._cache:
+            self._cache[pair] = self.to_world[source].then(self.to_world[target].inverse())
+        return self._cache[pair]
+
+    def map(self, source, target, x, y):
+        return self.affine(source, target)(x, y)
+
+    def rect(self, source, target, rect):
+        return self.affine(source, target).rect(rect)